@@ -0,0 +1 @@
+../../../../modules/A_zero_to_hero/python-basics/circuit_breaker.py
\ No newline at end of file
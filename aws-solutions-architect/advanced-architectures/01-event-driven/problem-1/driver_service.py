@@ -2,45 +2,55 @@
 """Driver Service - Assigns drivers to rides."""
 
 import boto3
+from boto3.dynamodb.types import TypeSerializer
 import json
+import math
 import os
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal
+from event_batcher import BatchingEventPublisher
 
 dynamodb = boto3.resource('dynamodb')
 events = boto3.client('events')
 
 TABLE_NAME = os.environ['TABLE_NAME']
+RIDES_TABLE = os.environ['RIDES_TABLE']
 EVENT_BUS_NAME = os.environ['EVENT_BUS_NAME']
 
+# Drivers are indexed on a lat/lng grid. Available drivers carry an
+# `availableCell` attribute, so the sparse `available-by-cell` GSI only
+# contains drivers that can take a ride.
+AVAILABLE_INDEX = 'available-by-cell'
+CELL_SIZE_DEG = 0.01          # ~1.1 km of latitude
+MAX_RINGS = 10                # search radius of ~11 km
+MAX_CELL_QUERIES = 121        # GSI reads per search; rings 0-5 in full
+NEAREST_CANDIDATES = 5
+KM_PER_DEG_LAT = 110.574
+EARTH_RADIUS_KM = 6371.0
+
 table = dynamodb.Table(TABLE_NAME)
+rides_table = dynamodb.Table(RIDES_TABLE)
+_serializer = TypeSerializer()
+_cell_query_pool = ThreadPoolExecutor(max_workers=16)
 
 def handler(event, context):
     """Assign driver to ride."""
     
-    for record in event['Records']:
-        detail = json.loads(record['body']) if 'body' in record else record['detail']
-        
-        ride_id = detail['rideId']
-        pickup = detail['pickup']
-        
-        # Find nearest available driver (simplified)
-        driver_id = find_nearest_driver(pickup)
-        
-        if driver_id:
-            # Update driver status
-            table.update_item(
-                Key={'driverId': driver_id},
-                UpdateExpression='SET #status = :status, currentRideId = :rideId',
-                ExpressionAttributeNames={'#status': 'status'},
-                ExpressionAttributeValues={
-                    ':status': 'assigned',
-                    ':rideId': ride_id
-                }
-            )
+    with BatchingEventPublisher(events.put_events, service='driver-service') as publisher:
+        for record in event['Records']:
+            detail = json.loads(record['body']) if 'body' in record else record['detail']
+            
+            ride_id = detail['rideId']
+            pickup = detail['pickup']
             
-            # Publish DriverAssigned event
-            events.put_events(
-                Entries=[{
+            # A redelivered ride gets its earlier driver back; only the event is resent
+            driver_id = assign_nearest_driver(ride_id, pickup)
+            
+            if driver_id:
+                # Publish DriverAssigned event (sent in batches)
+                publisher.add({
                     'Source': 'rideshare.drivers',
                     'DetailType': 'DriverAssigned',
                     'Detail': json.dumps({
@@ -49,19 +59,218 @@ def handler(event, context):
                         'timestamp': datetime.now().isoformat()
                     }),
                     'EventBusName': EVENT_BUS_NAME
-                }]
-            )
+                }, record_id=record.get('messageId'))
     
-    return {'statusCode': 200}
+    return publisher.batch_response()
+
+def assign_nearest_driver(ride_id, pickup):
+    """Assign the nearest available driver to a ride, at most once per ride.
+
+    The assignment is recorded on the ride item, so a redelivered record
+    finds the driver an earlier delivery assigned instead of booking a
+    second one. Returns the ride's driver, or None if nobody was free.
+    """
+    driver_id = assigned_driver(ride_id)
+    if driver_id:
+        return driver_id
+    for candidate in find_nearest_drivers(pickup, k=NEAREST_CANDIDATES):
+        driver_id = assign_driver(candidate['driverId'], ride_id)
+        if driver_id:
+            return driver_id
+    return None
+
+def assigned_driver(ride_id):
+    """Driver already assigned to the ride, if any."""
+    response = rides_table.get_item(Key={'rideId': ride_id}, ConsistentRead=True,
+                                    ProjectionExpression='driverId')
+    return response.get('Item', {}).get('driverId')
 
 def find_nearest_driver(pickup):
     """Find nearest available driver."""
-    response = table.scan(
-        FilterExpression='#status = :status',
-        ExpressionAttributeNames={'#status': 'status'},
-        ExpressionAttributeValues={':status': 'available'}
-    )
+    drivers = find_nearest_drivers(pickup, k=1)
     
-    if response['Items']:
-        return response['Items'][0]['driverId']
+    if drivers:
+        return drivers[0]['driverId']
     return None
+
+def find_nearest_drivers(pickup, k=NEAREST_CANDIDATES, max_rings=MAX_RINGS,
+                         max_queries=MAX_CELL_QUERIES):
+    """Return up to k available drivers closest to pickup, nearest first.
+
+    Searches the pickup's cell, then rings of cells around it. Once k drivers
+    are known and the k-th is closer than anything an outer ring could hold,
+    the search stops. It also stops before a ring that would take the number
+    of cell queries past max_queries. Each item has driverId, lat, lng and
+    distanceKm.
+    """
+    lat, lng = float(pickup['lat']), float(pickup['lng'])
+    row, col = cell_coords(lat, lng)
+    # Smallest distance covered by one ring, using the narrower cell side
+    ring_km = CELL_SIZE_DEG * min(KM_PER_DEG_LAT, 111.320 * math.cos(math.radians(lat)))
+    
+    candidates = []
+    queried = 0
+    for ring in range(max_rings + 1):
+        cells = [cell_key(row + dr, col + dc) for dr, dc in ring_offsets(ring)]
+        if queried + len(cells) > max_queries:
+            break
+        queried += len(cells)
+        for drivers in _cell_query_pool.map(available_drivers_in_cell, cells):
+            for driver in drivers:
+                driver['distanceKm'] = haversine_km(lat, lng, float(driver['lat']), float(driver['lng']))
+                candidates.append(driver)
+    
+        candidates.sort(key=lambda d: d['distanceKm'])
+        if len(candidates) >= k and candidates[k - 1]['distanceKm'] <= ring * ring_km:
+            break
+    
+    return candidates[:k]
+
+def available_drivers_in_cell(cell):
+    """Query the sparse GSI for available drivers in one cell."""
+    query = {
+        'IndexName': AVAILABLE_INDEX,
+        'KeyConditionExpression': 'availableCell = :cell',
+        'ExpressionAttributeValues': {':cell': cell},
+        'ProjectionExpression': 'driverId, lat, lng'
+    }
+    drivers = []
+    while True:
+        response = table.query(**query)
+        drivers.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return drivers
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def assign_driver(driver_id, ride_id):
+    """Claim an available driver for a ride that has no driver yet.
+
+    The driver and the ride are updated in one transaction. Returns the
+    ride's driver: driver_id if claimed, the driver another delivery
+    assigned if the ride already had one, or None if this driver was taken.
+    """
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {'Update': {
+                'TableName': table.name,
+                'Key': {'driverId': _serializer.serialize(driver_id)},
+                'UpdateExpression': 'SET #status = :status, currentRideId = :rideId REMOVE availableCell',
+                'ConditionExpression': '#status = :available',
+                'ExpressionAttributeNames': {'#status': 'status'},
+                'ExpressionAttributeValues': {
+                    ':status': _serializer.serialize('assigned'),
+                    ':available': _serializer.serialize('available'),
+                    ':rideId': _serializer.serialize(ride_id)
+                }
+            }},
+            {'Update': {
+                'TableName': rides_table.name,
+                'Key': {'rideId': _serializer.serialize(ride_id)},
+                'UpdateExpression': 'SET driverId = :driverId',
+                'ConditionExpression': 'attribute_not_exists(driverId)',
+                'ExpressionAttributeValues': {':driverId': _serializer.serialize(driver_id)}
+            }}
+        ])
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = [r.get('Code') for r in e.response.get('CancellationReasons', [])]
+        if len(reasons) == 2 and reasons[1] == 'ConditionalCheckFailed':
+            return assigned_driver(ride_id)
+        if 'TransactionConflict' in reasons or reasons[:1] == ['ConditionalCheckFailed']:
+            return None
+        raise
+    return driver_id
+
+def update_driver_location(driver_id, lat, lng):
+    """Record a driver's position and keep the cell index current."""
+    cell = cell_key(*cell_coords(lat, lng))
+    values = {':lat': Decimal(str(lat)), ':lng': Decimal(str(lng)), ':cell': cell}
+    try:
+        # Only available drivers appear in the GSI
+        table.update_item(
+            Key={'driverId': driver_id},
+            UpdateExpression='SET lat = :lat, lng = :lng, locationCell = :cell, availableCell = :cell',
+            ConditionExpression='#status = :available',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={**values, ':available': 'available'}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        table.update_item(
+            Key={'driverId': driver_id},
+            UpdateExpression='SET lat = :lat, lng = :lng, locationCell = :cell',
+            ExpressionAttributeValues=values
+        )
+
+def release_driver(driver_id):
+    """Make a driver available again in their last known cell.
+
+    Drivers written before the grid index have no locationCell. They are
+    released without joining the index and reappear in it on their next
+    location update (or after backfill_driver_cells runs).
+    """
+    try:
+        table.update_item(
+            Key={'driverId': driver_id},
+            UpdateExpression='SET #status = :available, availableCell = locationCell REMOVE currentRideId',
+            ConditionExpression='attribute_exists(locationCell)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':available': 'available'}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        table.update_item(
+            Key={'driverId': driver_id},
+            UpdateExpression='SET #status = :available REMOVE currentRideId',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':available': 'available'}
+        )
+
+def backfill_driver_cells():
+    """One-off migration: give drivers with a position but no locationCell
+    their grid cells, so available ones join the index. Safe to re-run.
+
+    Returns the number of drivers updated.
+    """
+    scan = {
+        'FilterExpression': 'attribute_exists(lat) AND attribute_not_exists(locationCell)',
+        'ProjectionExpression': 'driverId, lat, lng'
+    }
+    updated = 0
+    while True:
+        response = table.scan(**scan)
+        for driver in response['Items']:
+            update_driver_location(driver['driverId'], float(driver['lat']), float(driver['lng']))
+            updated += 1
+        if 'LastEvaluatedKey' not in response:
+            return updated
+        scan['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def cell_coords(lat, lng):
+    return math.floor(lat / CELL_SIZE_DEG), math.floor(lng / CELL_SIZE_DEG)
+
+def cell_key(row, col):
+    return f'{row}:{col}'
+
+def ring_offsets(ring):
+    """Offsets of the cells exactly `ring` steps away (the square's border)."""
+    if ring == 0:
+        return [(0, 0)]
+    offsets = [(-ring, dc) for dc in range(-ring, ring + 1)]
+    offsets += [(ring, dc) for dc in range(-ring, ring + 1)]
+    offsets += [(dr, -ring) for dr in range(-ring + 1, ring)]
+    offsets += [(dr, ring) for dr in range(-ring + 1, ring)]
+    return offsets
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+if __name__ == '__main__':
+    print(f'Backfilled {backfill_driver_cells()} drivers')
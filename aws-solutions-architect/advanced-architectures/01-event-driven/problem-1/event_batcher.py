@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Batching EventBridge publisher shared by the ride-share services."""
+
+import json
+import random
+import time
+
+from circuit_breaker import CircuitBreakerOpenError
+
+MAX_ENTRIES = 10               # PutEvents limit per call
+MAX_BATCH_BYTES = 256 * 1024   # PutEvents limit per call
+FLUSH_INTERVAL = 1.0
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 1.0
+
+def _print_log(message, **fields):
+    print(json.dumps({'message': message, **fields}))
+
+class EventPublishError(Exception):
+    """Events failed to publish and cannot be tied to the records that produced them."""
+
+def entry_size(entry):
+    """Size of a PutEvents entry as EventBridge counts it."""
+    size = 14 if 'Time' in entry else 0
+    for name in ('Source', 'DetailType', 'Detail'):
+        if entry.get(name):
+            size += len(entry[name].encode('utf-8'))
+    for resource in entry.get('Resources', []):
+        size += len(resource.encode('utf-8'))
+    return size
+
+class BatchingEventPublisher:
+    """Buffer PutEvents entries and send them in as few calls as possible.
+
+    `put_events` is called as put_events(Entries=[...]) - usually a boto3
+    events client's method, possibly wrapped by a circuit breaker. A batch is
+    sent when it reaches 10 entries or 256 KB, when the oldest buffered entry
+    is older than flush_interval, on flush(), or when the `with` block ends
+    (the end of a Lambda batch). Only the entries PutEvents reports as
+    failed are retried; entries still failing afterwards are kept in
+    `failed` as (entry, error_code, error_message).
+
+    on_flush(batch_size, failed_count) is called after every batch, and
+    log(message, **fields) receives per-entry failures (JSON to stdout by
+    default). Pass retry_call_errors=False when put_events already retries
+    exceptions itself. CircuitBreakerOpenError is never retried here: the
+    breaker stays open far longer than our backoff.
+
+    Entries added with a record_id (an SQS messageId) let batch_response()
+    report just the records whose events failed.
+    """
+
+    def __init__(self, put_events, service=None, flush_interval=FLUSH_INTERVAL,
+                 max_retries=MAX_RETRIES, on_flush=None, log=_print_log, retry_call_errors=True):
+        self.put_events = put_events
+        self.service = service
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_call_errors = retry_call_errors
+        self.on_flush = on_flush
+        self.log = log
+        self.failed = []
+        self.failed_records = []
+        self._record_ids = {}
+        self._unattributed_failures = 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._oldest = None
+        self._reset_stats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        if self.service:
+            self.log_metrics()
+        return False
+
+    def add(self, entry, record_id=None):
+        """Buffer an entry, sending the current batch first if it is full."""
+        size = entry_size(entry)
+        if size > MAX_BATCH_BYTES:
+            raise ValueError(f'Event entry is {size} bytes; PutEvents allows {MAX_BATCH_BYTES}')
+        if self._buffer and self._buffer_bytes + size > MAX_BATCH_BYTES:
+            self.flush()
+
+        if not self._buffer:
+            self._oldest = time.monotonic()
+        self._buffer.append(entry)
+        self._buffer_bytes += size
+        self._record_ids[id(entry)] = record_id
+
+        if len(self._buffer) >= MAX_ENTRIES or time.monotonic() - self._oldest >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Send everything buffered; return the entries that finally failed."""
+        if not self._buffer:
+            return []
+        batch, self._buffer, self._buffer_bytes = self._buffer, [], 0
+
+        failures = []
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats['retried'] += len(pending)
+                time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+            try:
+                response = self.put_events(Entries=pending)
+            except Exception as e:
+                # Whole call failed (throttled, breaker open, ...): retry it all
+                failures = [(entry, type(e).__name__, str(e)) for entry in pending]
+                if not self.retry_call_errors or isinstance(e, CircuitBreakerOpenError):
+                    break
+            else:
+                self.stats['calls'] += 1
+                self.stats['batch_sizes'].append(len(pending))
+                if not response.get('FailedEntryCount'):
+                    failures = []
+                else:
+                    failures = [
+                        (entry, result.get('ErrorCode'), result.get('ErrorMessage'))
+                        for entry, result in zip(pending, response['Entries'])
+                        if result.get('ErrorCode')
+                    ]
+            if not failures:
+                break
+            pending = [entry for entry, _, _ in failures]
+
+        self.stats['published'] += len(batch) - len(failures)
+        self.stats['failed'] += len(failures)
+        self.failed.extend(failures)
+        failed_ids = {id(entry) for entry, _, _ in failures}
+        for entry in batch:
+            record_id = self._record_ids.pop(id(entry), None)
+            if id(entry) not in failed_ids:
+                continue
+            if record_id is None:
+                self._unattributed_failures += 1
+            elif record_id not in self.failed_records:
+                self.failed_records.append(record_id)
+        for entry, code, message in failures:
+            self.log('event_publish_failed', detail_type=entry.get('DetailType'),
+                     error_code=code, error_message=message)
+        if self.on_flush:
+            self.on_flush(len(batch), len(failures))
+        return failures
+
+    def batch_response(self):
+        """Lambda response reporting records whose events were not published.
+
+        Failed records go in batchItemFailures so SQS redelivers only them.
+        Raises EventPublishError if a failed entry was added without a
+        record_id, so the whole invocation is retried instead.
+        """
+        if self._unattributed_failures:
+            raise EventPublishError(f'{self._unattributed_failures} events failed to publish')
+        return {
+            'statusCode': 200,
+            'batchItemFailures': [{'itemIdentifier': record_id} for record_id in self.failed_records]
+        }
+
+    def log_metrics(self):
+        """Emit stats as a CloudWatch Embedded Metric Format line, then reset them."""
+        if self.stats['calls'] or self.stats['failed']:
+            metrics = {
+                'PutEventsCalls': self.stats['calls'],
+                'EventsPublished': self.stats['published'],
+                'EventsFailed': self.stats['failed'],
+                'EntriesRetried': self.stats['retried'],
+                'BatchSize': self.stats['batch_sizes']
+            }
+            print(json.dumps({
+                '_aws': {
+                    'Timestamp': int(time.time() * 1000),
+                    'CloudWatchMetrics': [{
+                        'Namespace': 'RideShare/EventPublishing',
+                        'Dimensions': [['Service']],
+                        'Metrics': [{'Name': name, 'Unit': 'Count'} for name in metrics]
+                    }]
+                },
+                'Service': self.service,
+                **metrics
+            }))
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.stats = {'calls': 0, 'published': 0, 'failed': 0, 'retried': 0, 'batch_sizes': []}
@@ -5,6 +5,7 @@ import boto3
 import json
 import os
 from datetime import datetime
+from event_batcher import BatchingEventPublisher
 
 events = boto3.client('events')
 EVENT_BUS_NAME = os.environ['EVENT_BUS_NAME']
@@ -12,19 +13,19 @@ EVENT_BUS_NAME = os.environ['EVENT_BUS_NAME']
 def handler(event, context):
     """Detect fraud in ride requests."""
     
-    for record in event['Records']:
-        detail = json.loads(record['body']) if 'body' in record else record['detail']
-        
-        ride_id = detail['rideId']
-        customer_id = detail['customerId']
-        
-        # Run fraud detection algorithms
-        fraud_score = calculate_fraud_score(detail)
-        
-        if fraud_score > 0.8:
-            # High fraud risk
-            events.put_events(
-                Entries=[{
+    with BatchingEventPublisher(events.put_events, service='fraud-detection') as publisher:
+        for record in event['Records']:
+            detail = json.loads(record['body']) if 'body' in record else record['detail']
+            
+            ride_id = detail['rideId']
+            customer_id = detail['customerId']
+            
+            # Run fraud detection algorithms
+            fraud_score = calculate_fraud_score(detail)
+            
+            if fraud_score > 0.8:
+                # High fraud risk
+                publisher.add({
                     'Source': 'rideshare.fraud',
                     'DetailType': 'FraudDetected',
                     'Detail': json.dumps({
@@ -35,10 +36,9 @@ def handler(event, context):
                         'timestamp': datetime.now().isoformat()
                     }),
                     'EventBusName': EVENT_BUS_NAME
-                }]
-            )
-    
-    return {'statusCode': 200}
+                }, record_id=record.get('messageId'))
+        
+    return publisher.batch_response()
 
 def calculate_fraud_score(detail):
     """Calculate fraud risk score."""
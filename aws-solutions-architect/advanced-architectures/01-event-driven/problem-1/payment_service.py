@@ -4,28 +4,34 @@
 import boto3
 import json
 import os
+from botocore.exceptions import ClientError
 from datetime import datetime
 from decimal import Decimal
+from event_batcher import BatchingEventPublisher
 
 events = boto3.client('events')
+dynamodb = boto3.resource('dynamodb')
 EVENT_BUS_NAME = os.environ['EVENT_BUS_NAME']
+PAYMENTS_TABLE = os.environ['PAYMENTS_TABLE']
+
+payments = dynamodb.Table(PAYMENTS_TABLE)
 
 def handler(event, context):
     """Process payment for completed ride."""
     
-    for record in event['Records']:
-        detail = json.loads(record['body']) if 'body' in record else record['detail']
-        
-        ride_id = detail['rideId']
-        amount = Decimal(str(detail.get('amount', 25.00)))
-        customer_id = detail['customerId']
-        
-        # Process payment (simplified - would call payment gateway)
-        payment_success = process_payment(customer_id, amount)
-        
-        if payment_success:
-            events.put_events(
-                Entries=[{
+    with BatchingEventPublisher(events.put_events, service='payment-service') as publisher:
+        for record in event['Records']:
+            detail = json.loads(record['body']) if 'body' in record else record['detail']
+            
+            ride_id = detail['rideId']
+            amount = Decimal(str(detail.get('amount', 25.00)))
+            customer_id = detail['customerId']
+            
+            # Charged at most once per ride, even when the record is redelivered
+            payment_success = charge_once(ride_id, customer_id, amount)
+            
+            if payment_success:
+                publisher.add({
                     'Source': 'rideshare.payments',
                     'DetailType': 'PaymentProcessed',
                     'Detail': json.dumps({
@@ -35,11 +41,9 @@ def handler(event, context):
                         'timestamp': datetime.now().isoformat()
                     }),
                     'EventBusName': EVENT_BUS_NAME
-                }]
-            )
-        else:
-            events.put_events(
-                Entries=[{
+                }, record_id=record.get('messageId'))
+            else:
+                publisher.add({
                     'Source': 'rideshare.payments',
                     'DetailType': 'PaymentFailed',
                     'Detail': json.dumps({
@@ -49,12 +53,46 @@ def handler(event, context):
                         'timestamp': datetime.now().isoformat()
                     }),
                     'EventBusName': EVENT_BUS_NAME
-                }]
-            )
-    
-    return {'statusCode': 200}
+                }, record_id=record.get('messageId'))
+        
+    return publisher.batch_response()
+
+def charge_once(ride_id, customer_id, amount):
+    """Charge for a ride unless an earlier delivery already did; return success.
+
+    The outcome is recorded per rideId before any event is published, so a
+    record redelivered after a failed publish reuses it instead of charging
+    again. The gateway call carries rideId as its idempotency key, which
+    covers a crash between charging and recording.
+    """
+    item = payments.get_item(Key={'rideId': ride_id}, ConsistentRead=True).get('Item')
+    if item:
+        return item['succeeded']
+
+    success = process_payment(customer_id, amount, idempotency_key=ride_id)
+    try:
+        payments.put_item(
+            Item={
+                'rideId': ride_id,
+                'customerId': customer_id,
+                'amount': amount,
+                'succeeded': success,
+                'processedAt': datetime.now().isoformat()
+            },
+            ConditionExpression='attribute_not_exists(rideId)'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # A concurrent delivery recorded first; the gateway deduplicated the charge
+        return payments.get_item(Key={'rideId': ride_id}, ConsistentRead=True)['Item']['succeeded']
+    return success
+
+def process_payment(customer_id, amount, idempotency_key=None):
+    """Process payment via payment gateway.
 
-def process_payment(customer_id, amount):
-    """Process payment via payment gateway."""
+    idempotency_key is passed to the gateway so a repeated call with the
+    same key never charges twice.
+    """
     # Simulate payment processing
     return True
@@ -5,15 +5,27 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Protocol, TypeVar, Callable, Optional, List, Dict, Any
 from enum import Enum
-from datetime import datetime, timedelta
+from datetime import datetime
 from functools import wraps
 import asyncio
+import random
+import threading
+import time
 import boto3
-from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import (ClientError, ConnectionClosedError, ConnectTimeoutError,
+                                 EndpointConnectionError, HTTPClientError, ReadTimeoutError)
+from botocore.exceptions import ConnectionError as BotoConnectionError
 import structlog
 from aws_xray_sdk.core import xray_recorder, patch_all
 from prometheus_client import Counter, Histogram, Gauge
 import hashlib
+import json
+import uuid
+from collections import OrderedDict
+
+from circuit_breaker import CircuitBreaker, CircuitBreakerOpenError, CircuitState
+from event_batcher import BatchingEventPublisher, MAX_ENTRIES
 
 # Patch AWS SDK for X-Ray
 patch_all()
@@ -24,10 +36,17 @@ logger = structlog.get_logger()
 # Metrics
 EVENTS_PUBLISHED = Counter('events_published_total', 'Total events published', ['event_type', 'status'])
 EVENT_LATENCY = Histogram('event_publish_latency_seconds', 'Event publish latency')
+EVENT_BATCH_SIZE = Histogram('event_publish_batch_size', 'Entries per PutEvents call',
+                             buckets=list(range(1, MAX_ENTRIES + 1)))
+EVENTS_FAILED_PER_BATCH = Histogram('event_publish_batch_failures', 'Entries still failing per PutEvents batch',
+                                    buckets=list(range(0, MAX_ENTRIES + 1)))
 CIRCUIT_BREAKER_STATE = Gauge('circuit_breaker_state', 'Circuit breaker state', ['service'])
+RETRIES = Counter('retries_total', 'Retry decisions', ['function', 'outcome'])
 
 T = TypeVar('T')
 
+_deserializer = TypeDeserializer()
+
 # Domain types
 class RideStatus(Enum):
     REQUESTED = "requested"
@@ -43,100 +62,158 @@ class EventType(Enum):
     RIDE_COMPLETED = "RideCompleted"
     RIDE_CANCELLED = "RideCancelled"
 
-# Circuit Breaker Pattern
-class CircuitState(Enum):
-    CLOSED = "closed"
-    OPEN = "open"
-    HALF_OPEN = "half_open"
+# Circuit breaker (shared with the python-basics HTTP clients)
+_BREAKER_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 0.5, CircuitState.OPEN: 1}
 
-@dataclass
-class CircuitBreaker:
-    """Circuit breaker for fault tolerance."""
-    failure_threshold: int = 5
-    timeout: int = 60
-    half_open_max_calls: int = 3
-    
-    _state: CircuitState = field(default=CircuitState.CLOSED, init=False)
-    _failure_count: int = field(default=0, init=False)
-    _last_failure_time: Optional[datetime] = field(default=None, init=False)
-    _half_open_calls: int = field(default=0, init=False)
-    
-    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
-        """Execute function with circuit breaker protection."""
-        if self._state == CircuitState.OPEN:
-            if self._should_attempt_reset():
-                self._state = CircuitState.HALF_OPEN
-                self._half_open_calls = 0
-                CIRCUIT_BREAKER_STATE.labels(service='eventbridge').set(0.5)
-            else:
-                raise CircuitBreakerOpenError("Circuit breaker is OPEN")
-        
-        try:
-            result = fn(*args, **kwargs)
-            self._on_success()
-            return result
-        except Exception as e:
-            self._on_failure()
-            raise e
-    
-    def _should_attempt_reset(self) -> bool:
-        """Check if enough time has passed to attempt reset."""
-        if self._last_failure_time is None:
-            return True
-        return datetime.now() - self._last_failure_time > timedelta(seconds=self.timeout)
-    
-    def _on_success(self):
-        """Handle successful call."""
-        if self._state == CircuitState.HALF_OPEN:
-            self._half_open_calls += 1
-            if self._half_open_calls >= self.half_open_max_calls:
-                self._state = CircuitState.CLOSED
-                self._failure_count = 0
-                CIRCUIT_BREAKER_STATE.labels(service='eventbridge').set(0)
-                logger.info("circuit_breaker_closed")
-    
-    def _on_failure(self):
-        """Handle failed call."""
-        self._failure_count += 1
-        self._last_failure_time = datetime.now()
-        
-        if self._failure_count >= self.failure_threshold:
-            self._state = CircuitState.OPEN
-            CIRCUIT_BREAKER_STATE.labels(service='eventbridge').set(1)
-            logger.error("circuit_breaker_opened", 
-                        failure_count=self._failure_count)
+def _record_breaker_state(name: str, old: CircuitState, new: CircuitState):
+    CIRCUIT_BREAKER_STATE.labels(service=name).set(_BREAKER_STATE_VALUES[new])
+    log = logger.error if new is CircuitState.OPEN else logger.info
+    log("circuit_breaker_" + new.value, service=name, previous=old.value)
 
-class CircuitBreakerOpenError(Exception):
-    """Circuit breaker is open."""
-    pass
+# Retry with full-jitter exponential backoff
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often and how patiently to retry one kind of failure."""
+    max_attempts: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 20.0
+    
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform over [0, min(max_delay, base_delay * 2^attempt)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+@dataclass(frozen=True)
+class RetryPolicies:
+    """Per-exception retry policies.
+    
+    AWS ClientErrors are matched on their error code first, then every
+    exception on its class hierarchy (most specific first); anything
+    unmatched uses `default`.
+    """
+    by_error_code: Dict[str, RetryPolicy] = field(default_factory=dict)
+    by_exception: Dict[type, RetryPolicy] = field(default_factory=dict)
+    default: RetryPolicy = NO_RETRY
+    
+    def for_exception(self, exc: BaseException) -> RetryPolicy:
+        if isinstance(exc, ClientError):
+            code = exc.response.get('Error', {}).get('Code')
+            if code in self.by_error_code:
+                return self.by_error_code[code]
+        for cls in type(exc).__mro__:
+            if cls in self.by_exception:
+                return self.by_exception[cls]
+        return self.default
+
+_THROTTLED = RetryPolicy(max_attempts=5, base_delay=0.1, max_delay=5.0)
+_TRANSIENT = RetryPolicy(max_attempts=3, base_delay=0.05, max_delay=2.0)
+
+DEFAULT_RETRY_POLICIES = RetryPolicies(
+    by_error_code={
+        **dict.fromkeys(['ThrottlingException', 'Throttling', 'TooManyRequestsException',
+                         'ProvisionedThroughputExceededException', 'RequestLimitExceeded'], _THROTTLED),
+        **dict.fromkeys(['InternalFailure', 'InternalServerError', 'ServiceUnavailable',
+                         'ServiceUnavailableException'], _TRANSIENT),
+    },
+    by_exception={
+        # botocore's network errors are not builtin ConnectionError/TimeoutError
+        **dict.fromkeys([EndpointConnectionError, ConnectTimeoutError, ConnectionClosedError,
+                         ReadTimeoutError, BotoConnectionError, HTTPClientError], _TRANSIENT),
+        ConnectionError: _TRANSIENT,
+        TimeoutError: _TRANSIENT,
+        asyncio.TimeoutError: _TRANSIENT,
+    },
+)
+
+class RetryBudget:
+    """Token bucket that caps retries at a fraction of calls.
+    
+    Every call deposits `ratio` tokens (up to `capacity`) and every retry
+    spends one, so in a sustained outage retries add at most `ratio` extra
+    load instead of multiplying it by the attempt count.
+    """
+    
+    def __init__(self, ratio: float = 0.1, capacity: float = 10.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self._tokens = capacity
+        self._lock = threading.Lock()
+    
+    def record_call(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+    
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+DEFAULT_RETRY_BUDGET = RetryBudget()
 
-# Retry with exponential backoff
 def retry_with_backoff(
-    max_attempts: int = 3,
-    base_delay: float = 1.0,
-    max_delay: float = 60.0,
-    exponential_base: float = 2.0
+    policies: RetryPolicies = DEFAULT_RETRY_POLICIES,
+    budget: Optional[RetryBudget] = None
 ):
-    """Decorator for exponential backoff retry."""
+    """Decorator for policy-driven retries with full-jitter backoff.
+    
+    Works on both plain and async functions: coroutines await
+    asyncio.sleep, plain functions block in time.sleep.
+    """
+    budget = budget or DEFAULT_RETRY_BUDGET
+    
     def decorator(fn: Callable) -> Callable:
+        name = fn.__qualname__
+        
+        def next_delay(error: Exception, attempt: int) -> Optional[float]:
+            policy = policies.for_exception(error)
+            if attempt >= policy.max_attempts:
+                RETRIES.labels(function=name, outcome='exhausted' if attempt > 1 else 'not_retryable').inc()
+                return None
+            if not budget.try_spend():
+                RETRIES.labels(function=name, outcome='budget_exhausted').inc()
+                logger.warning("retry_budget_exhausted", function=name, error=str(error))
+                return None
+            delay = policy.backoff(attempt)
+            RETRIES.labels(function=name, outcome='retried').inc()
+            logger.warning("retry_attempt",
+                         function=name,
+                         attempt=attempt,
+                         delay=delay,
+                         error=str(error))
+            return delay
+        
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                budget.record_call()
+                attempt = 1
+                while True:
+                    try:
+                        return await fn(*args, **kwargs)
+                    except Exception as e:
+                        delay = next_delay(e, attempt)
+                        if delay is None:
+                            raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+            return async_wrapper
+        
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            attempt = 0
-            while attempt < max_attempts:
+            budget.record_call()
+            attempt = 1
+            while True:
                 try:
                     return fn(*args, **kwargs)
                 except Exception as e:
-                    attempt += 1
-                    if attempt >= max_attempts:
-                        raise e
-                    
-                    delay = min(base_delay * (exponential_base ** attempt), max_delay)
-                    logger.warning("retry_attempt",
-                                 attempt=attempt,
-                                 delay=delay,
-                                 error=str(e))
-                    asyncio.sleep(delay)
-            return None
+                    delay = next_delay(e, attempt)
+                    if delay is None:
+                        raise
+                time.sleep(delay)
+                attempt += 1
         return wrapper
     return decorator
 
@@ -179,90 +256,232 @@ class EventPublisher:
     def __init__(self, bus_name: str):
         self.events = boto3.client('events')
         self.bus_name = bus_name
-        self.circuit_breaker = CircuitBreaker()
+        self.circuit_breaker = CircuitBreaker(name='eventbridge', on_state_change=_record_breaker_state)
         self.logger = logger.bind(component="EventPublisher")
     
     @xray_recorder.capture('publish_event')
-    @retry_with_backoff(max_attempts=3)
     def publish(self, event: DomainEvent) -> bool:
-        """Publish event with circuit breaker and retry."""
+        """Publish a single event."""
+        return self.publish_many([event])[0]
+    
+    @xray_recorder.capture('publish_events')
+    def publish_many(self, events: List[DomainEvent]) -> List[bool]:
+        """Publish events in PutEvents batches of up to 10 entries / 256 KB.
+        
+        Each call goes through the circuit breaker; failed calls are retried
+        per DEFAULT_RETRY_POLICIES, and only entries that PutEvents reports
+        as failed are re-sent. Returns success per event.
+        """
+        entries = [event.to_eventbridge_entry(self.bus_name) for event in events]
+        
         with EVENT_LATENCY.time():
-            try:
-                entry = event.to_eventbridge_entry(self.bus_name)
-                
-                # Add idempotency token
-                entry['EventBusName'] = self.bus_name
-                
-                response = self.circuit_breaker.call(
-                    self.events.put_events,
-                    Entries=[entry]
-                )
-                
-                if response['FailedEntryCount'] > 0:
-                    failure = response['Entries'][0]
-                    self.logger.error("event_publish_failed",
-                                    error_code=failure.get('ErrorCode'),
-                                    error_message=failure.get('ErrorMessage'))
-                    EVENTS_PUBLISHED.labels(
-                        event_type=event.event_type.value,
-                        status='failed'
-                    ).inc()
-                    return False
-                
+            with BatchingEventPublisher(self._put_events, on_flush=self._record_batch,
+                                        log=self.logger.error, retry_call_errors=False) as batcher:
+                for entry in entries:
+                    batcher.add(entry)
+        
+        failed = {id(entry): code for entry, code, _ in batcher.failed}
+        results = []
+        for event, entry in zip(events, entries):
+            code = failed.get(id(entry))
+            if code is None:
+                status = 'success'
                 self.logger.info("event_published",
                                event_id=event.event_id,
                                event_type=event.event_type.value)
-                EVENTS_PUBLISHED.labels(
-                    event_type=event.event_type.value,
-                    status='success'
-                ).inc()
-                return True
-                
-            except CircuitBreakerOpenError:
-                self.logger.error("circuit_breaker_open")
-                EVENTS_PUBLISHED.labels(
-                    event_type=event.event_type.value,
-                    status='circuit_open'
-                ).inc()
-                return False
-            except Exception as e:
-                self.logger.exception("unexpected_error")
-                EVENTS_PUBLISHED.labels(
-                    event_type=event.event_type.value,
-                    status='error'
-                ).inc()
-                raise
+            elif code == CircuitBreakerOpenError.__name__:
+                status = 'circuit_open'
+            else:
+                status = 'failed'
+            EVENTS_PUBLISHED.labels(event_type=event.event_type.value, status=status).inc()
+            results.append(code is None)
+        return results
+    
+    @retry_with_backoff()
+    def _put_events(self, Entries: List[dict]) -> dict:
+        return self.circuit_breaker.call(self.events.put_events, Entries=Entries)
+    
+    @staticmethod
+    def _record_batch(batch_size: int, failed_count: int):
+        EVENT_BATCH_SIZE.observe(batch_size)
+        EVENTS_FAILED_PER_BATCH.observe(failed_count)
 
 # Idempotency Manager
+class IdempotencyInProgress(Exception):
+    """Another request with the same idempotency key is still being processed."""
+    pass
+
+@dataclass(frozen=True)
+class IdempotencyClaim:
+    """Outcome of IdempotencyManager.claim: our claim token, or the earlier result.
+    
+    origin identifies the request that first claimed the key; it survives a
+    takeover of a stalled claim but not the key's expiry.
+    """
+    token: Optional[str] = None
+    previous: Optional[dict] = None
+    origin: Optional[str] = None
+
 class IdempotencyManager:
-    """Manage idempotency with DynamoDB."""
+    """Claim-then-complete idempotency on DynamoDB.
     
-    def __init__(self, table_name: str, ttl_seconds: int = 86400):
+    claim() takes the key with one conditional put (IN_PROGRESS) or returns
+    the stored result of the request that already COMPLETED it. Each claim
+    carries a random token, and complete()/release() only act while the
+    claim is still ours, so a request whose claim was taken over after
+    lock_timeout cannot overwrite or drop the new holder's record.
+    Completed results are also kept in a small in-process TTL cache so hot
+    client retries never reach DynamoDB.
+    """
+    IN_PROGRESS = 'IN_PROGRESS'
+    COMPLETED = 'COMPLETED'
+    
+    def __init__(
+        self,
+        table_name: str,
+        ttl_seconds: int = 86400,
+        lock_timeout: int = 30,
+        cache_size: int = 1024,
+        cache_ttl: float = 60.0
+    ):
         self.dynamodb = boto3.resource('dynamodb')
         self.table = self.dynamodb.Table(table_name)
         self.ttl_seconds = ttl_seconds
+        self.lock_timeout = lock_timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: OrderedDict[str, tuple] = OrderedDict()
+        self._cache_lock = threading.Lock()
     
-    def is_duplicate(self, idempotency_key: str) -> bool:
-        """Check if request is duplicate."""
+    def claim(self, idempotency_key: str) -> IdempotencyClaim:
+        """Claim the key; the claim has a token if we got it, else the earlier result.
+        
+        An IN_PROGRESS claim older than lock_timeout (a crashed request) and
+        records past their TTL (not yet deleted by DynamoDB) can be taken
+        over. Raises IdempotencyInProgress while another request holds the key.
+        A takeover of a stalled claim keeps its origin; an expired key starts
+        a new one.
+        """
+        cached = self._cached(idempotency_key)
+        if cached is not None:
+            return IdempotencyClaim(previous=cached)
+        
+        now = int(time.time())
+        token = uuid.uuid4().hex
         try:
-            response = self.table.get_item(
-                Key={'idempotencyKey': idempotency_key}
+            response = self.table.put_item(
+                Item={
+                    'idempotencyKey': idempotency_key,
+                    'status': self.IN_PROGRESS,
+                    'claimToken': token,
+                    'origin': token,
+                    'lockExpiresAt': now + self.lock_timeout,
+                    'ttl': now + self.ttl_seconds,
+                    'timestamp': datetime.now().isoformat()
+                },
+                ConditionExpression=(
+                    'attribute_not_exists(idempotencyKey) OR #ttl < :now '
+                    'OR (#status = :in_progress AND lockExpiresAt < :now)'
+                ),
+                ExpressionAttributeNames={'#status': 'status', '#ttl': 'ttl'},
+                ExpressionAttributeValues={':in_progress': self.IN_PROGRESS, ':now': now},
+                ReturnValues='ALL_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
-            return 'Item' in response
-        except ClientError:
+            return IdempotencyClaim(token=token, origin=self._keep_origin(
+                idempotency_key, token, response.get('Attributes', {}), now))
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            item = {k: _deserializer.deserialize(v) for k, v in e.response.get('Item', {}).items()}
+        
+        if item.get('status') != self.COMPLETED:
+            raise IdempotencyInProgress(idempotency_key)
+        result = json.loads(item['result'])
+        self._remember(idempotency_key, result)
+        return IdempotencyClaim(previous=result)
+    
+    def _keep_origin(self, idempotency_key: str, token: str, replaced: dict, now: int) -> str:
+        """Carry a stalled claim's origin over to the claim that took it over."""
+        if replaced.get('status') != self.IN_PROGRESS or replaced.get('ttl', 0) < now or 'origin' not in replaced:
+            return token
+        try:
+            self.table.update_item(
+                Key={'idempotencyKey': idempotency_key},
+                UpdateExpression='SET origin = :origin',
+                ConditionExpression='claimToken = :token',
+                ExpressionAttributeValues={':origin': replaced['origin'], ':token': token}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+        return replaced['origin']
+    
+    def complete(self, idempotency_key: str, token: str, result: dict) -> bool:
+        """Store the result so later duplicates get it back.
+        
+        Returns False (and stores nothing) if the claim is no longer ours.
+        """
+        return self._put_result(idempotency_key, result, '#status = :in_progress AND claimToken = :token',
+                                {':in_progress': self.IN_PROGRESS, ':token': token})
+    
+    def update(self, idempotency_key: str, result: dict) -> bool:
+        """Replace the stored result of a COMPLETED key (e.g. once its event is published)."""
+        return self._put_result(idempotency_key, result, '#status = :completed',
+                                {':completed': self.COMPLETED})
+    
+    def release(self, idempotency_key: str, token: str):
+        """Drop our IN_PROGRESS claim after a failure so the client can retry."""
+        try:
+            self.table.delete_item(
+                Key={'idempotencyKey': idempotency_key},
+                ConditionExpression='#status = :in_progress AND claimToken = :token',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':in_progress': self.IN_PROGRESS, ':token': token}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    
+    def _put_result(self, idempotency_key: str, result: dict, condition: str, values: dict) -> bool:
+        try:
+            self.table.put_item(
+                Item={
+                    'idempotencyKey': idempotency_key,
+                    'status': self.COMPLETED,
+                    'result': json.dumps(result),
+                    'ttl': int(time.time()) + self.ttl_seconds,
+                    'timestamp': datetime.now().isoformat()
+                },
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues=values
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
             return False
+        self._remember(idempotency_key, result)
+        return True
     
-    def record(self, idempotency_key: str, result: dict):
-        """Record processed request."""
-        ttl = int(datetime.now().timestamp()) + self.ttl_seconds
-        self.table.put_item(
-            Item={
-                'idempotencyKey': idempotency_key,
-                'result': result,
-                'ttl': ttl,
-                'timestamp': datetime.now().isoformat()
-            }
-        )
+    def _cached(self, idempotency_key: str) -> Optional[dict]:
+        with self._cache_lock:
+            entry = self._cache.get(idempotency_key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._cache[idempotency_key]
+                return None
+            self._cache.move_to_end(idempotency_key)
+            return result
+    
+    def _remember(self, idempotency_key: str, result: dict):
+        with self._cache_lock:
+            self._cache[idempotency_key] = (time.monotonic() + self.cache_ttl, result)
+            self._cache.move_to_end(idempotency_key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
 
 # Ride Service
 class RideService:
@@ -288,15 +507,61 @@ class RideService:
         dropoff: Dict[str, float],
         idempotency_key: str
     ) -> Dict[str, Any]:
-        """Create ride with idempotency."""
-        # Check idempotency
-        if self.idempotency_manager.is_duplicate(idempotency_key):
+        """Create ride with idempotency.
+        
+        Duplicates get the original result back with status 'duplicate'; if
+        that ride's RideRequested event was never published, it is
+        published again first. Keys are scoped to the customer, and the ride
+        ID is derived from the customer, the key and the claim's origin, so a
+        request that takes over a stale claim rewrites the same ride, while
+        another customer's key or a key reused after its TTL gets a new one.
+        """
+        scoped_key = self._scoped_key(customer_id, idempotency_key)
+        claim = self.idempotency_manager.claim(scoped_key)
+        if claim.previous is not None:
             self.logger.info("duplicate_request", idempotency_key=idempotency_key)
-            return {'status': 'duplicate', 'idempotency_key': idempotency_key}
+            result = claim.previous
+            if not result.get('event_published'):
+                result = self._republish(result, customer_id, pickup, dropoff, idempotency_key)
+            return {**result, 'status': 'duplicate'}
         
-        # Generate ride ID
-        ride_id = self._generate_ride_id(customer_id, pickup, dropoff)
+        try:
+            ride_id = self._generate_ride_id(customer_id, idempotency_key, claim.origin)
+            result = self._create_ride(ride_id, customer_id, pickup, dropoff, idempotency_key)
+        except Exception:
+            self.idempotency_manager.release(scoped_key, claim.token)
+            raise
         
+        # Recorded even if the event is still pending: the ride exists, and a
+        # retry must not create a second one
+        if not self.idempotency_manager.complete(scoped_key, claim.token, result):
+            self.logger.warning("idempotency_claim_lost", idempotency_key=idempotency_key)
+        return result
+    
+    def _republish(
+        self,
+        previous: Dict[str, Any],
+        customer_id: str,
+        pickup: Dict[str, float],
+        dropoff: Dict[str, float],
+        idempotency_key: str
+    ) -> Dict[str, Any]:
+        """Publish RideRequested for a ride whose first attempt left it pending."""
+        if not self.event_publisher.publish(
+                self._ride_requested(previous['ride_id'], customer_id, pickup, dropoff, idempotency_key)):
+            return previous
+        result = {**previous, 'status': 'created', 'event_published': True}
+        self.idempotency_manager.update(self._scoped_key(customer_id, idempotency_key), result)
+        return result
+    
+    def _create_ride(
+        self,
+        ride_id: str,
+        customer_id: str,
+        pickup: Dict[str, float],
+        dropoff: Dict[str, float],
+        idempotency_key: str
+    ) -> Dict[str, Any]:
         # Store ride
         ride = {
             'rideId': ride_id,
@@ -308,10 +573,27 @@ class RideService:
             'version': 1
         }
         
-        self.table.put_item(Item=ride)
+        self._store_ride(ride)
         
-        # Publish event
-        event = DomainEvent(
+        success = self.event_publisher.publish(
+            self._ride_requested(ride_id, customer_id, pickup, dropoff, idempotency_key))
+        
+        return {
+            'ride_id': ride_id,
+            'status': 'created' if success else 'pending',
+            'event_published': success
+        }
+    
+    @staticmethod
+    def _ride_requested(
+        ride_id: str,
+        customer_id: str,
+        pickup: Dict[str, float],
+        dropoff: Dict[str, float],
+        idempotency_key: str
+    ) -> DomainEvent:
+        # The event ID is fixed per ride, so consumers can drop republished copies
+        return DomainEvent(
             event_id=f"evt-{ride_id}",
             event_type=EventType.RIDE_REQUESTED,
             aggregate_id=ride_id,
@@ -328,31 +610,26 @@ class RideService:
                 'version': '1.0'
             }
         )
-        
-        success = self.event_publisher.publish(event)
-        
-        if success:
-            # Record idempotency
-            self.idempotency_manager.record(idempotency_key, {
-                'ride_id': ride_id,
-                'status': 'created'
-            })
-        
-        return {
-            'ride_id': ride_id,
-            'status': 'created' if success else 'pending',
-            'event_published': success
-        }
     
-    def _generate_ride_id(
-        self,
-        customer_id: str,
-        pickup: Dict[str, float],
-        dropoff: Dict[str, float]
-    ) -> str:
-        """Generate deterministic ride ID."""
-        data = f"{customer_id}{pickup}{dropoff}{datetime.now().isoformat()}"
-        return hashlib.sha256(data.encode()).hexdigest()[:16]
+    @retry_with_backoff()
+    def _store_ride(self, ride: Dict[str, Any]):
+        """Store a new ride; a ride already stored under this ID is kept."""
+        try:
+            self.table.put_item(Item=ride, ConditionExpression='attribute_not_exists(rideId)')
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            self.logger.info("ride_already_stored", ride_id=ride['rideId'])
+    
+    @staticmethod
+    def _scoped_key(customer_id: str, idempotency_key: str) -> str:
+        """Idempotency keys are per customer: two customers may pick the same key."""
+        return f"{customer_id}#{idempotency_key}"
+    
+    @staticmethod
+    def _generate_ride_id(customer_id: str, idempotency_key: str, origin: str) -> str:
+        """Deterministic ride ID: one ride per customer, idempotency key and claim origin."""
+        return hashlib.sha256(f"{customer_id}#{idempotency_key}#{origin}".encode()).hexdigest()[:16]
 
 # Lambda Handler
 def create_lambda_handler(
@@ -397,6 +674,12 @@ def create_lambda_handler(
                 'body': result
             }
             
+        except IdempotencyInProgress:
+            logger_ctx.info("request_in_progress")
+            return {
+                'statusCode': 409,
+                'body': {'error': 'RequestInProgress'}
+            }
         except Exception as e:
             logger_ctx.exception("handler_error")
             return {
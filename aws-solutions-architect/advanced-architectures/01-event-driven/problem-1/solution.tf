@@ -104,6 +104,7 @@ resource "aws_lambda_function" "driver_service" {
     variables = {
       EVENT_BUS_NAME = aws_cloudwatch_event_bus.rideshare.name
       TABLE_NAME     = aws_dynamodb_table.drivers.name
+      RIDES_TABLE    = aws_dynamodb_table.rides.name
     }
   }
 }
@@ -120,6 +121,7 @@ resource "aws_lambda_function" "payment_service" {
   environment {
     variables = {
       EVENT_BUS_NAME = aws_cloudwatch_event_bus.rideshare.name
+      PAYMENTS_TABLE = aws_dynamodb_table.payments.name
     }
   }
 }
@@ -235,6 +237,18 @@ resource "aws_dynamodb_table" "rides" {
   }
 }
 
+# One row per charged ride, so redelivered RideCompleted records never charge twice
+resource "aws_dynamodb_table" "payments" {
+  name         = "rideshare-payments"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "rideId"
+
+  attribute {
+    name = "rideId"
+    type = "S"
+  }
+}
+
 resource "aws_dynamodb_table" "drivers" {
   name         = "rideshare-drivers"
   billing_mode = "PAY_PER_REQUEST"
@@ -244,6 +258,20 @@ resource "aws_dynamodb_table" "drivers" {
     name = "driverId"
     type = "S"
   }
+
+  # Sparse index: only available drivers carry availableCell
+  attribute {
+    name = "availableCell"
+    type = "S"
+  }
+
+  global_secondary_index {
+    name               = "available-by-cell"
+    hash_key           = "availableCell"
+    range_key          = "driverId"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["lat", "lng"]
+  }
 }
 
 # IAM Role for Lambda
@@ -286,7 +314,9 @@ resource "aws_iam_role_policy" "lambda" {
         ]
         Resource = [
           aws_dynamodb_table.rides.arn,
-          aws_dynamodb_table.drivers.arn
+          aws_dynamodb_table.payments.arn,
+          aws_dynamodb_table.drivers.arn,
+          "${aws_dynamodb_table.drivers.arn}/index/*"
         ]
       },
       {
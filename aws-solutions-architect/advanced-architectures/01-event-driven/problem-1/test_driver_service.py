@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Tests for driver_service.py against an in-memory drivers table."""
+
+import json
+import os
+import sys
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('TABLE_NAME', 'drivers')
+os.environ.setdefault('RIDES_TABLE', 'rides')
+os.environ.setdefault('EVENT_BUS_NAME', 'rideshare')
+sys.path.insert(0, os.path.dirname(__file__))
+
+import driver_service  # noqa: E402
+import event_batcher  # noqa: E402
+
+_deserializer = TypeDeserializer()
+
+class FakeDriversTable:
+    """Drivers keyed by driverId, understanding driver_service's own expressions."""
+    name = 'drivers'
+
+    def __init__(self):
+        self.items = {}
+        self.queries = 0
+
+    def query(self, ExpressionAttributeValues, **kwargs):
+        self.queries += 1
+        cell = ExpressionAttributeValues[':cell']
+        return {'Items': [{k: d[k] for k in ('driverId', 'lat', 'lng')}
+                          for d in self.items.values() if d.get('availableCell') == cell]}
+
+    def scan(self, **kwargs):
+        return {'Items': [{k: d[k] for k in ('driverId', 'lat', 'lng')}
+                          for d in self.items.values() if 'lat' in d and 'locationCell' not in d]}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                    ConditionExpression=None, **kwargs):
+        driver = self.items.setdefault(Key['driverId'], dict(Key))
+        values = ExpressionAttributeValues
+        holds = {
+            None: lambda: True,
+            '#status = :available': lambda: driver.get('status') == values[':available'],
+            'attribute_exists(locationCell)': lambda: 'locationCell' in driver,
+        }[ConditionExpression]()
+        if not holds:
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}},
+                              'UpdateItem')
+        sets, _, removes = UpdateExpression[len('SET '):].partition(' REMOVE ')
+        for assignment in sets.split(', '):
+            name, value = assignment.split(' = ')
+            name = name.replace('#status', 'status')
+            driver[name] = values[value] if value.startswith(':') else driver[value]
+        for name in filter(None, removes.split(', ')):
+            driver.pop(name, None)
+
+class FakeRidesTable:
+    name = 'rides'
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(Key['rideId'])
+        return {'Item': dict(item)} if item else {}
+
+class FakeDynamoDB:
+    """Client whose TransactWriteItems applies driver_service's driver + ride updates."""
+
+    def __init__(self, drivers, rides):
+        self.drivers = drivers
+        self.rides = rides
+        self.meta = self
+        self.client = self
+
+    def transact_write_items(self, TransactItems):
+        driver_update, ride_update = (entry['Update'] for entry in TransactItems)
+        decode = lambda attrs: {k: _deserializer.deserialize(v) for k, v in attrs.items()}
+        driver_key, ride_key = decode(driver_update['Key']), decode(ride_update['Key'])
+        driver_values, ride_values = (decode(driver_update['ExpressionAttributeValues']),
+                                      decode(ride_update['ExpressionAttributeValues']))
+        driver = self.drivers.items.get(driver_key['driverId'], {})
+        ride = self.rides.items.get(ride_key['rideId'], {})
+        reasons = [
+            {'Code': 'None' if driver.get('status') == driver_values[':available'] else 'ConditionalCheckFailed'},
+            {'Code': 'None' if 'driverId' not in ride else 'ConditionalCheckFailed'},
+        ]
+        if any(r['Code'] != 'None' for r in reasons):
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+                               'CancellationReasons': reasons}, 'TransactWriteItems')
+        self.drivers.update_item(driver_key, driver_update['UpdateExpression'], driver_values)
+        self.rides.items.setdefault(ride_key['rideId'], dict(ride_key))['driverId'] = ride_values[':driverId']
+
+@pytest.fixture
+def rides():
+    return FakeRidesTable()
+
+@pytest.fixture
+def table(monkeypatch, rides):
+    fake = FakeDriversTable()
+    monkeypatch.setattr(driver_service, 'table', fake)
+    monkeypatch.setattr(driver_service, 'rides_table', rides)
+    monkeypatch.setattr(driver_service, 'dynamodb', FakeDynamoDB(fake, rides))
+    return fake
+
+def add_driver(table, driver_id, lat, lng, status='available'):
+    table.items[driver_id] = {'driverId': driver_id, 'status': status}
+    driver_service.update_driver_location(driver_id, lat, lng)
+
+def test_nearest_drivers_come_first(table):
+    add_driver(table, 'far', 40.05, -74.0)
+    add_driver(table, 'near', 40.001, -74.0)
+    add_driver(table, 'busy', 40.0005, -74.0, status='assigned')
+    found = driver_service.find_nearest_drivers({'lat': 40.0, 'lng': -74.0}, k=2)
+    assert [d['driverId'] for d in found] == ['near', 'far']
+
+def test_search_stops_at_query_budget(table):
+    add_driver(table, 'far', 40.09, -74.0)  # 9 rings out
+    found = driver_service.find_nearest_drivers({'lat': 40.0, 'lng': -74.0}, k=1, max_queries=25)
+    assert found == []
+    assert table.queries == 25  # rings 0-2; ring 3 would exceed the budget
+
+def test_default_budget_bounds_an_empty_search(table):
+    driver_service.find_nearest_drivers({'lat': 40.0, 'lng': -74.0})
+    assert table.queries <= driver_service.MAX_CELL_QUERIES
+
+def test_assign_claims_driver_and_records_ride(table, rides):
+    add_driver(table, 'd-1', 40.0, -74.0)
+    add_driver(table, 'd-2', 40.0, -74.0)
+    assert driver_service.assign_driver('d-1', 'r-1') == 'd-1'
+    assert rides.items['r-1']['driverId'] == 'd-1'
+    # The driver is taken, and the ride already has its driver
+    assert driver_service.assign_driver('d-1', 'r-2') is None
+    assert driver_service.assign_driver('d-2', 'r-1') == 'd-1'
+    assert table.items['d-2']['status'] == 'available'
+
+def test_release_returns_driver_to_index(table):
+    add_driver(table, 'd-1', 40.0, -74.0)
+    assert driver_service.assign_driver('d-1', 'r-1')
+    assert 'availableCell' not in table.items['d-1']
+    driver_service.release_driver('d-1')
+    driver = table.items['d-1']
+    assert driver['status'] == 'available' and 'currentRideId' not in driver
+    assert driver['availableCell'] == driver['locationCell']
+
+def test_release_without_location_cell_still_frees_driver(table):
+    table.items['d-1'] = {'driverId': 'd-1', 'status': 'assigned', 'currentRideId': 'r-1',
+                          'lat': 40.0, 'lng': -74.0}
+    driver_service.release_driver('d-1')
+    assert table.items['d-1']['status'] == 'available'
+    assert 'currentRideId' not in table.items['d-1']
+    assert 'availableCell' not in table.items['d-1']
+
+    assert driver_service.backfill_driver_cells() == 1
+    assert table.items['d-1']['availableCell'] == table.items['d-1']['locationCell']
+    assert driver_service.backfill_driver_cells() == 0
+
+def test_handler_reports_rides_whose_event_failed(table, monkeypatch):
+    add_driver(table, 'd-1', 40.0, -74.0)
+
+    class RejectingEvents:
+        def put_events(self, Entries):
+            return {'FailedEntryCount': len(Entries),
+                    'Entries': [{'ErrorCode': 'InternalFailure', 'ErrorMessage': 'boom'} for _ in Entries]}
+
+    monkeypatch.setattr(driver_service, 'events', RejectingEvents())
+    monkeypatch.setattr(event_batcher.time, 'sleep', lambda seconds: None)
+    record = {'messageId': 'm-1', 'body': '{"rideId": "r-1", "pickup": {"lat": 40.0, "lng": -74.0}}'}
+    response = driver_service.handler({'Records': [record]}, None)
+    assert response['batchItemFailures'] == [{'itemIdentifier': 'm-1'}]
+    assert table.items['d-1']['currentRideId'] == 'r-1'
+
+def test_redelivered_ride_keeps_its_driver(table, monkeypatch):
+    add_driver(table, 'd-1', 40.0, -74.0)
+    add_driver(table, 'd-2', 40.001, -74.0)
+
+    class FlakyEvents:
+        """Rejects every entry while failing is set."""
+        failing = True
+        sent = []
+
+        def put_events(self, Entries):
+            self.sent.extend(Entries)
+            if self.failing:
+                return {'FailedEntryCount': len(Entries),
+                        'Entries': [{'ErrorCode': 'InternalFailure', 'ErrorMessage': 'boom'} for _ in Entries]}
+            return {'FailedEntryCount': 0, 'Entries': [{'EventId': 'e'} for _ in Entries]}
+
+    events = FlakyEvents()
+    monkeypatch.setattr(driver_service, 'events', events)
+    monkeypatch.setattr(event_batcher.time, 'sleep', lambda seconds: None)
+    record = {'messageId': 'm-1', 'body': '{"rideId": "r-1", "pickup": {"lat": 40.0, "lng": -74.0}}'}
+    assert driver_service.handler({'Records': [record]}, None)['batchItemFailures'] == [{'itemIdentifier': 'm-1'}]
+
+    # SQS redelivers the record: only the event is sent again
+    events.failing = False
+    assert driver_service.handler({'Records': [record]}, None)['batchItemFailures'] == []
+    assert table.items['d-1']['currentRideId'] == 'r-1'
+    assert table.items['d-2']['status'] == 'available' and 'currentRideId' not in table.items['d-2']
+    assert all(json.loads(entry['Detail'])['driverId'] == 'd-1' for entry in events.sent)
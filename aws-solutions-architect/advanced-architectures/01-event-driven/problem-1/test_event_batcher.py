@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Tests for event_batcher.py and the handlers that publish through it."""
+
+import json
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('EVENT_BUS_NAME', 'rideshare')
+os.environ.setdefault('PAYMENTS_TABLE', 'payments')
+sys.path.insert(0, os.path.dirname(__file__))
+
+import event_batcher  # noqa: E402
+import fraud_detection  # noqa: E402
+import payment_service  # noqa: E402
+from circuit_breaker import CircuitBreakerOpenError  # noqa: E402
+
+class FakeEvents:
+    """PutEvents that rejects entries whose Detail mentions a failing ride."""
+
+    def __init__(self, failing=(), error=None):
+        self.failing = set(failing)
+        self.error = error
+        self.calls = []
+
+    def put_events(self, Entries):
+        self.calls.append(Entries)
+        if self.error:
+            raise self.error
+        results = [{'ErrorCode': 'InternalFailure', 'ErrorMessage': 'boom'}
+                   if json.loads(e['Detail'])['rideId'] in self.failing else {'EventId': 'e'}
+                   for e in Entries]
+        return {'FailedEntryCount': sum('ErrorCode' in r for r in results), 'Entries': results}
+
+class FakePaymentsTable:
+    """Payments keyed by rideId, honouring attribute_not_exists(rideId)."""
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(Key['rideId'])
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression=None):
+        if ConditionExpression == 'attribute_not_exists(rideId)' and Item['rideId'] in self.items:
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}},
+                              'PutItem')
+        self.items[Item['rideId']] = dict(Item)
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(event_batcher.time, 'sleep', lambda seconds: None)
+
+@pytest.fixture
+def charges(monkeypatch):
+    """Records each gateway call made by payment_service."""
+    calls = []
+    monkeypatch.setattr(payment_service, 'payments', FakePaymentsTable())
+    monkeypatch.setattr(payment_service, 'process_payment',
+                        lambda customer_id, amount, idempotency_key=None: calls.append(idempotency_key) or True)
+    return calls
+
+def entry(ride_id):
+    return {'Source': 's', 'DetailType': 'T', 'Detail': json.dumps({'rideId': ride_id})}
+
+def sqs_event(*ride_ids):
+    return {'Records': [{'messageId': f'm-{ride_id}',
+                         'body': json.dumps({'rideId': ride_id, 'customerId': 'c-1', 'amount': 10})}
+                        for ride_id in ride_ids]}
+
+def test_open_breaker_is_not_retried():
+    events = FakeEvents(error=CircuitBreakerOpenError('eventbridge', 30.0))
+    with event_batcher.BatchingEventPublisher(events.put_events) as publisher:
+        publisher.add(entry('r-1'), record_id='m-1')
+    assert len(events.calls) == 1
+    assert publisher.failed[0][1] == 'CircuitBreakerOpenError'
+    assert publisher.batch_response()['batchItemFailures'] == [{'itemIdentifier': 'm-1'}]
+
+def test_other_call_errors_are_retried():
+    events = FakeEvents(error=RuntimeError('throttled'))
+    with event_batcher.BatchingEventPublisher(events.put_events, max_retries=2) as publisher:
+        publisher.add(entry('r-1'), record_id='m-1')
+    assert len(events.calls) == 3
+
+def test_only_records_with_failed_entries_are_reported():
+    events = FakeEvents(failing={'r-2'})
+    with event_batcher.BatchingEventPublisher(events.put_events, max_retries=1) as publisher:
+        for n in range(1, 13):
+            publisher.add(entry(f'r-{n}'), record_id=f'm-{n}')
+    assert publisher.batch_response() == {'statusCode': 200,
+                                          'batchItemFailures': [{'itemIdentifier': 'm-2'}]}
+
+def test_failure_without_record_id_fails_the_invocation():
+    events = FakeEvents(failing={'r-1'})
+    with event_batcher.BatchingEventPublisher(events.put_events, max_retries=0) as publisher:
+        publisher.add(entry('r-1'))
+    with pytest.raises(event_batcher.EventPublishError):
+        publisher.batch_response()
+
+def test_payment_handler_returns_failed_message_ids(monkeypatch, charges):
+    monkeypatch.setattr(payment_service, 'events', FakeEvents(failing={'r-2'}))
+    response = payment_service.handler(sqs_event('r-1', 'r-2', 'r-3'), None)
+    assert response['batchItemFailures'] == [{'itemIdentifier': 'm-r-2'}]
+
+def test_redelivered_payment_is_not_charged_again(monkeypatch, charges):
+    events = FakeEvents(failing={'r-1'})
+    monkeypatch.setattr(payment_service, 'events', events)
+    assert payment_service.handler(sqs_event('r-1'), None)['batchItemFailures'] == [{'itemIdentifier': 'm-r-1'}]
+
+    # SQS redelivers the record: only the event is sent again
+    events.failing.clear()
+    assert payment_service.handler(sqs_event('r-1'), None)['batchItemFailures'] == []
+    assert charges == ['r-1']
+    assert json.loads(events.calls[-1][0]['Detail'])['amount'] == 10.0
+
+def test_fraud_handler_reports_no_failures_when_all_published(monkeypatch):
+    monkeypatch.setattr(fraud_detection, 'calculate_fraud_score', lambda detail: 0.9)
+    events = FakeEvents()
+    monkeypatch.setattr(fraud_detection, 'events', events)
+    response = fraud_detection.handler(sqs_event('r-1', 'r-2'), None)
+    assert response['batchItemFailures'] == []
+    assert [len(batch) for batch in events.calls] == [2]
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Tests for ride_service_advanced.py."""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from prometheus_client import REGISTRY
+from botocore.exceptions import (ClientError, ConnectionClosedError, ConnectTimeoutError,
+                                 EndpointConnectionError, ReadTimeoutError)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_XRAY_CONTEXT_MISSING', 'IGNORE_ERROR')
+sys.path.insert(0, os.path.dirname(__file__))
+
+import ride_service_advanced as rides  # noqa: E402
+
+@pytest.fixture(autouse=True)
+def sleeps(monkeypatch):
+    """Delays passed to time.sleep, which no longer blocks."""
+    delays = []
+    monkeypatch.setattr(rides.time, 'sleep', delays.append)
+    return delays
+
+def flaky(errors):
+    """A function that raises each of errors in turn, then returns 'ok'."""
+    errors = list(errors)
+    calls = []
+
+    @rides.retry_with_backoff(budget=rides.RetryBudget(capacity=100))
+    def call():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+    return call, calls
+
+@pytest.mark.parametrize('error', [
+    EndpointConnectionError(endpoint_url='https://events.us-east-1.amazonaws.com'),
+    ConnectTimeoutError(endpoint_url='https://events.us-east-1.amazonaws.com'),
+    ReadTimeoutError(endpoint_url='https://events.us-east-1.amazonaws.com'),
+    ConnectionClosedError(endpoint_url='https://events.us-east-1.amazonaws.com'),
+])
+def test_botocore_network_errors_are_retried(error):
+    call, calls = flaky([error, error])
+    assert call() == 'ok'
+    assert len(calls) == 3
+
+def test_network_errors_give_up_after_policy_attempts():
+    error = EndpointConnectionError(endpoint_url='https://events.us-east-1.amazonaws.com')
+    call, calls = flaky([error] * 5)
+    with pytest.raises(EndpointConnectionError):
+        call()
+    assert len(calls) == 3
+
+NETWORK_ERROR = EndpointConnectionError(endpoint_url='https://events.us-east-1.amazonaws.com')
+
+def test_sync_retries_sleep_with_jittered_backoff(sleeps):
+    call, calls = flaky([NETWORK_ERROR, NETWORK_ERROR])
+    assert call() == 'ok'
+    # Full jitter over [0, min(max_delay, base_delay * 2^attempt)] for the transient policy
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 0.1 and 0 <= sleeps[1] <= 0.2
+
+def test_async_retries_await_asyncio_sleep(sleeps, monkeypatch):
+    awaited = []
+
+    async def fake_sleep(delay):
+        awaited.append(delay)
+    monkeypatch.setattr(rides.asyncio, 'sleep', fake_sleep)
+    errors = [NETWORK_ERROR, NETWORK_ERROR]
+
+    @rides.retry_with_backoff(budget=rides.RetryBudget(capacity=100))
+    async def call():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert asyncio.run(call()) == 'ok'
+    assert len(awaited) == 2
+    assert 0 <= awaited[0] <= 0.1 and 0 <= awaited[1] <= 0.2
+    assert sleeps == []  # never blocks the event loop
+
+def test_retries_stop_when_budget_is_empty(sleeps):
+    budget = rides.RetryBudget(ratio=0.0, capacity=1.0)
+    calls = []
+
+    @rides.retry_with_backoff(budget=budget)
+    def call():
+        calls.append(1)
+        raise NETWORK_ERROR
+
+    labels = {'function': call.__qualname__, 'outcome': 'budget_exhausted'}
+    before = REGISTRY.get_sample_value('retries_total', labels) or 0.0
+    with pytest.raises(EndpointConnectionError):
+        call()
+    # One token buys one retry; the policy would have allowed a third attempt
+    assert len(calls) == 2 and len(sleeps) == 1
+    with pytest.raises(EndpointConnectionError):
+        call()
+    assert len(calls) == 3
+    assert REGISTRY.get_sample_value('retries_total', labels) == before + 2
+
+def test_client_errors_outside_the_policies_are_not_retried():
+    call, calls = flaky([ClientError({'Error': {'Code': 'ValidationException', 'Message': 'bad'}},
+                                     'PutEvents')])
+    with pytest.raises(ClientError):
+        call()
+    assert len(calls) == 1
+
+def conditional_check_failed(operation, item=None):
+    response = {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}
+    if item is not None:
+        response['Item'] = {k: TypeSerializer().serialize(v) for k, v in item.items()}
+    return ClientError(response, operation)
+
+class FakeTable:
+    """Hash-keyed table that evaluates the ride service's own conditions."""
+
+    def __init__(self, key):
+        self.key = key
+        self.items = {}
+
+    def _holds(self, existing, condition, values):
+        if condition is None:
+            return True
+        return {
+            'attribute_not_exists(idempotencyKey) OR #ttl < :now '
+            'OR (#status = :in_progress AND lockExpiresAt < :now)':
+                lambda: existing is None or existing['ttl'] < values[':now']
+                or (existing['status'] == values[':in_progress'] and existing['lockExpiresAt'] < values[':now']),
+            '#status = :in_progress AND claimToken = :token':
+                lambda: existing is not None and existing['status'] == values[':in_progress']
+                and existing.get('claimToken') == values[':token'],
+            '#status = :completed': lambda: existing is not None and existing['status'] == values[':completed'],
+            'attribute_not_exists(rideId)': lambda: existing is None,
+            'claimToken = :token': lambda: existing is not None and existing.get('claimToken') == values[':token'],
+        }[condition]()
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None,
+                 ReturnValues=None, ReturnValuesOnConditionCheckFailure=None, **kwargs):
+        existing = self.items.get(Item[self.key])
+        if not self._holds(existing, ConditionExpression, ExpressionAttributeValues):
+            raise conditional_check_failed('PutItem', existing if ReturnValuesOnConditionCheckFailure else None)
+        self.items[Item[self.key]] = dict(Item)
+        return {'Attributes': dict(existing)} if ReturnValues == 'ALL_OLD' and existing else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues, **kwargs):
+        existing = self.items.get(Key[self.key])
+        if not self._holds(existing, ConditionExpression, ExpressionAttributeValues):
+            raise conditional_check_failed('UpdateItem')
+        assert UpdateExpression == 'SET origin = :origin'
+        existing['origin'] = ExpressionAttributeValues[':origin']
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeValues=None, **kwargs):
+        existing = self.items.get(Key[self.key])
+        if not self._holds(existing, ConditionExpression, ExpressionAttributeValues):
+            raise conditional_check_failed('DeleteItem')
+        self.items.pop(Key[self.key], None)
+
+class FakePublisher:
+    def __init__(self, succeed=True):
+        self.succeed = succeed
+        self.published = []
+
+    def publish(self, event):
+        self.published.append(event)
+        return self.succeed
+
+@pytest.fixture
+def service():
+    idempotency = rides.IdempotencyManager('idempotency', lock_timeout=30, cache_ttl=0)
+    idempotency.table = FakeTable('idempotencyKey')
+    ride_service = rides.RideService(FakePublisher(), idempotency, 'rides')
+    ride_service.table = FakeTable('rideId')
+    return ride_service
+
+def request(service, key='key-1', customer_id='c-1'):
+    return service.create_ride(customer_id, {'lat': 1.0, 'lng': 2.0}, {'lat': 3.0, 'lng': 4.0}, key)
+
+def test_duplicate_returns_original_ride(service):
+    first = request(service)
+    again = request(service)
+    assert again == {**first, 'status': 'duplicate'}
+    assert len(service.table.items) == 1
+    assert len(service.event_publisher.published) == 1
+
+def test_takeover_after_lock_timeout_keeps_one_ride(service, monkeypatch):
+    manager = service.idempotency_manager
+    stale = manager.claim('c-1#key-1')
+    # The first request stalls past lock_timeout; a retry takes the key over
+    later = time.time() + manager.lock_timeout + 1
+    monkeypatch.setattr(rides.time, 'time', lambda: later)
+    result = request(service)
+
+    # The stalled request finishes: it must not overwrite or drop the record
+    assert manager.complete('c-1#key-1', stale.token, {'ride_id': 'other'}) is False
+    manager.release('c-1#key-1', stale.token)
+    record = manager.table.items['c-1#key-1']
+    assert record['status'] == manager.COMPLETED
+    assert rides.json.loads(record['result']) == result
+
+    # Whatever the stalled request stored lands on the same ride
+    assert result['ride_id'] == service._generate_ride_id('c-1', 'key-1', stale.origin)
+    service._store_ride({'rideId': result['ride_id'], 'customerId': 'c-1'})
+    assert list(service.table.items) == [result['ride_id']]
+    assert service.table.items[result['ride_id']]['pickup'] == {'lat': 1.0, 'lng': 2.0}
+
+def test_same_key_from_another_customer_is_a_new_ride(service):
+    first = request(service, customer_id='c-1')
+    other = request(service, customer_id='c-2')
+    assert other['status'] == 'created' and other['ride_id'] != first['ride_id']
+    assert sorted(service.idempotency_manager.table.items) == ['c-1#key-1', 'c-2#key-1']
+    assert len(service.table.items) == 2
+
+def test_key_reused_after_ttl_is_a_new_ride(service, monkeypatch):
+    manager = service.idempotency_manager
+    first = request(service)
+    later = time.time() + manager.ttl_seconds + 1
+    monkeypatch.setattr(rides.time, 'time', lambda: later)
+    again = request(service)
+    assert again['status'] == 'created' and again['ride_id'] != first['ride_id']
+    assert len(service.table.items) == 2
+
+def test_failed_request_releases_its_claim(service):
+    def broken(**kwargs):
+        raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'bad'}}, 'PutItem')
+    service.table.put_item = broken
+    with pytest.raises(ClientError):
+        request(service)
+    assert service.idempotency_manager.table.items == {}
+
+def test_duplicate_republishes_pending_event(service):
+    service.event_publisher.succeed = False
+    first = request(service)
+    assert first['event_published'] is False
+
+    service.event_publisher.succeed = True
+    again = request(service)
+    assert again == {'ride_id': first['ride_id'], 'status': 'duplicate', 'event_published': True}
+    assert [e.event_id for e in service.event_publisher.published] == [f"evt-{first['ride_id']}"] * 2
+
+    # Recorded, so the next duplicate does not publish a third time
+    assert request(service)['event_published'] is True
+    assert len(service.event_publisher.published) == 2
+
+def test_duplicate_stays_pending_while_publishing_fails(service):
+    service.event_publisher.succeed = False
+    first = request(service)
+    again = request(service)
+    assert again == {**first, 'status': 'duplicate'}
+    assert len(service.event_publisher.published) == 2
@@ -2,13 +2,22 @@
 """FAANG-grade CQRS command handler with type safety and functional patterns."""
 
 from __future__ import annotations
-from dataclasses import dataclass, field, asdict
-from typing import Protocol, TypeVar, Generic, Callable, Optional, Union, List
+from dataclasses import dataclass, field, fields
+from operator import attrgetter
+from typing import Protocol, TypeVar, Generic, Callable, Optional, Union, List, Dict, Iterator, Set, Tuple, get_type_hints
 from enum import Enum
 from datetime import datetime
 from decimal import Decimal
+from collections import OrderedDict
+import json
+import os
+import random
+import sqlite3
+import struct
+import time
 import uuid
 import boto3
+from boto3.dynamodb.types import TypeSerializer
 from functools import wraps
 import structlog
 from aws_xray_sdk.core import xray_recorder
@@ -108,7 +117,7 @@ class OrderCreated:
     timestamp: str = field(default_factory=lambda: datetime.utcnow().isoformat())
     
     def to_dict(self) -> dict:
-        return {**asdict(self), 'event_type': self.event_type.value}
+        return EVENT_CODECS[self.event_type].encode(self)
 
 @dataclass(frozen=True)
 class ItemAdded:
@@ -122,10 +131,7 @@ class ItemAdded:
     timestamp: str = field(default_factory=lambda: datetime.utcnow().isoformat())
     
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d['event_type'] = self.event_type.value
-        d['price'] = float(self.price)
-        return d
+        return EVENT_CODECS[self.event_type].encode(self)
 
 @dataclass(frozen=True)
 class OrderConfirmed:
@@ -136,16 +142,192 @@ class OrderConfirmed:
     timestamp: str = field(default_factory=lambda: datetime.utcnow().isoformat())
     
     def to_dict(self) -> dict:
-        return {**asdict(self), 'event_type': self.event_type.value}
+        return EVENT_CODECS[self.event_type].encode(self)
+
+# Event codecs
+_KEY_FIELDS = ('aggregate_id', 'version')
+_U32 = struct.Struct('>I')
+_I64 = struct.Struct('>q')
+
+def _pack_str(value: str, out: bytearray):
+    raw = value.encode('utf-8')
+    out += _U32.pack(len(raw))
+    out += raw
+
+def _unpack_str(buf: memoryview, offset: int) -> Tuple[str, int]:
+    (length,) = _U32.unpack_from(buf, offset)
+    offset += 4
+    return str(buf[offset:offset + length], 'utf-8'), offset + length
+
+def _pack_int(value: int, out: bytearray):
+    out += _I64.pack(int(value))
+
+def _unpack_int(buf: memoryview, offset: int) -> Tuple[int, int]:
+    return _I64.unpack_from(buf, offset)[0], offset + 8
+
+def _pack_decimal(value: Decimal, out: bytearray):
+    _pack_str(str(value), out)
+
+def _unpack_decimal(buf: memoryview, offset: int) -> Tuple[Decimal, int]:
+    text, offset = _unpack_str(buf, offset)
+    return Decimal(text), offset
+
+_PACKERS = {
+    str: (_pack_str, _unpack_str),
+    int: (_pack_int, _unpack_int),
+    Decimal: (_pack_decimal, _unpack_decimal),
+}
+
+@dataclass(frozen=True)
+class EventCodec:
+    """Encode/decode functions for one event type, built once from its fields.
+    
+    encode/decode map events to DynamoDB attribute dicts. encode_binary and
+    decode_binary pack the non-key fields into one compact length-prefixed
+    blob, stored as the ``payload`` attribute when EventStore uses
+    ``payload_encoding='binary'``.
+    """
+    event_type: EventType
+    encode: Callable[[Event], dict]
+    decode: Callable[[dict], Event]
+    encode_binary: Callable[[Event], bytes]
+    decode_binary: Callable[[dict, bytes], Event]
+
+def _build_codec(cls: type) -> EventCodec:
+    event_type = next(f.default for f in fields(cls) if f.name == 'event_type')
+    type_value = event_type.value
+    names = tuple(f.name for f in fields(cls) if f.name != 'event_type')
+    field_types = get_type_hints(cls)
+    get_all = attrgetter(*names)
+    decimal_names = tuple(n for n in names if field_types[n] is Decimal)
+    int_names = tuple(n for n in names if field_types[n] is int)
+    payload_names = tuple(n for n in names if n not in _KEY_FIELDS)
+    get_payload = attrgetter(*payload_names)
+    packers = tuple(_PACKERS[field_types[n]][0] for n in payload_names)
+    unpackers = tuple(_PACKERS[field_types[n]][1] for n in payload_names)
+    
+    def encode(event: Event) -> dict:
+        item = dict(zip(names, get_all(event)))
+        item['event_type'] = type_value
+        return item
+    
+    def decode(item: dict) -> Event:
+        kwargs = {name: item[name] for name in names if name in item}
+        for name in decimal_names:
+            value = kwargs.get(name)
+            if value is not None and type(value) is not Decimal:
+                kwargs[name] = Decimal(str(value))
+        for name in int_names:
+            if name in kwargs:
+                kwargs[name] = int(kwargs[name])
+        return cls(**kwargs)
+    
+    def encode_binary(event: Event) -> bytes:
+        out = bytearray()
+        for pack, value in zip(packers, get_payload(event)):
+            pack(value, out)
+        return bytes(out)
+    
+    def decode_binary(keys: dict, payload: bytes) -> Event:
+        buf = memoryview(payload)
+        offset = 0
+        kwargs = {'aggregate_id': keys['aggregate_id'], 'version': int(keys['version'])}
+        for name, unpack in zip(payload_names, unpackers):
+            kwargs[name], offset = unpack(buf, offset)
+        return cls(**kwargs)
+    
+    return EventCodec(event_type, encode, decode, encode_binary, decode_binary)
+
+EVENT_CODECS: Dict[EventType, EventCodec] = {
+    codec.event_type: codec
+    for codec in map(_build_codec, (OrderCreated, ItemAdded, OrderConfirmed))
+}
+_CODECS_BY_NAME: Dict[str, EventCodec] = {t.value: c for t, c in EVENT_CODECS.items()}
+
+def encode_event(event: Event, binary: bool = False) -> dict:
+    """Encode an event as a DynamoDB item, optionally with a binary payload."""
+    codec = EVENT_CODECS[event.event_type]
+    if not binary:
+        return codec.encode(event)
+    return {
+        'aggregate_id': event.aggregate_id,
+        'version': event.version,
+        'event_type': codec.event_type.value,
+        'payload': codec.encode_binary(event)
+    }
+
+def decode_event(item: dict) -> Event:
+    """Decode a DynamoDB item written in either encoding."""
+    codec = _CODECS_BY_NAME.get(item['event_type'])
+    if codec is None:
+        raise ValueError(f"Unknown event type: {item['event_type']}")
+    payload = item.get('payload')
+    if payload is not None:
+        # boto3 wraps binary attributes in boto3.dynamodb.types.Binary
+        return codec.decode_binary(item, getattr(payload, 'value', payload))
+    return codec.decode(item)
 
 # Aggregate State
-@dataclass
+@dataclass(frozen=True, slots=True)
+class OrderLine:
+    product_id: str
+    quantity: int
+    price: Decimal
+
+class _LineNode:
+    __slots__ = ('line', 'prev')
+    
+    def __init__(self, line: OrderLine, prev: Optional[_LineNode]):
+        self.line = line
+        self.prev = prev
+
+class OrderLines:
+    """Persistent append-only list of order lines.
+    
+    append() returns a new list that shares every existing node with the
+    old one, so folding n ItemAdded events costs O(n) instead of copying
+    the whole list on each event.
+    """
+    __slots__ = ('_last', '_len')
+    
+    def __init__(self, _last: Optional[_LineNode] = None, _len: int = 0):
+        self._last = _last
+        self._len = _len
+    
+    def append(self, line: OrderLine) -> OrderLines:
+        return OrderLines(_LineNode(line, self._last), self._len + 1)
+    
+    def __len__(self) -> int:
+        return self._len
+    
+    def __iter__(self) -> Iterator[OrderLine]:
+        lines = []
+        node = self._last
+        while node is not None:
+            lines.append(node.line)
+            node = node.prev
+        return reversed(lines)
+    
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, OrderLines):
+            return NotImplemented
+        return self._len == other._len and list(self) == list(other)
+    
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+    
+    def __repr__(self) -> str:
+        return f"OrderLines({list(self)!r})"
+
+_NO_LINES = OrderLines()
+
+@dataclass(frozen=True, slots=True)
 class OrderAggregate:
     """Immutable aggregate state rebuilt from events."""
     order_id: str
     customer_id: str
     status: OrderStatus
-    items: List[dict]
+    items: OrderLines
     total: Decimal
     version: int
     
@@ -155,7 +337,7 @@ class OrderAggregate:
             order_id=order_id,
             customer_id="",
             status=OrderStatus.DRAFT,
-            items=[],
+            items=_NO_LINES,
             total=Decimal('0'),
             version=0
         )
@@ -172,11 +354,7 @@ class OrderAggregate:
                 version=event.version
             )
         elif isinstance(event, ItemAdded):
-            new_items = self.items + [{
-                'product_id': event.product_id,
-                'quantity': event.quantity,
-                'price': event.price
-            }]
+            new_items = self.items.append(OrderLine(event.product_id, event.quantity, event.price))
             new_total = self.total + (event.price * event.quantity)
             return OrderAggregate(
                 order_id=self.order_id,
@@ -196,14 +374,147 @@ class OrderAggregate:
                 version=event.version
             )
         return self
+    
+    def to_snapshot(self) -> dict:
+        """Serialize state into a versioned, JSON-safe snapshot payload."""
+        return {
+            'schema_version': SNAPSHOT_SCHEMA_VERSION,
+            'order_id': self.order_id,
+            'customer_id': self.customer_id,
+            'status': self.status.value,
+            'items': [
+                {'product_id': line.product_id, 'quantity': line.quantity, 'price': str(line.price)}
+                for line in self.items
+            ],
+            'total': str(self.total),
+            'version': self.version
+        }
+    
+    @staticmethod
+    def from_snapshot(payload: dict) -> Optional[OrderAggregate]:
+        """Rebuild state from a snapshot, upcasting older schemas.
+        
+        Returns None for snapshots written by a newer schema so the caller
+        falls back to a full replay instead of misreading them.
+        """
+        payload = dict(payload)
+        schema = int(payload.get('schema_version', 0))
+        while schema < SNAPSHOT_SCHEMA_VERSION:
+            upcast = _SNAPSHOT_UPCASTERS.get(schema)
+            if upcast is None:
+                return None
+            payload = upcast(payload)
+            schema = int(payload['schema_version'])
+        if schema != SNAPSHOT_SCHEMA_VERSION:
+            return None
+        items = _NO_LINES
+        for item in payload['items']:
+            items = items.append(OrderLine(item['product_id'], int(item['quantity']), Decimal(item['price'])))
+        return OrderAggregate(
+            order_id=payload['order_id'],
+            customer_id=payload['customer_id'],
+            status=OrderStatus(payload['status']),
+            items=items,
+            total=Decimal(payload['total']),
+            version=int(payload['version'])
+        )
+
+# Snapshots
+SNAPSHOT_SCHEMA_VERSION = 1
+
+# schema_version -> function migrating a payload to the next schema_version
+_SNAPSHOT_UPCASTERS: Dict[int, Callable[[dict], dict]] = {}
+
+class SnapshotStore(Protocol):
+    """Latest-snapshot-per-aggregate storage interface."""
+    
+    def load(self, aggregate_id: str) -> Result[Optional[dict]]: ...
+    
+    def save(self, aggregate_id: str, payload: dict) -> Result[bool]: ...
+
+class DynamoDBSnapshotStore:
+    """Keeps only the newest snapshot per aggregate in DynamoDB."""
+    
+    def __init__(self, table_name: str):
+        self.dynamodb = boto3.resource('dynamodb')
+        self.table = self.dynamodb.Table(table_name)
+        self.logger = logger.bind(component="SnapshotStore")
+    
+    @xray_recorder.capture('load_snapshot')
+    def load(self, aggregate_id: str) -> Result[Optional[dict]]:
+        try:
+            response = self.table.get_item(Key={'aggregate_id': aggregate_id}, ConsistentRead=True)
+            item = response.get('Item')
+            return Result.success(json.loads(item['payload']) if item else None)
+        except ClientError as e:
+            return Result.failure(f"SnapshotLoadError: {str(e)}")
+    
+    @xray_recorder.capture('save_snapshot')
+    def save(self, aggregate_id: str, payload: dict) -> Result[bool]:
+        """Write snapshot unless a newer one is already stored."""
+        try:
+            self.table.put_item(
+                Item={
+                    'aggregate_id': aggregate_id,
+                    'version': payload['version'],
+                    'schema_version': payload['schema_version'],
+                    'payload': json.dumps(payload)
+                },
+                ConditionExpression='attribute_not_exists(aggregate_id) OR version < :v',
+                ExpressionAttributeValues={':v': payload['version']}
+            )
+            return Result.success(True)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return Result.success(False)
+            return Result.failure(f"SnapshotSaveError: {str(e)}")
+
+class SQLiteSnapshotStore:
+    """Local snapshot store for tests and development (in-memory by default)."""
+    
+    def __init__(self, path: str = ":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "aggregate_id TEXT PRIMARY KEY, version INTEGER NOT NULL, payload TEXT NOT NULL)"
+        )
+    
+    def load(self, aggregate_id: str) -> Result[Optional[dict]]:
+        row = self.conn.execute(
+            "SELECT payload FROM snapshots WHERE aggregate_id = ?", (aggregate_id,)
+        ).fetchone()
+        return Result.success(json.loads(row[0]) if row else None)
+    
+    def save(self, aggregate_id: str, payload: dict) -> Result[bool]:
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO snapshots (aggregate_id, version, payload) VALUES (?, ?, ?) "
+                "ON CONFLICT(aggregate_id) DO UPDATE SET version = excluded.version, "
+                "payload = excluded.payload WHERE excluded.version > snapshots.version",
+                (aggregate_id, payload['version'], json.dumps(payload))
+            )
+        return Result.success(cursor.rowcount > 0)
+
+# Attempts and base backoff (seconds) for transactions cancelled by TransactionConflict
+TRANSACTION_ATTEMPTS = 3
+TRANSACTION_BACKOFF = 0.05
+
+@dataclass
+class BatchAppendOutcome:
+    """Which events a batch append persisted, and why the rest were not."""
+    written: Set[str] = field(default_factory=set)
+    errors: Dict[str, str] = field(default_factory=dict)
 
 # Repository with functional interface
 class EventStore:
     """Event store with functional error handling."""
     
-    def __init__(self, table_name: str):
+    def __init__(self, table_name: str, page_size: Optional[int] = None,
+                 payload_encoding: str = 'attributes'):
         self.dynamodb = boto3.resource('dynamodb')
         self.table = self.dynamodb.Table(table_name)
+        self.page_size = page_size
+        self.binary_payload = payload_encoding == 'binary'
         self.logger = logger.bind(component="EventStore")
     
     @xray_recorder.capture('append_event')
@@ -211,7 +522,7 @@ class EventStore:
         """Append event with optimistic concurrency control."""
         try:
             self.table.put_item(
-                Item=event.to_dict(),
+                Item=encode_event(event, self.binary_payload),
                 ConditionExpression='attribute_not_exists(aggregate_id) AND attribute_not_exists(version)'
             )
             self.logger.info("event_appended", 
@@ -224,69 +535,302 @@ class EventStore:
                 return Result.failure("ConcurrencyConflict")
             return Result.failure(f"DynamoDBError: {str(e)}")
     
+    @xray_recorder.capture('append_batch')
+    def append_batch(self, events: List[Event], transaction_size: int = 100) -> BatchAppendOutcome:
+        """Append many events with TransactWriteItems, keeping per-event conditions.
+        
+        Each aggregate's events stay in one transaction where they fit, so an
+        aggregate either advances fully or not at all. Aggregates larger than a
+        transaction are written as ordered chunks and stop at the first failure.
+        A conflicting aggregate is dropped and the rest of its chunk retried once.
+        """
+        outcome = BatchAppendOutcome()
+        by_aggregate: Dict[str, List[Event]] = {}
+        for event in events:
+            by_aggregate.setdefault(event.aggregate_id, []).append(event)
+        
+        chunk: List[Event] = []
+        for aggregate_events in by_aggregate.values():
+            if chunk and len(chunk) + len(aggregate_events) > transaction_size:
+                self._write_transaction(chunk, outcome)
+                chunk = []
+            for start in range(0, len(aggregate_events), transaction_size):
+                part = aggregate_events[start:start + transaction_size]
+                if len(chunk) + len(part) > transaction_size:
+                    self._write_transaction(chunk, outcome)
+                    chunk = []
+                chunk.extend(part)
+        if chunk:
+            self._write_transaction(chunk, outcome)
+        return outcome
+    
+    def _write_transaction(self, events: List[Event], outcome: BatchAppendOutcome, retry: bool = True):
+        events = [e for e in events if e.aggregate_id not in outcome.errors]
+        if not events:
+            return
+        serializer = TypeSerializer()
+        transact_items = [
+            {'Put': {
+                'TableName': self.table.name,
+                'Item': {k: serializer.serialize(v) for k, v in encode_event(event, self.binary_payload).items()},
+                'ConditionExpression': 'attribute_not_exists(aggregate_id) AND attribute_not_exists(version)'
+            }}
+            for event in events
+        ]
+        for attempt in range(TRANSACTION_ATTEMPTS):
+            try:
+                self.dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+                break
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    for event in events:
+                        outcome.errors[event.aggregate_id] = f"DynamoDBError: {str(e)}"
+                    return
+                reasons = e.response.get('CancellationReasons', [])
+                conflicted = {
+                    event.aggregate_id
+                    for event, reason in zip(events, reasons)
+                    if reason.get('Code') == 'ConditionalCheckFailed'
+                }
+                # TransactionConflict: another transaction held one of our items
+                if (not conflicted and attempt + 1 < TRANSACTION_ATTEMPTS and
+                        any(reason.get('Code') == 'TransactionConflict' for reason in reasons)):
+                    time.sleep(random.uniform(0, TRANSACTION_BACKOFF * 2 ** attempt))
+                    continue
+                if not conflicted or not retry:
+                    for event in events:
+                        outcome.errors.setdefault(event.aggregate_id, f"TransactionCanceled: {str(e)}")
+                    return
+                for aggregate_id in conflicted:
+                    outcome.errors[aggregate_id] = "ConcurrencyConflict"
+                self._write_transaction(events, outcome, retry=False)
+                return
+        outcome.written.update(event.event_id for event in events)
+        self.logger.info("events_appended", count=len(events),
+                         aggregates=len({e.aggregate_id for e in events}))
+    
     @xray_recorder.capture('load_events')
-    def load(self, aggregate_id: str) -> Result[List[Event]]:
-        """Load all events for aggregate."""
+    def load(self, aggregate_id: str, after_version: int = 0) -> Result[List[Event]]:
+        """Load events for aggregate with version greater than after_version."""
         try:
-            response = self.table.query(
-                KeyConditionExpression='aggregate_id = :id',
-                ExpressionAttributeValues={':id': aggregate_id},
-                ScanIndexForward=True
-            )
-            events = [self._deserialize_event(item) for item in response['Items']]
-            return Result.success(events)
+            return Result.success(list(self.stream(aggregate_id, after_version)))
+        except ClientError as e:
+            return Result.failure(f"LoadError: {str(e)}")
+    
+    @xray_recorder.capture('fold_events')
+    def fold(self, aggregate_id: str, initial: T, fn: Callable[[T, Event], T],
+             after_version: int = 0) -> Result[T]:
+        """Fold events into initial one page at a time without materializing the stream."""
+        try:
+            state = initial
+            for event in self.stream(aggregate_id, after_version):
+                state = fn(state, event)
+            return Result.success(state)
         except ClientError as e:
             return Result.failure(f"LoadError: {str(e)}")
     
-    def _deserialize_event(self, item: dict) -> Event:
-        """Deserialize DynamoDB item to Event."""
-        event_type = EventType(item['event_type'])
+    def stream(self, aggregate_id: str, after_version: int = 0) -> Iterator[Event]:
+        """Lazily yield events in version order, following LastEvaluatedKey.
         
-        if event_type == EventType.ORDER_CREATED:
-            return OrderCreated(**item)
-        elif event_type == EventType.ITEM_ADDED:
-            item['price'] = Decimal(str(item['price']))
-            return ItemAdded(**item)
-        elif event_type == EventType.ORDER_CONFIRMED:
-            return OrderConfirmed(**item)
+        Raises ClientError; use fold/load for Result-wrapped access.
+        """
+        query = {
+            'KeyConditionExpression': '#aggregate_id = :id AND #version > :v',
+            'ProjectionExpression': _EVENT_PROJECTION,
+            'ExpressionAttributeNames': _EVENT_ATTRIBUTE_NAMES,
+            'ExpressionAttributeValues': {':id': aggregate_id, ':v': after_version},
+            'ScanIndexForward': True,
+            'ConsistentRead': True
+        }
+        if self.page_size:
+            query['Limit'] = self.page_size
         
-        raise ValueError(f"Unknown event type: {event_type}")
+        while True:
+            response = self.table.query(**query)
+            for item in response['Items']:
+                yield decode_event(item)
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return
+            query['ExclusiveStartKey'] = last_key
+
+
+# Only fetch attributes the event types declare (plus the binary payload)
+_EVENT_ATTRIBUTES = tuple(dict.fromkeys(
+    [f.name for cls in (OrderCreated, ItemAdded, OrderConfirmed) for f in fields(cls)] + ['payload']
+))
+_EVENT_ATTRIBUTE_NAMES = {f'#{name}': name for name in _EVENT_ATTRIBUTES}
+_EVENT_PROJECTION = ', '.join(_EVENT_ATTRIBUTE_NAMES)
+
+class AggregateCache:
+    """Bounded LRU of folded aggregates, reused across warm invocations."""
+    
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, OrderAggregate] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, aggregate_id: str) -> Optional[OrderAggregate]:
+        agg = self._entries.get(aggregate_id)
+        if agg is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(aggregate_id)
+        self.hits += 1
+        return agg
+    
+    def put(self, aggregate_id: str, agg: OrderAggregate):
+        self._entries[aggregate_id] = agg
+        self._entries.move_to_end(aggregate_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, aggregate_id: str):
+        self._entries.pop(aggregate_id, None)
 
 # Command Handler with functional composition
 class CommandHandler:
     """FAANG-grade command handler with functional patterns."""
     
-    def __init__(self, event_store: EventStore):
+    def __init__(self, event_store: EventStore, snapshot_store: Optional[SnapshotStore] = None,
+                 snapshot_every: int = 100, cache: Optional[AggregateCache] = None):
+        if snapshot_every < 1:
+            raise ValueError(f"snapshot_every must be at least 1, got {snapshot_every}")
         self.event_store = event_store
+        self.snapshot_store = snapshot_store
+        self.snapshot_every = snapshot_every
+        self.cache = cache
         self.logger = logger.bind(component="CommandHandler")
     
     def handle(self, command: C, handler_fn: Callable[[C, OrderAggregate], Result[Event]]) -> Result[Event]:
         """Generic command handling with functional composition."""
         return (
             self._load_aggregate(command.aggregate_id)
-            .flat_map(lambda agg: handler_fn(command, agg))
-            .flat_map(self.event_store.append)
+            .flat_map(lambda agg: self._decide_and_append(command, handler_fn, agg))
         )
     
+    def _decide_and_append(self, command: C, handler_fn: Callable[[C, OrderAggregate], Result[Event]],
+                           agg: OrderAggregate) -> Result[Event]:
+        result = handler_fn(command, agg).flat_map(self.event_store.append)
+        if result.is_failure:
+            if result.error == "ConcurrencyConflict" and self.cache is not None:
+                # Another writer got ahead of our cached state
+                self.cache.invalidate(command.aggregate_id)
+            return result
+        return Result.success(self._after_append(agg, result.value))
+    
+    def handle_batch(self, commands: List[Tuple[C, Callable[[C, OrderAggregate], Result[Event]]]]
+                     ) -> List[Result[Event]]:
+        """Handle many commands with one load per aggregate and transactional writes.
+        
+        Commands for the same aggregate are decided in input order against the
+        state produced by the previous ones. A command repeating an earlier
+        idempotency_key for the same aggregate gets that command's result
+        instead of being applied twice. Results are returned in input order.
+        """
+        results: List[Optional[Result[Event]]] = [None] * len(commands)
+        by_aggregate: Dict[str, List[int]] = {}
+        first_by_key: Dict[Tuple[str, str], int] = {}
+        duplicates: Dict[int, int] = {}
+        for index, (command, _) in enumerate(commands):
+            key = (command.aggregate_id, command.idempotency_key)
+            if key in first_by_key:
+                duplicates[index] = first_by_key[key]
+                continue
+            first_by_key[key] = index
+            by_aggregate.setdefault(command.aggregate_id, []).append(index)
+        
+        pending: List[Event] = []
+        pending_index: Dict[str, int] = {}
+        states: Dict[str, Tuple[OrderAggregate, OrderAggregate]] = {}
+        for aggregate_id, indices in by_aggregate.items():
+            loaded = self._load_aggregate(aggregate_id)
+            if loaded.is_failure:
+                for index in indices:
+                    results[index] = loaded
+                continue
+            agg = loaded.value
+            for index in indices:
+                command, handler_fn = commands[index]
+                decided = handler_fn(command, agg)
+                if decided.is_success:
+                    agg = agg.apply(decided.value)
+                    pending.append(decided.value)
+                    pending_index[decided.value.event_id] = index
+                results[index] = decided
+            states[aggregate_id] = (loaded.value, agg)
+        
+        outcome = self.event_store.append_batch(pending) if pending else BatchAppendOutcome()
+        for event in pending:
+            if event.event_id not in outcome.written:
+                error = outcome.errors.get(event.aggregate_id, "NotWritten")
+                results[pending_index[event.event_id]] = Result.failure(error)
+        for index, original in duplicates.items():
+            results[index] = results[original]
+        
+        for aggregate_id, (start, final) in states.items():
+            if aggregate_id in outcome.errors:
+                if self.cache is not None:
+                    self.cache.invalidate(aggregate_id)
+                continue
+            if final.version == start.version:
+                continue
+            if self.cache is not None:
+                self.cache.put(aggregate_id, final)
+            if (self.snapshot_store is not None and
+                    final.version // self.snapshot_every > start.version // self.snapshot_every):
+                saved = self.snapshot_store.save(aggregate_id, final.to_snapshot())
+                if saved.is_failure:
+                    self.logger.warning("snapshot_save_failed", aggregate_id=aggregate_id,
+                                        version=final.version, error=saved.error)
+        return results
+    
     def _load_aggregate(self, aggregate_id: str) -> Result[OrderAggregate]:
-        """Load and rebuild aggregate from events."""
-        return (
-            self.event_store.load(aggregate_id)
-            .map(lambda events: self._rebuild_aggregate(aggregate_id, events))
+        """Start from cached state or the latest snapshot and fold only newer events."""
+        base = self.cache.get(aggregate_id) if self.cache is not None else None
+        if base is None:
+            base = self._load_snapshot(aggregate_id)
+        result = self.event_store.fold(
+            aggregate_id, base, lambda agg, evt: agg.apply(evt), after_version=base.version
         )
+        if result.is_success and self.cache is not None:
+            self.cache.put(aggregate_id, result.value)
+        return result
     
-    def _rebuild_aggregate(self, aggregate_id: str, events: List[Event]) -> OrderAggregate:
-        """Fold events into aggregate state."""
-        initial = OrderAggregate.empty(aggregate_id)
-        return self._fold_left(initial, events, lambda agg, evt: agg.apply(evt))
+    def _load_snapshot(self, aggregate_id: str) -> OrderAggregate:
+        """Return snapshot state, or empty state when none is usable."""
+        empty = OrderAggregate.empty(aggregate_id)
+        if self.snapshot_store is None:
+            return empty
+        result = self.snapshot_store.load(aggregate_id)
+        if result.is_failure:
+            self.logger.warning("snapshot_load_failed", aggregate_id=aggregate_id, error=result.error)
+            return empty
+        if result.value is None:
+            return empty
+        snapshot = OrderAggregate.from_snapshot(result.value)
+        if snapshot is None:
+            self.logger.warning("snapshot_schema_unsupported", aggregate_id=aggregate_id,
+                                schema_version=result.value.get('schema_version'))
+            return empty
+        return snapshot
     
-    @staticmethod
-    def _fold_left(initial: T, items: List, fn: Callable[[T, any], T]) -> T:
-        """Functional fold/reduce operation."""
-        result = initial
-        for item in items:
-            result = fn(result, item)
-        return result
+    def _after_append(self, agg: OrderAggregate, event: Event) -> Event:
+        """Advance cached state and snapshot every snapshot_every versions.
+        
+        Snapshot failures are logged and never fail the command.
+        """
+        new_state = agg.apply(event)
+        if self.cache is not None:
+            self.cache.put(event.aggregate_id, new_state)
+        if self.snapshot_store is not None and event.version % self.snapshot_every == 0:
+            result = self.snapshot_store.save(event.aggregate_id, new_state.to_snapshot())
+            if result.is_failure:
+                self.logger.warning("snapshot_save_failed", aggregate_id=event.aggregate_id,
+                                    version=event.version, error=result.error)
+        return event
+
 
 # Command Handlers
 @dataclass(frozen=True)
@@ -401,6 +945,59 @@ def create_handler(event_store: EventStore, command_handler: CommandHandler):
     
     return handler
 
+def create_batch_handler(command_handler: CommandHandler):
+    """Factory for an SQS-triggered Lambda that handles a whole batch at once.
+    
+    Each record body is {"command": "<type>", "body": {...}}. A command without
+    an idempotency_key (in its body or next to "command") is keyed by the SQS
+    messageId, so redelivered duplicates within a batch are applied once.
+    Only retryable failures (conflicts, store errors) are returned as
+    batchItemFailures; invalid commands and business-rule rejections are
+    logged and dropped.
+    """
+    
+    @xray_recorder.capture('batch_handler')
+    def handler(event: dict, context) -> dict:
+        parsed = []
+        for record in event.get('Records', []):
+            message_id = None
+            try:
+                message_id = record['messageId']
+                message = json.loads(record['body'])
+                body = dict(message['body'])
+                body.setdefault('idempotency_key', message.get('idempotency_key', message_id))
+                cmd = (
+                    _parse_command(message['command'], body)
+                    .flat_map(lambda c: c.validate().map(lambda _: c))
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                cmd = Result.failure(f"ParseError: {str(e)}")
+            if cmd.is_failure:
+                logger.error("command_rejected", message_id=message_id, error=cmd.error)
+                continue
+            parsed.append((message_id, cmd.value))
+        
+        results = command_handler.handle_batch(
+            [(cmd, _COMMAND_HANDLERS[type(cmd)]) for _, cmd in parsed]
+        )
+        
+        failures = []
+        for (message_id, _), result in zip(parsed, results):
+            if result.is_success:
+                continue
+            if _is_retryable(result.error):
+                failures.append({'itemIdentifier': message_id})
+            else:
+                logger.error("command_failed", message_id=message_id, error=result.error)
+        return {'batchItemFailures': failures}
+    
+    return handler
+
+def _is_retryable(error: str) -> bool:
+    return error.split(':', 1)[0] in (
+        "ConcurrencyConflict", "DynamoDBError", "TransactionCanceled", "LoadError", "NotWritten"
+    )
+
 def _parse_command(command_type: str, body: dict) -> Result[Command]:
     """Parse command from request."""
     try:
@@ -415,17 +1012,25 @@ def _parse_command(command_type: str, body: dict) -> Result[Command]:
     except Exception as e:
         return Result.failure(f"ParseError: {str(e)}")
 
+_COMMAND_HANDLERS: Dict[type, Callable[[Command, OrderAggregate], Result[Event]]] = {
+    CreateOrderCommand: handle_create_order,
+    AddItemCommand: handle_add_item,
+    ConfirmOrderCommand: handle_confirm_order,
+}
+
 def _execute_command(cmd: Command, handler: CommandHandler) -> Result[Event]:
     """Execute command with appropriate handler."""
-    if isinstance(cmd, CreateOrderCommand):
-        return handler.handle(cmd, handle_create_order)
-    elif isinstance(cmd, AddItemCommand):
-        return handler.handle(cmd, handle_add_item)
-    elif isinstance(cmd, ConfirmOrderCommand):
-        return handler.handle(cmd, handle_confirm_order)
-    return Result.failure("NoHandlerFound")
+    handler_fn = _COMMAND_HANDLERS.get(type(cmd))
+    if handler_fn is None:
+        return Result.failure("NoHandlerFound")
+    return handler.handle(cmd, handler_fn)
 
 # Bootstrap
-event_store = EventStore('event-store')
-command_handler = CommandHandler(event_store)
+event_store = EventStore(os.environ.get('EVENT_STORE_TABLE', 'event-store'))
+command_handler = CommandHandler(
+    event_store,
+    DynamoDBSnapshotStore(os.environ.get('SNAPSHOT_TABLE', 'event-store-snapshots')),
+    cache=AggregateCache(max_size=1024)
+)
 lambda_handler = create_handler(event_store, command_handler)
+sqs_batch_handler = create_batch_handler(command_handler)
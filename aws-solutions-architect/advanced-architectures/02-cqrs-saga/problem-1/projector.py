@@ -3,115 +3,240 @@
 
 import boto3
 import json
+import logging
 import os
+import random
+import time
+from collections import defaultdict
 from decimal import Decimal
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 dynamodb = boto3.resource('dynamodb')
 ORDERS_TABLE = os.environ['ORDERS_TABLE']
 INVENTORY_TABLE = os.environ['INVENTORY_TABLE']
 
 orders_table = dynamodb.Table(ORDERS_TABLE)
-inventory_table = dynamodb.Table(INVENTORY_TABLE)
+serializer = TypeSerializer()
+
+# TransactWriteItems takes 100 items: the order plus at most 99 products
+MAX_PRODUCTS_PER_WRITE = 99
+# Attempts for transactions cancelled by TransactionConflict on a shared product
+CONFLICT_ATTEMPTS = 5
 
 def handler(event, context):
-    """Project events to read models."""
-    
-    for record in event['Records']:
-        if record['eventName'] == 'INSERT':
-            new_image = record['dynamodb']['NewImage']
-            
-            event_type = new_image['eventType']['S']
-            event_data = json.loads(new_image['eventData']['S'])
-            
-            if event_type == 'OrderCreated':
-                project_order_created(event_data)
-            elif event_type == 'ItemAdded':
-                project_item_added(event_data)
-            elif event_type == 'OrderConfirmed':
-                project_order_confirmed(event_data)
-            elif event_type == 'OrderCancelled':
-                project_order_cancelled(event_data)
+    """Project a stream batch to read models with one transaction per order.
     
+    Events are grouped by orderId and folded in memory first, so an order
+    that received many events in this batch costs a single TransactWriteItems
+    covering both its read-model row and its inventory reservations.
+    """
+    project_events(stream_events(event['Records']))
     return {'statusCode': 200}
 
-def project_order_created(data):
-    """Project OrderCreated event."""
-    orders_table.put_item(
-        Item={
-            'orderId': data['orderId'],
-            'customerId': data['customerId'],
-            'status': 'draft',
-            'items': [],
-            'totalAmount': Decimal('0'),
-            'createdAt': data['createdAt']
-        }
-    )
+def stream_events(records):
+    """Yield (version, eventType, eventData) for INSERT stream records."""
+    for record in records:
+        if record['eventName'] != 'INSERT':
+            continue
+        new_image = record['dynamodb']['NewImage']
+        yield (
+            int(new_image['version']['N']),
+            new_image['eventType']['S'],
+            json.loads(new_image['eventData']['S'])
+        )
 
-def project_item_added(data):
-    """Project ItemAdded event."""
-    order_id = data['orderId']
-    
-    # Get current order
-    response = orders_table.get_item(Key={'orderId': order_id})
-    order = response['Item']
+def project_events(events):
+    """Project (version, eventType, eventData) tuples; return how many were read.
     
-    # Add item
-    order['items'].append({
-        'productId': data['productId'],
-        'quantity': data['quantity'],
-        'price': Decimal(str(data['price']))
-    })
+    Events for an order must arrive in version order, as they do within a
+    stream shard or a scan of one partition.
+    """
+    orders = group_by_order(events)
+    for order_id, order_events in orders.items():
+        project_order(order_id, order_events)
+    return sum(len(order_events) for order_events in orders.values())
+
+def group_by_order(events):
+    """Group events by orderId, preserving their order."""
+    orders = {}
+    for version, event_type, event_data in events:
+        orders.setdefault(event_data['orderId'], []).append((version, event_type, event_data))
+    return orders
+
+def split_runs(order_events):
+    """Split an order's events into runs that each touch at most MAX_PRODUCTS_PER_WRITE products."""
+    runs, run, products = [], [], set()
+    for event in order_events:
+        product_id = event[2]['productId'] if event[1] == 'ItemAdded' else None
+        if product_id is not None and product_id not in products:
+            if len(products) == MAX_PRODUCTS_PER_WRITE:
+                runs.append(run)
+                run, products = [], set()
+            products.add(product_id)
+        run.append(event)
+    if run:
+        runs.append(run)
+    return runs
+
+def project_order(order_id, order_events):
+    """Apply one order's events that are newer than its recorded lastVersion."""
+    state = None
+    for run in split_runs(order_events):
+        state = project_run(order_id, run, state)
+
+def project_run(order_id, run, state):
+    """Write one run of events atomically; return the order's state afterwards.
     
-    # Update total
-    order['totalAmount'] = sum(
-        Decimal(str(item['price'])) * item['quantity']
-        for item in order['items']
-    )
+    state is the read model's {'lastVersion', 'items'} when known, else None.
+    Without it the write is optimistic: it only succeeds if every event in the
+    run is newer than lastVersion. On conflict (a retried or overlapping
+    batch) the order is read back and only the events above its lastVersion
+    are written. Cancellations always read it, to release the held items.
+    """
+    attempt = 0
+    while True:
+        if state is None and any(event_type == 'OrderCancelled' for _, event_type, _ in run):
+            state = read_order(order_id)
+        if state is not None:
+            seen = state['lastVersion']
+            if run[0][0] <= seen:
+                logger.info("Skipping already projected events for %s (versions %d-%d)",
+                            order_id, run[0][0], min(run[-1][0], seen))
+                run = [event for event in run if event[0] > seen]
+                if not run:
+                    return state
+        
+        projection = fold_order_events(run)
+        deltas = dict(projection['reserved'])
+        if projection['cancelled']:
+            # Release everything the order holds, including items added in this run
+            for item in state['items'] + projection['items']:
+                deltas[item['productId']] = deltas.get(item['productId'], 0) - int(item['quantity'])
+        
+        try:
+            write_projection(order_id, projection, deltas, state)
+        except ClientError as e:
+            reasons = [r.get('Code') for r in e.response.get('CancellationReasons', [])]
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            if reasons and reasons[0] == 'ConditionalCheckFailed':
+                state = read_order(order_id)
+                continue
+            attempt += 1
+            if 'TransactionConflict' not in reasons or attempt >= CONFLICT_ATTEMPTS:
+                raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+            continue
+        
+        if state is None:
+            return None
+        return {'lastVersion': projection['last_version'], 'items': state['items'] + projection['items']}
+
+def read_order(order_id):
+    """Read the order's projected lastVersion and items (0 and [] if not projected yet)."""
+    item = orders_table.get_item(
+        Key={'orderId': order_id},
+        ProjectionExpression='#lastVersion, #items',
+        ExpressionAttributeNames={'#lastVersion': 'lastVersion', '#items': 'items'},
+        ConsistentRead=True
+    ).get('Item', {})
+    return {'lastVersion': int(item.get('lastVersion', 0)), 'items': list(item.get('items', []))}
+
+def fold_order_events(order_events):
+    """Fold one order's events into the changes to write."""
+    projection = {
+        'first_version': order_events[0][0],
+        'last_version': order_events[-1][0],
+        'set': {},
+        'items': [],
+        'amount': Decimal('0'),
+        'reserved': defaultdict(int),
+        'cancelled': False
+    }
     
-    orders_table.put_item(Item=order)
+    for _, event_type, data in order_events:
+        if event_type == 'OrderCreated':
+            projection['set'].update({
+                'customerId': data['customerId'],
+                'status': 'draft',
+                'createdAt': data['createdAt']
+            })
+        elif event_type == 'ItemAdded':
+            price = Decimal(str(data['price']))
+            quantity = int(data['quantity'])
+            projection['items'].append({
+                'productId': data['productId'],
+                'quantity': quantity,
+                'price': price
+            })
+            projection['amount'] += price * quantity
+            projection['reserved'][data['productId']] += quantity
+        elif event_type == 'OrderConfirmed':
+            projection['set'].update({'status': 'confirmed', 'confirmedAt': data['confirmedAt']})
+        elif event_type == 'OrderCancelled':
+            projection['set'].update({'status': 'cancelled', 'cancelledAt': data['cancelledAt']})
+            projection['cancelled'] = True
     
-    # Update inventory
-    inventory_table.update_item(
-        Key={'productId': data['productId']},
-        UpdateExpression='ADD reserved :qty',
-        ExpressionAttributeValues={':qty': data['quantity']}
-    )
-
-def project_order_confirmed(data):
-    """Project OrderConfirmed event."""
-    orders_table.update_item(
-        Key={'orderId': data['orderId']},
-        UpdateExpression='SET #status = :status, confirmedAt = :confirmed',
-        ExpressionAttributeNames={'#status': 'status'},
-        ExpressionAttributeValues={
-            ':status': 'confirmed',
-            ':confirmed': data['confirmedAt']
-        }
-    )
+    return projection
 
-def project_order_cancelled(data):
-    """Project OrderCancelled event."""
-    order_id = data['orderId']
+def write_projection(order_id, projection, deltas, state):
+    """Write an order's folded changes and its inventory deltas in one transaction.
     
-    # Get order to release inventory
-    response = orders_table.get_item(Key={'orderId': order_id})
-    order = response['Item']
+    The order update is conditioned on lastVersion: on the value in state
+    when known, otherwise on it being older than the run's first event.
+    """
+    names = {'#lastVersion': 'lastVersion'}
+    values = {':last': projection['last_version']}
+    set_clauses = ['#lastVersion = :last']
     
-    # Release inventory
-    for item in order['items']:
-        inventory_table.update_item(
-            Key={'productId': item['productId']},
-            UpdateExpression='ADD reserved :qty',
-            ExpressionAttributeValues={':qty': -item['quantity']}
-        )
+    for i, (attribute, value) in enumerate(projection['set'].items()):
+        names[f'#s{i}'] = attribute
+        values[f':s{i}'] = value
+        set_clauses.append(f'#s{i} = :s{i}')
     
-    # Update order status
-    orders_table.update_item(
-        Key={'orderId': order_id},
-        UpdateExpression='SET #status = :status, cancelledAt = :cancelled',
-        ExpressionAttributeNames={'#status': 'status'},
-        ExpressionAttributeValues={
-            ':status': 'cancelled',
-            ':cancelled': data['cancelledAt']
-        }
-    )
+    if projection['items']:
+        names['#items'] = 'items'
+        values[':items'] = projection['items']
+        values[':empty'] = []
+        set_clauses.append('#items = list_append(if_not_exists(#items, :empty), :items)')
+    
+    update_expression = 'SET ' + ', '.join(set_clauses)
+    if projection['items']:
+        names['#total'] = 'totalAmount'
+        values[':amount'] = projection['amount']
+        update_expression += ' ADD #total :amount'
+    
+    if state is None:
+        values[':first'] = projection['first_version']
+        condition = 'attribute_not_exists(#lastVersion) OR #lastVersion < :first'
+    elif state['lastVersion'] == 0:
+        condition = 'attribute_not_exists(#lastVersion)'
+    else:
+        values[':seen'] = state['lastVersion']
+        condition = '#lastVersion = :seen'
+    
+    deltas = {product_id: quantity for product_id, quantity in deltas.items() if quantity}
+    if len(deltas) > MAX_PRODUCTS_PER_WRITE:
+        raise ValueError(f"Order {order_id} touches {len(deltas)} products; "
+                         f"at most {MAX_PRODUCTS_PER_WRITE} fit in one transaction")
+    
+    transact_items = [{'Update': {
+        'TableName': ORDERS_TABLE,
+        'Key': {'orderId': serializer.serialize(order_id)},
+        'UpdateExpression': update_expression,
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': {k: serializer.serialize(v) for k, v in values.items()}
+    }}]
+    for product_id, quantity in deltas.items():
+        transact_items.append({'Update': {
+            'TableName': INVENTORY_TABLE,
+            'Key': {'productId': serializer.serialize(product_id)},
+            'UpdateExpression': 'ADD reserved :qty',
+            'ExpressionAttributeValues': {':qty': serializer.serialize(quantity)}
+        }})
+    dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
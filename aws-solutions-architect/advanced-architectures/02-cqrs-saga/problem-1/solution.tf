@@ -48,6 +48,18 @@ resource "aws_dynamodb_table" "event_store" {
   }
 }
 
+# Snapshot Store - latest aggregate snapshot, written by the command handler
+resource "aws_dynamodb_table" "event_store_snapshots" {
+  name         = "event-store-snapshots"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "aggregate_id"
+
+  attribute {
+    name = "aggregate_id"
+    type = "S"
+  }
+}
+
 # Read Model - Orders
 resource "aws_dynamodb_table" "orders_read" {
   name         = "orders-read-model"
@@ -97,6 +109,7 @@ resource "aws_lambda_function" "command_handler" {
   environment {
     variables = {
       EVENT_STORE_TABLE = aws_dynamodb_table.event_store.name
+      SNAPSHOT_TABLE    = aws_dynamodb_table.event_store_snapshots.name
     }
   }
 }
@@ -220,6 +233,7 @@ resource "aws_iam_role_policy" "lambda" {
         Resource = [
           aws_dynamodb_table.event_store.arn,
           "${aws_dynamodb_table.event_store.arn}/*",
+          aws_dynamodb_table.event_store_snapshots.arn,
           aws_dynamodb_table.orders_read.arn,
           "${aws_dynamodb_table.orders_read.arn}/*",
           aws_dynamodb_table.inventory_read.arn,
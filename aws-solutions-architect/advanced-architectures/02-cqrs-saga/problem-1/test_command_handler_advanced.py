@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Tests for command_handler_advanced.py against an in-memory event table."""
+
+import json
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_XRAY_CONTEXT_MISSING', 'IGNORE_ERROR')
+sys.path.insert(0, os.path.dirname(__file__))
+
+import command_handler_advanced as cqrs  # noqa: E402
+
+def client_error(code, operation='PutItem', **extra):
+    return ClientError({'Error': {'Code': code, 'Message': code}, **extra}, operation)
+
+class FakeEventTable:
+    """Just enough of a DynamoDB Table (and its client) for EventStore."""
+    name = 'event-store'
+
+    def __init__(self):
+        self.items = {}
+        self.queries = []
+        self.transaction_conflicts = 0
+        self.meta = self
+        self.client = self
+
+    def put_item(self, Item, ConditionExpression=None):
+        key = (Item['aggregate_id'], int(Item['version']))
+        if key in self.items:
+            raise client_error('ConditionalCheckFailedException')
+        self.items[key] = dict(Item, version=Decimal(Item['version']))
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        values = kwargs['ExpressionAttributeValues']
+        after = kwargs.get('ExclusiveStartKey', {}).get('version', values[':v'])
+        rows = [item for (aggregate_id, version), item in sorted(self.items.items())
+                if aggregate_id == values[':id'] and version > after]
+        limit = kwargs.get('Limit')
+        response = {'Items': rows[:limit] if limit else rows}
+        if limit and len(rows) > limit:
+            last = response['Items'][-1]
+            response['LastEvaluatedKey'] = {'aggregate_id': last['aggregate_id'], 'version': last['version']}
+        return response
+
+    def transact_write_items(self, TransactItems):
+        deserializer = TypeDeserializer()
+        puts = [{k: deserializer.deserialize(v) for k, v in t['Put']['Item'].items()} for t in TransactItems]
+        reasons = [
+            {'Code': 'ConditionalCheckFailed' if (p['aggregate_id'], int(p['version'])) in self.items else 'None'}
+            for p in puts
+        ]
+        if self.transaction_conflicts:
+            self.transaction_conflicts -= 1
+            reasons = [{'Code': 'TransactionConflict'} for _ in puts]
+        if any(r['Code'] != 'None' for r in reasons):
+            raise client_error('TransactionCanceledException', 'TransactWriteItems', CancellationReasons=reasons)
+        for item in puts:
+            self.put_item(item)
+
+def make_store(table=None, **kwargs):
+    store = cqrs.EventStore('event-store', **kwargs)
+    store.table = store.dynamodb = table or FakeEventTable()
+    return store
+
+def create(handler, order_id):
+    return handler.handle(cqrs.CreateOrderCommand(order_id, 'cust-1', f'{order_id}-create'),
+                          cqrs.handle_create_order)
+
+def add_item(handler, order_id, n):
+    return handler.handle(cqrs.AddItemCommand(order_id, f'sku-{n}', 1, Decimal('2.50'), f'{order_id}-{n}'),
+                          cqrs.handle_add_item)
+
+def test_snapshot_every_must_be_positive():
+    with pytest.raises(ValueError):
+        cqrs.CommandHandler(make_store(), snapshot_every=0)
+
+def test_rehydration_folds_only_events_after_snapshot():
+    store = make_store()
+    snapshots = cqrs.SQLiteSnapshotStore()
+    handler = cqrs.CommandHandler(store, snapshots, snapshot_every=4)
+    assert create(handler, 'o-1').is_success
+    for n in range(5):
+        assert add_item(handler, 'o-1', n).is_success
+    assert snapshots.load('o-1').value['version'] == 4
+
+    fresh = cqrs.CommandHandler(store, snapshots, snapshot_every=4)
+    agg = fresh._load_aggregate('o-1').get_or_raise()
+    assert store.table.queries[-1]['ExpressionAttributeValues'][':v'] == 4
+    assert agg.version == 6
+    assert len(agg.items) == 5
+    assert agg.total == Decimal('12.50')
+
+def test_stream_follows_pages_with_projection():
+    store = make_store(page_size=2)
+    handler = cqrs.CommandHandler(store)
+    assert create(handler, 'o-1').is_success
+    for n in range(4):
+        assert add_item(handler, 'o-1', n).is_success
+
+    store.table.queries.clear()
+    events = store.load('o-1').get_or_raise()
+    assert [e.version for e in events] == [1, 2, 3, 4, 5]
+    assert len(store.table.queries) == 3
+    assert all(q['Limit'] == 2 and q['ProjectionExpression'] for q in store.table.queries)
+
+    store.table.queries.clear()
+    assert [e.version for e in store.load('o-1', after_version=3).get_or_raise()] == [4, 5]
+    assert store.table.queries[0]['ExpressionAttributeValues'][':v'] == 3
+
+def test_aggregates_are_hashable():
+    lines = cqrs.OrderLines().append(cqrs.OrderLine('sku-1', 1, Decimal('2')))
+    same = cqrs.OrderLines().append(cqrs.OrderLine('sku-1', 1, Decimal('2')))
+    a = cqrs.OrderAggregate('o-1', 'c', cqrs.OrderStatus.DRAFT, lines, Decimal('2'), 2)
+    b = cqrs.OrderAggregate('o-1', 'c', cqrs.OrderStatus.DRAFT, same, Decimal('2'), 2)
+    assert a == b and hash(a) == hash(b)
+    assert len({a, b}) == 1
+
+def test_cached_aggregate_catches_up_with_other_writers():
+    store = make_store()
+    cached = cqrs.CommandHandler(store, cache=cqrs.AggregateCache())
+    other = cqrs.CommandHandler(store)
+    assert create(cached, 'o-1').is_success
+    assert add_item(other, 'o-1', 1).is_success
+
+    store.table.queries.clear()
+    assert add_item(cached, 'o-1', 2).is_success
+    assert store.table.queries[0]['ExpressionAttributeValues'][':v'] == 1
+    assert cached.cache.get('o-1').version == 3
+    assert len(cached.cache.get('o-1').items) == 2
+
+def test_order_lines_share_structure_without_aliasing():
+    base = cqrs.OrderLines().append(cqrs.OrderLine('sku-1', 1, Decimal('1')))
+    left = base.append(cqrs.OrderLine('sku-2', 2, Decimal('2')))
+    right = base.append(cqrs.OrderLine('sku-3', 3, Decimal('3')))
+    assert [line.product_id for line in base] == ['sku-1']
+    assert [line.product_id for line in left] == ['sku-1', 'sku-2']
+    assert [line.product_id for line in right] == ['sku-1', 'sku-3']
+    assert left._last.prev is right._last.prev is base._last
+
+def test_snapshot_round_trip_keeps_line_order():
+    agg = cqrs.OrderAggregate.empty('o-1')
+    for version, sku in enumerate(['a', 'b', 'c'], start=1):
+        agg = agg.apply(cqrs.ItemAdded('e', 'o-1', version, product_id=sku, quantity=1, price=Decimal('1.10')))
+    restored = cqrs.OrderAggregate.from_snapshot(agg.to_snapshot())
+    assert restored == agg
+    assert [line.product_id for line in restored.items] == ['a', 'b', 'c']
+
+def sqs_record(message_id, command, body, **extra):
+    record = {'body': json.dumps({'command': command, 'body': body})}
+    if message_id is not None:
+        record['messageId'] = message_id
+    record.update(extra)
+    return record
+
+def test_batch_handler_drops_records_without_message_id():
+    store = make_store()
+    handler = cqrs.create_batch_handler(cqrs.CommandHandler(store))
+    response = handler({'Records': [
+        sqs_record(None, 'CreateOrder', {'aggregate_id': 'o-1', 'customer_id': 'c'}),
+        sqs_record('m-2', 'CreateOrder', {'aggregate_id': 'o-2', 'customer_id': 'c'}),
+    ]}, None)
+    assert response == {'batchItemFailures': []}
+    assert [key for key in store.table.items] == [('o-2', 1)]
+
+def test_batch_applies_repeated_idempotency_key_once():
+    store = make_store()
+    handler = cqrs.create_batch_handler(cqrs.CommandHandler(store))
+    add = {'aggregate_id': 'o-1', 'product_id': 'sku', 'quantity': 1, 'price': '2.50'}
+    response = handler({'Records': [
+        sqs_record('m-1', 'CreateOrder', {'aggregate_id': 'o-1', 'customer_id': 'c'}),
+        sqs_record('m-2', 'AddItem', dict(add, idempotency_key='add-1')),
+        sqs_record('m-3', 'AddItem', dict(add, idempotency_key='add-1')),
+        sqs_record('m-4', 'AddItem', add),
+    ]}, None)
+    assert response == {'batchItemFailures': []}
+    assert sorted(store.table.items) == [('o-1', 1), ('o-1', 2), ('o-1', 3)]
+
+def test_transaction_conflict_is_retried(monkeypatch):
+    monkeypatch.setattr(cqrs.time, 'sleep', lambda seconds: None)
+    store = make_store()
+    store.table.transaction_conflicts = 2
+    results = cqrs.CommandHandler(store).handle_batch([
+        (cqrs.CreateOrderCommand('o-1', 'c', 'k-1'), cqrs.handle_create_order),
+        (cqrs.CreateOrderCommand('o-2', 'c', 'k-2'), cqrs.handle_create_order),
+    ])
+    assert all(result.is_success for result in results)
+    assert store.table.transaction_conflicts == 0
+    assert len(store.table.items) == 2
+
+def test_transaction_conflict_gives_up_after_attempts(monkeypatch):
+    monkeypatch.setattr(cqrs.time, 'sleep', lambda seconds: None)
+    store = make_store()
+    store.table.transaction_conflicts = cqrs.TRANSACTION_ATTEMPTS
+    [result] = cqrs.CommandHandler(store).handle_batch([
+        (cqrs.CreateOrderCommand('o-1', 'c', 'k-1'), cqrs.handle_create_order),
+    ])
+    assert result.error.startswith('TransactionCanceled')
+    assert cqrs._is_retryable(result.error)
+    assert not store.table.items
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_event_codecs_round_trip(binary):
+    events = [
+        cqrs.OrderCreated('e-1', 'o-1', 1, customer_id='c-1'),
+        cqrs.ItemAdded('e-2', 'o-1', 2, product_id='sku-é', quantity=3, price=Decimal('19.99')),
+        cqrs.OrderConfirmed('e-3', 'o-1', 3),
+    ]
+    for event in events:
+        item = cqrs.encode_event(event, binary=binary)
+        assert ('payload' in item) is binary
+        # DynamoDB hands numbers back as Decimal
+        item['version'] = Decimal(item['version'])
+        assert cqrs.decode_event(item) == event
+
+def test_decode_rejects_unknown_event_type():
+    with pytest.raises(ValueError):
+        cqrs.decode_event({'event_type': 'OrderExploded', 'aggregate_id': 'o-1', 'version': 1})
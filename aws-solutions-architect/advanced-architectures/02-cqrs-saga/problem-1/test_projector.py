@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Tests for projector.py against in-memory read-model tables."""
+
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('ORDERS_TABLE', 'orders-read-model')
+os.environ.setdefault('INVENTORY_TABLE', 'inventory-read-model')
+sys.path.insert(0, os.path.dirname(__file__))
+
+import projector  # noqa: E402
+
+_deserializer = TypeDeserializer()
+
+class FakeReadModels:
+    """Orders and inventory tables understanding the projector's own update expressions."""
+
+    def __init__(self):
+        self.orders = {}
+        self.inventory = {}
+        self.transactions = 0
+        self.fail_next = None
+        self.meta = self
+        self.client = self
+
+    # orders_table.get_item
+    def get_item(self, Key, **kwargs):
+        item = self.orders.get(Key['orderId'])
+        return {'Item': dict(item)} if item else {}
+
+    def transact_write_items(self, TransactItems):
+        if self.fail_next:
+            error, self.fail_next = self.fail_next, None
+            raise error
+        updates = [self._decode(t['Update']) for t in TransactItems]
+        order_update = updates[0]
+        order = self.orders.get(order_update['key'], {})
+        if not self._condition_holds(order, order_update):
+            reasons = [{'Code': 'ConditionalCheckFailed'}] + [{'Code': 'None'}] * (len(updates) - 1)
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+                               'CancellationReasons': reasons}, 'TransactWriteItems')
+        self.transactions += 1
+        self._apply_order(order_update)
+        for update in updates[1:]:
+            row = self.inventory.setdefault(update['key'], {'productId': update['key'], 'reserved': 0})
+            row['reserved'] += update['values'][':qty']
+
+    def _decode(self, update):
+        return {
+            'key': _deserializer.deserialize(next(iter(update['Key'].values()))),
+            'expression': update['UpdateExpression'],
+            'condition': update.get('ConditionExpression'),
+            'names': update.get('ExpressionAttributeNames', {}),
+            'values': {k: _deserializer.deserialize(v) for k, v in update['ExpressionAttributeValues'].items()},
+        }
+
+    def _condition_holds(self, order, update):
+        last = order.get('lastVersion')
+        values = update['values']
+        return {
+            'attribute_not_exists(#lastVersion) OR #lastVersion < :first':
+                lambda: last is None or last < values[':first'],
+            'attribute_not_exists(#lastVersion)': lambda: last is None,
+            '#lastVersion = :seen': lambda: last == values.get(':seen'),
+        }[update['condition']]()
+
+    def _apply_order(self, update):
+        names, values = update['names'], update['values']
+        order = self.orders.setdefault(update['key'], {'orderId': update['key']})
+        order['lastVersion'] = values[':last']
+        for placeholder, attribute in names.items():
+            if placeholder.startswith('#s'):
+                order[attribute] = values[':' + placeholder[1:]]
+        if ':items' in values:
+            order['items'] = order.get('items', []) + values[':items']
+            order['totalAmount'] = order.get('totalAmount', Decimal('0')) + values[':amount']
+
+@pytest.fixture
+def tables(monkeypatch):
+    fake = FakeReadModels()
+    monkeypatch.setattr(projector, 'dynamodb', fake)
+    monkeypatch.setattr(projector, 'orders_table', fake)
+    return fake
+
+def created(version, order_id='o-1'):
+    return (version, 'OrderCreated', {'orderId': order_id, 'customerId': 'c-1', 'createdAt': 't0'})
+
+def added(version, product_id, quantity=1, order_id='o-1'):
+    return (version, 'ItemAdded', {'orderId': order_id, 'productId': product_id,
+                                   'quantity': quantity, 'price': '2.50'})
+
+def cancelled(version, order_id='o-1'):
+    return (version, 'OrderCancelled', {'orderId': order_id, 'cancelledAt': 't9'})
+
+def test_one_transaction_per_order(tables):
+    projector.project_events([created(1), added(2, 'a'), added(3, 'b', 2), added(4, 'a'),
+                              created(1, 'o-2'), added(2, 'a', order_id='o-2')])
+    assert tables.transactions == 2
+    assert tables.orders['o-1']['lastVersion'] == 4
+    assert tables.orders['o-1']['totalAmount'] == Decimal('10.00')
+    assert {p: row['reserved'] for p, row in tables.inventory.items()} == {'a': 3, 'b': 2}
+
+def test_overlapping_batch_applies_only_newer_events(tables):
+    projector.project_events([created(1), added(2, 'a'), added(3, 'b')])
+    projector.project_events([added(2, 'a'), added(3, 'b'), added(4, 'c'), added(5, 'a')])
+    order = tables.orders['o-1']
+    assert order['lastVersion'] == 5
+    assert [item['productId'] for item in order['items']] == ['a', 'b', 'c', 'a']
+    assert {p: row['reserved'] for p, row in tables.inventory.items()} == {'a': 2, 'b': 1, 'c': 1}
+
+def test_fully_replayed_batch_changes_nothing(tables):
+    batch = [created(1), added(2, 'a'), added(3, 'b')]
+    projector.project_events(batch)
+    before = (dict(tables.orders['o-1']), {p: dict(r) for p, r in tables.inventory.items()})
+    projector.project_events(batch)
+    assert (tables.orders['o-1'], tables.inventory) == before
+
+def test_failed_transaction_leaves_order_and_inventory_untouched(tables):
+    tables.fail_next = ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'boom'}},
+                                   'TransactWriteItems')
+    batch = [created(1), added(2, 'a')]
+    with pytest.raises(ClientError):
+        projector.project_events(batch)
+    assert tables.orders == {} and tables.inventory == {}
+
+    projector.project_events(batch)
+    assert tables.orders['o-1']['lastVersion'] == 2
+    assert tables.inventory['a']['reserved'] == 1
+
+def test_transaction_conflict_is_retried(tables, monkeypatch):
+    monkeypatch.setattr(projector.time, 'sleep', lambda seconds: None)
+    tables.fail_next = ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'busy'},
+                                    'CancellationReasons': [{'Code': 'None'}, {'Code': 'TransactionConflict'}]},
+                                   'TransactWriteItems')
+    projector.project_events([created(1), added(2, 'a')])
+    assert tables.inventory['a']['reserved'] == 1
+
+def test_cancellation_releases_all_items(tables):
+    projector.project_events([created(1), added(2, 'a', 2), added(3, 'b')])
+    projector.project_events([added(4, 'a'), cancelled(5)])
+    assert tables.orders['o-1']['status'] == 'cancelled'
+    assert {p: row['reserved'] for p, row in tables.inventory.items()} == {'a': 0, 'b': 0}
+
+def test_large_orders_are_split_into_runs(tables):
+    events = [created(1)] + [added(v, f'sku-{v}') for v in range(2, 152)]
+    runs = projector.split_runs(events)
+    assert [len(run) for run in runs] == [100, 51]
+    projector.project_events(events)
+    assert tables.transactions == 2
+    assert tables.orders['o-1']['lastVersion'] == 151
+    assert len(tables.inventory) == 150
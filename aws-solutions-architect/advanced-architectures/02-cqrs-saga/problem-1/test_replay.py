@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Tests for replay.py: checkpointed segments resuming after a crash."""
+
+import json
+import os
+import sys
+from argparse import Namespace
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from test_projector import FakeReadModels, projector  # noqa: E402
+import replay  # noqa: E402
+
+class FakeEventStore:
+    """Scan over event-store items in key order, one Limit-sized page at a time."""
+
+    def __init__(self, events):
+        self.items = sorted(
+            ({'aggregateId': data['orderId'], 'version': Decimal(version),
+              'eventType': event_type, 'eventData': json.dumps(data)}
+             for version, event_type, data in events),
+            key=lambda item: (item['aggregateId'], item['version'])
+        )
+        self.scans = 0
+
+    def Table(self, name):
+        return self
+
+    def scan(self, Limit, ExclusiveStartKey=None, **kwargs):
+        self.scans += 1
+        start = 0
+        if ExclusiveStartKey:
+            key = (ExclusiveStartKey['aggregateId'], ExclusiveStartKey['version'])
+            start = next(i for i, item in enumerate(self.items)
+                         if (item['aggregateId'], item['version']) > key)
+        page = self.items[start:start + Limit]
+        response = {'Items': page}
+        if start + Limit < len(self.items):
+            response['LastEvaluatedKey'] = {'aggregateId': page[-1]['aggregateId'],
+                                            'version': page[-1]['version']}
+        return response
+
+class CrashingReadModels(FakeReadModels):
+    """Dies (like a killed worker) after a given number of committed transactions."""
+
+    def __init__(self, crash_after):
+        super().__init__()
+        self.crash_after = crash_after
+
+    def transact_write_items(self, TransactItems):
+        super().transact_write_items(TransactItems)
+        if self.transactions == self.crash_after:
+            raise KeyboardInterrupt("worker killed")
+
+def order_events(order_id, items):
+    events = [(1, 'OrderCreated', {'orderId': order_id, 'customerId': 'c', 'createdAt': 't0'})]
+    for version, product_id in enumerate(items, start=2):
+        events.append((version, 'ItemAdded', {'orderId': order_id, 'productId': product_id,
+                                              'quantity': 1, 'price': '1.00'}))
+    return events
+
+EVENTS = (order_events('o-1', ['a', 'b', 'c', 'a']) + order_events('o-2', ['b'])
+          + order_events('o-3', ['c', 'c']))
+
+def run_segment(tables, store, checkpoint_dir, monkeypatch):
+    checkpoint_dir.mkdir(exist_ok=True)
+    monkeypatch.setattr(projector, 'dynamodb', tables)
+    monkeypatch.setattr(projector, 'orders_table', tables)
+    monkeypatch.setattr(replay.boto3, 'resource', lambda service: store)
+    monkeypatch.setenv('ORDERS_TABLE', projector.ORDERS_TABLE)
+    monkeypatch.setenv('INVENTORY_TABLE', projector.INVENTORY_TABLE)
+    args = Namespace(event_store='event-store', orders_table=projector.ORDERS_TABLE,
+                     inventory_table=projector.INVENTORY_TABLE, page_size=4,
+                     checkpoint_dir=str(checkpoint_dir))
+    return replay.replay_segment(0, 1, args)
+
+def read_models(tables):
+    orders = {order_id: (order['lastVersion'], [i['productId'] for i in order['items']], order['totalAmount'])
+              for order_id, order in tables.orders.items()}
+    return orders, {p: row['reserved'] for p, row in tables.inventory.items()}
+
+def test_resume_after_crash_matches_clean_replay(tmp_path, monkeypatch):
+    clean = FakeReadModels()
+    run_segment(clean, FakeEventStore(EVENTS), tmp_path / 'clean', monkeypatch)
+
+    # Page 2 holds o-1 v5 and all of o-2; die right after o-2 is written
+    crashing = CrashingReadModels(crash_after=3)
+    with pytest.raises(KeyboardInterrupt):
+        run_segment(crashing, FakeEventStore(EVENTS), tmp_path / 'crashed', monkeypatch)
+    checkpoint = json.loads((tmp_path / 'crashed' / 'segment-0000-of-0001.json').read_text())
+    assert checkpoint['events'] == 4 and not checkpoint['done']
+
+    crashing.crash_after = None
+    store = FakeEventStore(EVENTS)
+    stats = run_segment(crashing, store, tmp_path / 'crashed', monkeypatch)
+    assert stats['resumed']
+    assert store.scans == 2  # pages 2 and 3; page 1 is not scanned again
+    assert read_models(crashing) == read_models(clean)
+    assert read_models(clean)[1] == {'a': 2, 'b': 2, 'c': 3}
+
+def test_finished_segment_is_not_replayed(tmp_path, monkeypatch):
+    tables = FakeReadModels()
+    run_segment(tables, FakeEventStore(EVENTS), tmp_path, monkeypatch)
+    store = FakeEventStore(EVENTS)
+    stats = run_segment(tables, store, tmp_path, monkeypatch)
+    assert stats == {'segment': 0, 'events': 0, 'seconds': 0.0, 'resumed': True}
+    assert store.scans == 0
@@ -3,20 +3,72 @@
 
 import boto3
 import json
+import logging
+import random
+import threading
+import time
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 import uuid
 
+logger = logging.getLogger(__name__)
+
 dynamodb = boto3.resource('dynamodb')
 event_store = dynamodb.Table('banking-events')
 snapshots = dynamodb.Table('account-snapshots')
+# Keyed by idempotencyKey; expiresAt is the table's TTL attribute
+idempotency_table = dynamodb.Table('banking-idempotency')
+
+IDEMPOTENCY_TTL_SECONDS = 7 * 24 * 3600
+RECENT_RESULTS_MAX = 10000
+SNAPSHOT_EVERY = 100
+EVENT_PAGE_SIZE = 500
+TRANSFER_MAX_ATTEMPTS = 5
+TRANSFER_BACKOFF_BASE = 0.02
+TRANSFER_BACKOFF_CAP = 0.5
+
+# Front cache of recently seen keys -> original result (per warm container)
+_recent_results = OrderedDict()
+_serializer = TypeSerializer()
+_thread_tables = threading.local()
+
+def _init_load_thread():
+    # boto3 resources are not thread-safe: each load thread builds its own
+    resource = boto3.session.Session().resource('dynamodb')
+    _thread_tables.tables = (resource.Table(event_store.name), resource.Table(snapshots.name))
+
+def _tables():
+    """Return this thread's (event_store, snapshots) tables."""
+    return getattr(_thread_tables, 'tables', None) or (event_store, snapshots)
+
+# Loads both sides of a transfer in parallel
+_load_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='load', initializer=_init_load_thread)
+
+class DuplicateCommand(Exception):
+    """Raised when an idempotency key was already recorded.
+    
+    result is the original command's result, or None if it could not be read.
+    """
+    def __init__(self, idempotency_key: str, result=None):
+        super().__init__(idempotency_key)
+        self.result = result
+
+class ConcurrencyConflict(ValueError):
+    """Raised when another writer appended an event at the same version."""
+    def __init__(self):
+        super().__init__('Concurrency conflict')
 
 def handle_deposit(account_id: str, amount: Decimal, idempotency_key: str):
     """Handle deposit command."""
     
     # Check idempotency
-    if is_duplicate(idempotency_key):
-        return {'status': 'duplicate'}
+    previous = get_previous_result(idempotency_key)
+    if previous is not None:
+        return duplicate_result(previous)
     
     # Load current state
     state = load_account_state(account_id)
@@ -35,26 +87,24 @@ def handle_deposit(account_id: str, amount: Decimal, idempotency_key: str):
         'idempotencyKey': idempotency_key
     }
     
-    # Store event with optimistic lock
+    # Store event with optimistic lock, recording the idempotency key atomically
+    result = {'eventId': event['eventId'], 'version': event['version']}
     try:
-        event_store.put_item(
-            Item=event,
-            ConditionExpression='attribute_not_exists(accountId) AND attribute_not_exists(version)'
-        )
-    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-        raise ValueError('Concurrency conflict')
+        append_events([event], idempotency_key, result)
+    except DuplicateCommand as e:
+        return duplicate_result(e.result)
     
     # Check if snapshot needed
-    if event['version'] % 100 == 0:
-        create_snapshot(account_id, state['version'])
+    maybe_snapshot(state, event)
     
-    return {'eventId': event['eventId'], 'version': event['version']}
+    return result
 
 def handle_withdraw(account_id: str, amount: Decimal, idempotency_key: str):
     """Handle withdrawal command."""
     
-    if is_duplicate(idempotency_key):
-        return {'status': 'duplicate'}
+    previous = get_previous_result(idempotency_key)
+    if previous is not None:
+        return duplicate_result(previous)
     
     state = load_account_state(account_id)
     
@@ -71,57 +121,84 @@ def handle_withdraw(account_id: str, amount: Decimal, idempotency_key: str):
         'idempotencyKey': idempotency_key
     }
     
+    result = {'eventId': event['eventId'], 'version': event['version']}
     try:
-        event_store.put_item(
-            Item=event,
-            ConditionExpression='attribute_not_exists(accountId) AND attribute_not_exists(version)'
-        )
-    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-        raise ValueError('Concurrency conflict')
+        append_events([event], idempotency_key, result)
+    except DuplicateCommand as e:
+        return duplicate_result(e.result)
     
-    return {'eventId': event['eventId'], 'version': event['version']}
+    maybe_snapshot(state, event)
+    
+    return result
 
 def handle_transfer(from_account: str, to_account: str, amount: Decimal, idempotency_key: str):
-    """Handle transfer between accounts."""
+    """Handle transfer between accounts.
     
-    if is_duplicate(idempotency_key):
-        return {'status': 'duplicate'}
+    Both accounts are loaded concurrently and both events are written in one
+    transaction conditioned on their versions; on a version conflict or a
+    TransactionConflict the transfer is re-read and retried with full-jitter
+    backoff.
+    """
+    if from_account == to_account:
+        raise ValueError('Cannot transfer to the same account')
     
-    # Withdraw from source
-    withdraw_event = {
-        'eventId': str(uuid.uuid4()),
-        'accountId': from_account,
-        'version': load_account_state(from_account)['version'] + 1,
-        'eventType': 'MoneyWithdrawn',
-        'amount': amount,
-        'transferTo': to_account,
-        'timestamp': datetime.now().isoformat(),
-        'idempotencyKey': f"{idempotency_key}-withdraw"
-    }
+    previous = get_previous_result(idempotency_key)
+    if previous is not None:
+        return duplicate_result(previous)
     
-    # Deposit to destination
-    deposit_event = {
-        'eventId': str(uuid.uuid4()),
-        'accountId': to_account,
-        'version': load_account_state(to_account)['version'] + 1,
-        'eventType': 'MoneyDeposited',
-        'amount': amount,
-        'transferFrom': from_account,
-        'timestamp': datetime.now().isoformat(),
-        'idempotencyKey': f"{idempotency_key}-deposit"
-    }
-    
-    # Store both events atomically
-    event_store.put_item(Item=withdraw_event)
-    event_store.put_item(Item=deposit_event)
-    
-    return {'transferId': idempotency_key}
+    result = {'transferId': idempotency_key}
+    for attempt in range(TRANSFER_MAX_ATTEMPTS):
+        source_future = _load_executor.submit(load_account_state, from_account)
+        target_state = load_account_state(to_account)
+        source_state = source_future.result()
+        
+        if source_state['status'] == 'closed' or target_state['status'] == 'closed':
+            raise ValueError('Account is closed')
+        if source_state['balance'] < amount:
+            raise ValueError('Insufficient funds')
+        
+        timestamp = datetime.now().isoformat()
+        withdraw_event = {
+            'eventId': str(uuid.uuid4()),
+            'accountId': from_account,
+            'version': source_state['version'] + 1,
+            'eventType': 'MoneyWithdrawn',
+            'amount': amount,
+            'transferTo': to_account,
+            'timestamp': timestamp,
+            'idempotencyKey': f"{idempotency_key}-withdraw"
+        }
+        deposit_event = {
+            'eventId': str(uuid.uuid4()),
+            'accountId': to_account,
+            'version': target_state['version'] + 1,
+            'eventType': 'MoneyDeposited',
+            'amount': amount,
+            'transferFrom': from_account,
+            'timestamp': timestamp,
+            'idempotencyKey': f"{idempotency_key}-deposit"
+        }
+        
+        # Store both events atomically
+        try:
+            append_events([withdraw_event, deposit_event], idempotency_key, result)
+        except DuplicateCommand as e:
+            return duplicate_result(e.result)
+        except ConcurrencyConflict:
+            if attempt == TRANSFER_MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(0, min(TRANSFER_BACKOFF_CAP, TRANSFER_BACKOFF_BASE * 2 ** attempt)))
+            continue
+        
+        maybe_snapshot(source_state, withdraw_event)
+        maybe_snapshot(target_state, deposit_event)
+        return result
 
 def load_account_state(account_id: str):
     """Load account state from snapshot + events."""
     
     # Try to load latest snapshot
-    snapshot_response = snapshots.query(
+    snapshot_response = _tables()[1].query(
         KeyConditionExpression='accountId = :id',
         ExpressionAttributeValues={':id': account_id},
         ScanIndexForward=False,
@@ -146,17 +223,27 @@ def load_account_state(account_id: str):
         }
         from_version = 1
     
-    # Apply events since snapshot
-    events_response = event_store.query(
-        KeyConditionExpression='accountId = :id AND version >= :v',
-        ExpressionAttributeValues={':id': account_id, ':v': from_version}
-    )
-    
-    for event in events_response['Items']:
+    # Apply events since snapshot, one page at a time
+    for event in iter_events(account_id, from_version):
         apply_event(state, event)
     
     return state
 
+def iter_events(account_id: str, from_version: int):
+    """Yield an account's events from from_version on, following LastEvaluatedKey."""
+    query = {
+        'KeyConditionExpression': 'accountId = :id AND version >= :v',
+        'ExpressionAttributeValues': {':id': account_id, ':v': from_version},
+        'ConsistentRead': True,
+        'Limit': EVENT_PAGE_SIZE
+    }
+    while True:
+        response = _tables()[0].query(**query)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
 def apply_event(state, event):
     """Apply event to state."""
     event_type = event['eventType']
@@ -172,15 +259,32 @@ def apply_event(state, event):
     
     state['version'] = int(event['version'])
 
-def create_snapshot(account_id: str, version: int):
-    """Create snapshot for performance."""
-    state = load_account_state(account_id)
+def maybe_snapshot(state, event):
+    """Snapshot the post-command state every SNAPSHOT_EVERY versions.
     
+    The new state is derived from the state already loaded plus the event just
+    written, so no replay is needed. The write happens before the command
+    returns (Lambda freezes background threads once the handler returns), and
+    a failure is logged rather than raised: a missed snapshot only costs
+    replay time on the next load.
+    """
+    if event['version'] % SNAPSHOT_EVERY != 0:
+        return
+    new_state = dict(state)
+    apply_event(new_state, event)
+    try:
+        create_snapshot(new_state)
+    except ClientError:
+        logger.warning("Snapshot write failed for %s at version %d",
+                       new_state['accountId'], new_state['version'], exc_info=True)
+
+def create_snapshot(state):
+    """Create snapshot for performance."""
     snapshots.put_item(
         Item={
-            'accountId': account_id,
-            'version': version,
-            'balance': float(state['balance']),
+            'accountId': state['accountId'],
+            'version': state['version'],
+            'balance': state['balance'],
             'status': state['status'],
             'timestamp': datetime.now().isoformat()
         }
@@ -188,9 +292,85 @@ def create_snapshot(account_id: str, version: int):
 
 def is_duplicate(idempotency_key: str) -> bool:
     """Check if command already processed."""
-    response = event_store.scan(
-        FilterExpression='idempotencyKey = :key',
-        ExpressionAttributeValues={':key': idempotency_key},
-        Limit=1
+    return get_previous_result(idempotency_key) is not None
+
+def get_previous_result(idempotency_key: str):
+    """Return the original result for a processed key, or None.
+    
+    Recent keys are answered from memory; otherwise a single GetItem on the
+    idempotency table replaces the old full-table scan.
+    """
+    if idempotency_key in _recent_results:
+        _recent_results.move_to_end(idempotency_key)
+        return _recent_results[idempotency_key]
+    
+    response = idempotency_table.get_item(
+        Key={'idempotencyKey': idempotency_key},
+        ConsistentRead=True
     )
-    return len(response['Items']) > 0
+    item = response.get('Item')
+    if item is None or int(item.get('expiresAt', 0)) < time.time():
+        return None
+    result = json.loads(item['result'])
+    _remember(idempotency_key, result)
+    return result
+
+def duplicate_result(previous):
+    """Answer a repeated command with its original result, if that is still known."""
+    return {**(previous or {}), 'status': 'duplicate'}
+
+def _remember(idempotency_key: str, result: dict):
+    _recent_results[idempotency_key] = result
+    _recent_results.move_to_end(idempotency_key)
+    if len(_recent_results) > RECENT_RESULTS_MAX:
+        _recent_results.popitem(last=False)
+
+def _idempotency_item(idempotency_key: str, result: dict):
+    return {
+        'idempotencyKey': idempotency_key,
+        'result': json.dumps(result),
+        'expiresAt': int(time.time()) + IDEMPOTENCY_TTL_SECONDS
+    }
+
+def append_events(events, idempotency_key: str, result: dict):
+    """Write events and the idempotency record in a single transaction.
+    
+    Raises DuplicateCommand if the key was recorded concurrently, and
+    ConcurrencyConflict if any event version already exists or another
+    transaction was writing the same items (TransactionConflict).
+    """
+    transact_items = [
+        {'Put': {
+            'TableName': event_store.name,
+            'Item': {k: _serializer.serialize(v) for k, v in event.items()},
+            'ConditionExpression': 'attribute_not_exists(accountId) AND attribute_not_exists(version)'
+        }}
+        for event in events
+    ]
+    # TTL deletes lag expiry by up to ~48h, so an expired record counts as absent
+    transact_items.append({'Put': {
+        'TableName': idempotency_table.name,
+        'Item': {k: _serializer.serialize(v) for k, v in _idempotency_item(idempotency_key, result).items()},
+        'ConditionExpression': 'attribute_not_exists(idempotencyKey) OR expiresAt < :now',
+        'ExpressionAttributeValues': {':now': _serializer.serialize(int(time.time()))},
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    }})
+    
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = e.response.get('CancellationReasons', [])
+        codes = [r.get('Code') for r in reasons]
+        if codes and codes[-1] == 'ConditionalCheckFailed':
+            previous = reasons[-1].get('Item', {}).get('result', {}).get('S')
+            if previous is None:
+                raise DuplicateCommand(idempotency_key)
+            previous = json.loads(previous)
+            _remember(idempotency_key, previous)
+            raise DuplicateCommand(idempotency_key, previous)
+        if 'ConditionalCheckFailed' in codes or 'TransactionConflict' in codes:
+            raise ConcurrencyConflict()
+        raise
+    _remember(idempotency_key, result)
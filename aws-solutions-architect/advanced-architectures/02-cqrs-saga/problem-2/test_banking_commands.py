@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Tests for banking_commands.py against in-memory DynamoDB tables."""
+
+import json
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.dirname(__file__))
+
+import banking_commands as bank  # noqa: E402
+
+_deserializer = TypeDeserializer()
+_serializer = TypeSerializer()
+
+class FakeTable:
+    """Hash/range keyed table with just the calls banking_commands makes."""
+
+    def __init__(self, name, hash_key, range_key=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.items = {}
+        self.queries = 0
+
+    def key_of(self, item):
+        return (item[self.hash_key], item[self.range_key] if self.range_key else None)
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(self.key_of(Key))
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.items[self.key_of(Item)] = dict(Item)
+
+    def query(self, ExpressionAttributeValues, ScanIndexForward=True, Limit=None,
+              ExclusiveStartKey=None, **kwargs):
+        self.queries += 1
+        values = ExpressionAttributeValues
+        rows = sorted((item for (hash_value, range_value), item in self.items.items()
+                       if hash_value == values[':id'] and range_value >= values.get(':v', 0)),
+                      key=lambda item: item[self.range_key], reverse=not ScanIndexForward)
+        if ExclusiveStartKey:
+            after = ExclusiveStartKey[self.range_key]
+            rows = [r for r in rows if (r[self.range_key] > after) == ScanIndexForward]
+        response = {'Items': rows[:Limit] if Limit else rows}
+        if Limit and len(rows) > Limit:
+            response['LastEvaluatedKey'] = {k: rows[Limit - 1][k] for k in (self.hash_key, self.range_key)}
+        return response
+
+class FakeDynamoDB:
+    """Tables plus a client whose TransactWriteItems checks the module's conditions."""
+
+    def __init__(self):
+        self.events = FakeTable('banking-events', 'accountId', 'version')
+        self.snapshots = FakeTable('account-snapshots', 'accountId', 'version')
+        self.idempotency = FakeTable('banking-idempotency', 'idempotencyKey')
+        self.tables = {t.name: t for t in (self.events, self.snapshots, self.idempotency)}
+        self.meta = self
+        self.client = self
+        self.transactions = 0
+
+    def transact_write_items(self, TransactItems):
+        puts = []
+        reasons = []
+        for entry in TransactItems:
+            put = entry['Put']
+            table = self.tables[put['TableName']]
+            item = {k: _deserializer.deserialize(v) for k, v in put['Item'].items()}
+            values = {k: _deserializer.deserialize(v) for k, v in put.get('ExpressionAttributeValues', {}).items()}
+            existing = table.items.get(table.key_of(item))
+            ok = {
+                'attribute_not_exists(accountId) AND attribute_not_exists(version)': lambda: existing is None,
+                'attribute_not_exists(idempotencyKey) OR expiresAt < :now':
+                    lambda: existing is None or existing['expiresAt'] < values[':now'],
+            }[put['ConditionExpression']]()
+            reason = {'Code': 'None' if ok else 'ConditionalCheckFailed'}
+            if not ok and put.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD':
+                reason['Item'] = {k: _serializer.serialize(v) for k, v in existing.items()}
+            reasons.append(reason)
+            puts.append((table, item))
+        if any(r['Code'] != 'None' for r in reasons):
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+                               'CancellationReasons': reasons}, 'TransactWriteItems')
+        self.transactions += 1
+        for table, item in puts:
+            table.put_item(item)
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDynamoDB()
+    monkeypatch.setattr(bank, 'dynamodb', fake)
+    monkeypatch.setattr(bank, 'event_store', fake.events)
+    monkeypatch.setattr(bank, 'snapshots', fake.snapshots)
+    monkeypatch.setattr(bank, 'idempotency_table', fake.idempotency)
+    monkeypatch.setattr(bank, '_recent_results', bank.OrderedDict())
+    # Load threads without the initializer fall back to the fake tables
+    with bank.ThreadPoolExecutor(max_workers=2) as pool:
+        monkeypatch.setattr(bank, '_load_executor', pool)
+        yield fake
+
+def test_repeated_key_returns_original_result(db):
+    first = bank.handle_deposit('acc-1', Decimal('10'), 'k-1')
+    again = bank.handle_deposit('acc-1', Decimal('10'), 'k-1')
+    assert again == {**first, 'status': 'duplicate'}
+    assert bank.load_account_state('acc-1')['balance'] == Decimal('10')
+
+def test_concurrent_duplicate_uses_result_from_condition_failure(db):
+    first = bank.handle_deposit('acc-1', Decimal('10'), 'k-1')
+    bank._recent_results.clear()
+    # Simulate a racing request that passed the up-front lookup before k-1 was recorded
+    db.idempotency.get_item = lambda **kwargs: {}
+    again = bank.handle_deposit('acc-1', Decimal('10'), 'k-1')
+    assert again == {**first, 'status': 'duplicate'}
+    assert db.transactions == 1
+
+def test_duplicate_without_readable_result_still_answers(db):
+    db.idempotency.put_item({'idempotencyKey': 'k-1', 'expiresAt': int(time.time()) + 60})
+    db.idempotency.get_item = lambda **kwargs: {}
+    assert bank.handle_deposit('acc-1', Decimal('10'), 'k-1') == {'status': 'duplicate'}
+    assert db.transactions == 0
+
+def test_expired_key_not_yet_deleted_by_ttl_is_reusable(db):
+    db.idempotency.put_item({'idempotencyKey': 'k-1', 'expiresAt': int(time.time()) - 60,
+                             'result': json.dumps({'eventId': 'old', 'version': 1})})
+    result = bank.handle_deposit('acc-1', Decimal('10'), 'k-1')
+    assert 'status' not in result
+    assert result['eventId'] != 'old'
+    assert bank.load_account_state('acc-1')['balance'] == Decimal('10')
+
+def test_snapshot_is_written_before_the_command_returns(db, monkeypatch):
+    monkeypatch.setattr(bank, 'SNAPSHOT_EVERY', 3)
+    monkeypatch.setattr(bank, 'EVENT_PAGE_SIZE', 2)
+    for n in range(5):
+        bank.handle_deposit('acc-1', Decimal('10'), f'k-{n}')
+    assert [key[1] for key in db.snapshots.items] == [3]
+    assert db.snapshots.items[('acc-1', 3)]['balance'] == Decimal('30')
+
+    db.events.queries = 0
+    state = bank.load_account_state('acc-1')
+    assert state['balance'] == Decimal('50') and state['version'] == 5
+    assert db.events.queries == 1  # only versions 4-5, one page
+
+def test_events_are_loaded_page_by_page(db, monkeypatch):
+    monkeypatch.setattr(bank, 'EVENT_PAGE_SIZE', 2)
+    for n in range(5):
+        bank.handle_deposit('acc-1', Decimal('1'), f'k-{n}')
+    db.events.queries = 0
+    assert bank.load_account_state('acc-1')['balance'] == Decimal('5')
+    assert db.events.queries == 3
+
+def test_snapshot_failure_is_logged_not_raised(db, monkeypatch, caplog):
+    monkeypatch.setattr(bank, 'SNAPSHOT_EVERY', 1)
+    def broken_put(**kwargs):
+        raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}},
+                          'PutItem')
+    db.snapshots.put_item = broken_put
+    result = bank.handle_deposit('acc-1', Decimal('10'), 'k-1')
+    assert result['version'] == 1
+    assert 'Snapshot write failed for acc-1 at version 1' in caplog.text
+
+def fund(account_id, amount):
+    bank.handle_deposit(account_id, Decimal(amount), f'fund-{account_id}')
+
+def test_transfer_moves_money_atomically(db):
+    fund('acc-1', '100')
+    result = bank.handle_transfer('acc-1', 'acc-2', Decimal('40'), 't-1')
+    assert result == {'transferId': 't-1'}
+    assert bank.load_account_state('acc-1')['balance'] == Decimal('60')
+    assert bank.load_account_state('acc-2')['balance'] == Decimal('40')
+    assert bank.handle_transfer('acc-1', 'acc-2', Decimal('40'), 't-1')['status'] == 'duplicate'
+    assert bank.load_account_state('acc-1')['balance'] == Decimal('60')
+
+@pytest.mark.parametrize('code', ['TransactionConflict', 'ConditionalCheckFailed'])
+def test_transfer_retries_conflicts_with_fresh_state(db, monkeypatch, code):
+    monkeypatch.setattr(bank.time, 'sleep', lambda seconds: None)
+    fund('acc-1', '100')
+    real_transact = db.transact_write_items
+    attempts = []
+
+    def conflicting(TransactItems):
+        attempts.append(TransactItems)
+        if len(attempts) == 1:
+            # Another writer deposits into acc-1 while our first attempt is in flight
+            bank.handle_deposit('acc-1', Decimal('5'), 'racing-deposit')
+            reasons = [{'Code': code}, {'Code': 'None'}, {'Code': 'None'}]
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+                               'CancellationReasons': reasons}, 'TransactWriteItems')
+        return real_transact(TransactItems)
+
+    db.transact_write_items = conflicting
+    bank.handle_transfer('acc-1', 'acc-2', Decimal('40'), 't-1')
+    # 2 transfer attempts plus the racing deposit
+    assert len(attempts) == 3
+    assert attempts[-1][0]['Put']['Item']['version'] == {'N': '3'}
+    assert bank.load_account_state('acc-1')['balance'] == Decimal('65')
+
+def test_transfer_gives_up_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(bank.time, 'sleep', lambda seconds: None)
+    fund('acc-1', '100')
+    def always_conflicting(TransactItems):
+        raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+                           'CancellationReasons': [{'Code': 'TransactionConflict'}]}, 'TransactWriteItems')
+    db.transact_write_items = always_conflicting
+    with pytest.raises(bank.ConcurrencyConflict):
+        bank.handle_transfer('acc-1', 'acc-2', Decimal('40'), 't-1')
+
+def test_load_threads_use_their_own_boto3_resources(monkeypatch):
+    created = []
+
+    class Session:
+        def resource(self, service):
+            created.append(threading.get_ident())
+            return type('Resource', (), {'Table': lambda self, name: ('table', name, threading.get_ident())})()
+
+    monkeypatch.setattr(bank.boto3.session, 'Session', Session)
+    with bank.ThreadPoolExecutor(max_workers=2, initializer=bank._init_load_thread) as pool:
+        tables = list(pool.map(lambda _: bank._tables(), range(8)))
+    assert all(events[2] == snaps[2] != threading.get_ident() for events, snaps in tables)
+    assert len(set(created)) == len(created) <= 2
+    assert bank._tables() == (bank.event_store, bank.snapshots)
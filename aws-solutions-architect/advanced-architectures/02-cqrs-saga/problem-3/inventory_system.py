@@ -2,10 +2,18 @@
 """Inventory management with CQRS pattern."""
 
 import boto3
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import BotoCoreError, ClientError
 from decimal import Decimal
 from datetime import datetime
+import logging
+import random
+import threading
+import time
 import uuid
 
+logger = logging.getLogger(__name__)
+
 dynamodb = boto3.resource('dynamodb')
 sns = boto3.client('sns')
 
@@ -13,64 +21,82 @@ event_store = dynamodb.Table('inventory-events')
 stock_view = dynamodb.Table('stock-levels')
 
 LOW_STOCK_THRESHOLD = 10
+LOW_STOCK_TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:low-stock-alerts'
+ALERT_DEDUP_SECONDS = 300
+SNS_BATCH_SIZE = 10
+VERSION_RETRY_LIMIT = 5
+VERSION_RETRY_BACKOFF = 0.005
+VERSION_RETRY_BACKOFF_CAP = 0.1
+TRANSACTION_LINES = 50  # two transact items per line; DynamoDB allows 100
+BATCH_GET_SIZE = 100
+MAX_SHARDS = 49  # base item + one item per shard, two transact items each
+STOCK_LEVEL_TTL = 1.0
+REBALANCE_INTERVAL = 30
+
+# Last seen {version, available, reserved} per (productId, warehouseId).
+# Every stock change bumps the item's version, so when the version condition
+# holds these values are exact and no read is needed before a write.
+_stock_state = {}
+_serializer = TypeSerializer()
+
+# Committed vs. version-conflicted stock transactions, for sizing contention
+transaction_stats = {'committed': 0, 'conflicts': 0}
+_stats_lock = threading.Lock()
+
+# Hot items split their stock over sub-items keyed '{warehouseId}#{n}'; each
+# shard is an ordinary stock item with its own version and event stream.
+# The base item records the shard count in its 'shards' attribute. Releases
+# and sales land on a random shard, so 'reserved' is only meaningful summed.
+_shard_counts = {}
+_last_rebalanced = {}
+_level_cache = {}
+
+# One item alerts at most once per ALERT_DEDUP_SECONDS
+_last_alerted = {}
+
+class StaleStockState(Exception):
+    """Raised when a stock item changed since its state was cached."""
+    def __init__(self, positions=()):
+        super().__init__('Stock state changed')
+        self.positions = positions
+
+class InsufficientStock(ValueError):
+    """Raised when a reservation exceeds the available stock."""
+
+class ItemSharded(Exception):
+    """Raised when a write meant for an unsharded item finds it has been sharded."""
 
 def reserve_stock(product_id: str, warehouse_id: str, quantity: int):
     """Reserve stock for order."""
     
-    # Check current stock
-    current = get_stock_level(product_id, warehouse_id)
-    
-    if current < quantity:
-        raise ValueError(f'Insufficient stock: {current} < {quantity}')
-    
-    # Generate event
-    event = {
-        'eventId': str(uuid.uuid4()),
-        'aggregateId': f'{product_id}#{warehouse_id}',
-        'version': get_version(product_id, warehouse_id) + 1,
-        'eventType': 'StockReserved',
-        'productId': product_id,
-        'warehouseId': warehouse_id,
-        'quantity': quantity,
-        'timestamp': datetime.now().isoformat()
-    }
-    
-    event_store.put_item(Item=event)
-    
-    # Update read model
-    new_stock = current - quantity
-    stock_view.update_item(
-        Key={'productId': product_id, 'warehouseId': warehouse_id},
-        UpdateExpression='SET available = available - :qty, reserved = reserved + :qty',
-        ExpressionAttributeValues={':qty': quantity}
-    )
+    if _shard_counts.get((product_id, warehouse_id)):
+        event, available = _reserve_from_shards(product_id, warehouse_id, quantity)
+    else:
+        try:
+            event, state = _apply_stock_change(
+                product_id, warehouse_id, 'StockReserved', quantity,
+                deltas={'available': -quantity, 'reserved': quantity},
+                required_available=quantity, unsharded=True
+            )
+            available = state['available']
+        except (InsufficientStock, ItemSharded):
+            # The refreshed item may show it was sharded by another process
+            if not _shard_counts.get((product_id, warehouse_id)):
+                raise
+            event, available = _reserve_from_shards(product_id, warehouse_id, quantity)
     
     # Check for low stock alert
-    if new_stock <= LOW_STOCK_THRESHOLD:
-        send_low_stock_alert(product_id, warehouse_id, new_stock)
+    if available <= LOW_STOCK_THRESHOLD:
+        alert_low_stock([(product_id, warehouse_id, available)])
     
     return event['eventId']
 
 def release_stock(product_id: str, warehouse_id: str, quantity: int):
     """Release reserved stock."""
     
-    event = {
-        'eventId': str(uuid.uuid4()),
-        'aggregateId': f'{product_id}#{warehouse_id}',
-        'version': get_version(product_id, warehouse_id) + 1,
-        'eventType': 'StockReleased',
-        'productId': product_id,
-        'warehouseId': warehouse_id,
-        'quantity': quantity,
-        'timestamp': datetime.now().isoformat()
-    }
-    
-    event_store.put_item(Item=event)
-    
-    stock_view.update_item(
-        Key={'productId': product_id, 'warehouseId': warehouse_id},
-        UpdateExpression='SET available = available + :qty, reserved = reserved - :qty',
-        ExpressionAttributeValues={':qty': quantity}
+    event, _ = _apply_to_write_target(
+        product_id, warehouse_id, 'StockReleased', quantity,
+        deltas={'available': quantity, 'reserved': -quantity}
     )
     
     return event['eventId']
@@ -78,36 +104,506 @@ def release_stock(product_id: str, warehouse_id: str, quantity: int):
 def record_sale(product_id: str, warehouse_id: str, quantity: int):
     """Record completed sale."""
     
+    event, _ = _apply_to_write_target(
+        product_id, warehouse_id, 'SaleRecorded', quantity,
+        deltas={'reserved': -quantity}
+    )
+    
+    return event['eventId']
+
+def enable_sharding(product_id: str, warehouse_id: str, shards: int):
+    """Split a hot item's available stock evenly over `shards` sub-items.
+    
+    Moves the stock in one transaction conditioned on the base item's
+    version; afterwards reservations pick a random shard.
+    """
+    if not 1 < shards <= MAX_SHARDS:
+        raise ValueError(f'shards must be between 2 and {MAX_SHARDS}')
+    
+    key = (product_id, warehouse_id)
+    state = load_stock_state(product_id, warehouse_id)
+    if _shard_counts.get(key):
+        raise ValueError(f'{product_id}@{warehouse_id} is already sharded')
+    
+    share, extra = divmod(state['available'], shards)
+    base_event = _new_event(product_id, warehouse_id, 'StockSharded', shards, state['version'] + 1)
+    transact_items = _stock_transact_items(
+        base_event, state['version'], {'available': -state['available']}, attributes={'shards': shards}
+    )
+    for n, shard_key in enumerate(_shard_keys(product_id, warehouse_id, shards)):
+        allocation = share + (1 if n < extra else 0)
+        event = _new_event(*shard_key, 'StockAllocated', allocation, 1)
+        transact_items.extend(_stock_transact_items(event, 0, {'available': allocation, 'reserved': 0}))
+    
+    _transact(transact_items)
+    _shard_counts[key] = shards
+    load_stock_states([key] + _shard_keys(product_id, warehouse_id, shards))
+
+def rebalance_shards(product_id: str, warehouse_id: str):
+    """Even out available stock across a sharded item's shards."""
+    keys = _shard_keys(product_id, warehouse_id, _shard_counts[(product_id, warehouse_id)])
+    
+    for attempt in range(VERSION_RETRY_LIMIT):
+        load_stock_states(keys)
+        total = sum(_stock_state[key]['available'] for key in keys)
+        share, extra = divmod(total, len(keys))
+        
+        changes = []
+        transact_items = []
+        for n, key in enumerate(keys):
+            state = _stock_state[key]
+            delta = share + (1 if n < extra else 0) - state['available']
+            if delta:
+                event = _new_event(*key, 'StockRebalanced', delta, state['version'] + 1)
+                transact_items.extend(_stock_transact_items(event, state['version'], {'available': delta}))
+                changes.append((key, event, {'available': delta}))
+        
+        if changes:
+            try:
+                _transact(transact_items)
+            except StaleStockState:
+                _backoff(attempt)
+                continue
+            for key, event, deltas in changes:
+                _stock_state[key] = _advance_state(_stock_state[key], event, deltas)
+        _last_rebalanced[(product_id, warehouse_id)] = time.monotonic()
+        return
+    
+    raise ValueError('Concurrency conflict')
+
+def _reserve_from_shards(product_id, warehouse_id, quantity):
+    """Reserve from a random shard, falling back to the others in turn.
+    
+    If no single shard can cover the quantity, it is taken from several
+    shards in one transaction and, at most once per REBALANCE_INTERVAL, the
+    shards are rebalanced. Returns the first event and the total available.
+    """
+    key = (product_id, warehouse_id)
+    keys = _shard_keys(product_id, warehouse_id, _shard_counts[key])
+    _level_cache.pop(key, None)
+    
+    for shard_key in random.sample(keys, len(keys)):
+        try:
+            event, _ = _apply_stock_change(
+                *shard_key, 'StockReserved', quantity,
+                deltas={'available': -quantity, 'reserved': quantity},
+                required_available=quantity
+            )
+        except InsufficientStock:
+            continue
+        return event, sum(_stock_state[k]['available'] for k in keys if k in _stock_state)
+    
+    events = _reserve_across_shards(keys, quantity)
+    last = _last_rebalanced.get(key)
+    if last is None or time.monotonic() - last >= REBALANCE_INTERVAL:
+        rebalance_shards(product_id, warehouse_id)
+    return events[0], sum(_stock_state[k]['available'] for k in keys)
+
+def _reserve_across_shards(keys, quantity):
+    """Take quantity from the fullest shards in one transaction."""
+    for attempt in range(VERSION_RETRY_LIMIT):
+        load_stock_states(keys)
+        total = sum(_stock_state[k]['available'] for k in keys)
+        if total < quantity:
+            raise InsufficientStock(f'Insufficient stock: {total} < {quantity}')
+        
+        changes = []
+        transact_items = []
+        for key, take in _fullest_first(keys, quantity).items():
+            state = _stock_state[key]
+            deltas = {'available': -take, 'reserved': take}
+            event = _new_event(*key, 'StockReserved', take, state['version'] + 1)
+            transact_items.extend(_stock_transact_items(event, state['version'], deltas, take))
+            changes.append((key, event, deltas))
+        
+        try:
+            _transact(transact_items)
+        except StaleStockState:
+            _backoff(attempt)
+            continue
+        for key, event, deltas in changes:
+            _stock_state[key] = _advance_state(_stock_state[key], event, deltas)
+        return [event for _, event, _ in changes]
+    
+    raise ValueError('Concurrency conflict')
+
+def _fullest_first(keys, quantity):
+    """Split quantity over the cached available stock of keys, fullest first."""
+    allocation = {}
+    remaining = quantity
+    for key in sorted(keys, key=lambda k: _stock_state[k]['available'], reverse=True):
+        take = min(remaining, _stock_state[key]['available'])
+        if take <= 0:
+            break
+        allocation[key] = take
+        remaining -= take
+    return allocation
+
+def _shard_keys(product_id, warehouse_id, shards):
+    return [(product_id, f'{warehouse_id}#{n}') for n in range(shards)]
+
+def _write_target(product_id, warehouse_id):
+    """Stock item that releases and sales for an item should update."""
+    shards = _shard_counts.get((product_id, warehouse_id))
+    if not shards:
+        return warehouse_id
+    return f'{warehouse_id}#{random.randrange(shards)}'
+
+def _apply_to_write_target(product_id, warehouse_id, event_type, quantity, deltas):
+    """Apply a release or sale to the item, or to a random shard if it is sharded.
+    
+    An item not known to be sharded is written on condition it still has no
+    'shards' attribute, so a write racing enable_sharding in another process
+    is redirected to a shard instead of landing on the emptied base item.
+    """
+    target = _write_target(product_id, warehouse_id)
+    try:
+        return _apply_stock_change(product_id, target, event_type, quantity, deltas,
+                                   unsharded=target == warehouse_id)
+    except ItemSharded:
+        return _apply_stock_change(product_id, _write_target(product_id, warehouse_id),
+                                   event_type, quantity, deltas)
+
+def reserve_many(order_id: str, lines):
+    """Reserve every line of an order, all or nothing.
+    
+    lines is an iterable of (product_id, warehouse_id, quantity). Lines are
+    merged per stock item and written in transactions of TRANSACTION_LINES;
+    sharded items take their quantity from their fullest shards, and a line
+    that finds its item was sharded meanwhile is split again before its
+    chunk is retried. If a later chunk fails, the chunks already written
+    are released again. Returns the reservation event ids.
+    """
+    merged = {}
+    for product_id, warehouse_id, quantity in lines:
+        key = (product_id, warehouse_id)
+        merged[key] = merged.get(key, 0) + quantity
+    
+    load_stock_states([key for key in merged if key not in _stock_state])
+    quantities = _split_sharded_lines(merged)
+    keys = list(quantities)
+    
+    committed = []
+    event_ids = []
+    try:
+        start = 0
+        while start < len(keys):
+            chunk = keys[start:start + TRANSACTION_LINES]
+            try:
+                events = _commit_chunk(chunk, quantities, 'StockReserved', order_id, unsharded=merged)
+            except ItemSharded:
+                # Another process sharded an item since we planned; nothing in
+                # this chunk was written, so re-split everything not yet reserved
+                rest = _split_sharded_lines({key: quantities[key] for key in keys[start:]})
+                quantities.update(rest)
+                keys = keys[:start] + list(rest)
+                continue
+            committed.append(chunk)
+            event_ids.extend(event['eventId'] for event in events)
+            start += len(chunk)
+    except Exception:
+        # Compensate: release what earlier chunks reserved, newest first. Each
+        # release is best-effort so one failure doesn't strand the rest, and
+        # the original error is what the caller sees.
+        for chunk in reversed(committed):
+            try:
+                _commit_chunk(chunk, quantities, 'StockReleased', order_id)
+            except Exception:
+                logger.exception("Order %s: failed to release %d reserved stock items: %s",
+                                 order_id, len(chunk), chunk)
+        raise
+    
+    # Alert per item, on the summed total for sharded items
+    levels = [(*key, _cached_level(key)) for key in merged]
+    alert_low_stock([level for level in levels if level[2] <= LOW_STOCK_THRESHOLD])
+    return event_ids
+
+def _split_sharded_lines(quantities):
+    """Replace each sharded item's line with lines on its fullest shards."""
+    split = {}
+    for key, quantity in quantities.items():
+        if not _shard_counts.get(key):
+            split[key] = quantity
+            continue
+        shard_keys = _shard_keys(*key, _shard_counts[key])
+        load_stock_states(shard_keys)
+        total = sum(_stock_state[k]['available'] for k in shard_keys)
+        if total < quantity:
+            raise InsufficientStock(f'Insufficient stock: {key[0]}@{key[1]} {total} < {quantity}')
+        split.update(_fullest_first(shard_keys, quantity))
+    return split
+
+def _cached_level(key):
+    """Available stock of an item from the cache, summed over its shards if sharded."""
+    shards = _shard_counts.get(key)
+    if not shards:
+        return _stock_state[key]['available']
+    return sum(_stock_state[k]['available'] for k in _shard_keys(*key, shards) if k in _stock_state)
+
+def _commit_chunk(keys, quantities, event_type, order_id, unsharded=()):
+    """Reserve or release a chunk of stock items in one transaction.
+    
+    Reservations on keys in `unsharded` also require the item to have no
+    shards; ItemSharded is raised once a re-read shows one has some.
+    """
+    reserving = event_type == 'StockReserved'
+    guarded = {key for key in keys if reserving and key in unsharded}
+    
+    for attempt in range(VERSION_RETRY_LIMIT):
+        if any(_shard_counts.get(key) for key in guarded):
+            raise ItemSharded()
+        if reserving:
+            short = [key for key in keys if _stock_state[key]['available'] < quantities[key]]
+            if short:
+                load_stock_states(short)
+                if any(_shard_counts.get(key) for key in guarded):
+                    raise ItemSharded()
+                short = [key for key in short if _stock_state[key]['available'] < quantities[key]]
+                if short:
+                    raise InsufficientStock('Insufficient stock: ' + ', '.join(
+                        f"{p}@{w} {_stock_state[(p, w)]['available']} < {quantities[(p, w)]}" for p, w in short))
+        
+        changes = []
+        transact_items = []
+        for key in keys:
+            state = _stock_state[key]
+            quantity = quantities[key]
+            if reserving:
+                deltas = {'available': -quantity, 'reserved': quantity}
+            else:
+                deltas = {'available': quantity, 'reserved': -quantity}
+            event = _new_event(*key, event_type, quantity, state['version'] + 1, order_id=order_id)
+            transact_items.extend(_stock_transact_items(event, state['version'], deltas, quantity if reserving else 0,
+                                                        unsharded=key in guarded))
+            changes.append((key, event, deltas))
+        
+        try:
+            _transact(transact_items)
+        except StaleStockState as e:
+            # Each line is an update + put pair; refresh only the lines that failed
+            stale = {keys[position // 2] for position in e.positions} or set(keys)
+            load_stock_states(list(stale))
+            _backoff(attempt)
+            continue
+        
+        for key, event, deltas in changes:
+            _stock_state[key] = _advance_state(_stock_state[key], event, deltas)
+        return [event for _, event, _ in changes]
+    
+    raise ValueError('Concurrency conflict')
+
+def _apply_stock_change(product_id, warehouse_id, event_type, quantity, deltas, required_available=0,
+                        unsharded=False):
+    """Append a stock event and update the stock item in one transaction.
+    
+    Uses the cached stock state; if another writer got there first the
+    version condition fails, the item is re-read and the write retried.
+    With unsharded=True the write also requires the item to have no shards,
+    and ItemSharded is raised once a re-read shows it has some.
+    Returns the event and the new stock state.
+    """
+    key = (product_id, warehouse_id)
+    state = _stock_state.get(key)
+    if state is None:
+        state = load_stock_state(product_id, warehouse_id)
+    
+    for attempt in range(VERSION_RETRY_LIMIT):
+        if unsharded and _shard_counts.get(key):
+            raise ItemSharded()
+        if state['available'] < required_available:
+            # The cache may be behind a restock; only trust a fresh read
+            state = load_stock_state(product_id, warehouse_id)
+            if state['available'] < required_available:
+                raise InsufficientStock(f"Insufficient stock: {state['available']} < {required_available}")
+    
+        event = _new_event(product_id, warehouse_id, event_type, quantity, state['version'] + 1)
+        try:
+            _transact(_stock_transact_items(event, state['version'], deltas, required_available,
+                                            unsharded=unsharded))
+        except StaleStockState:
+            _backoff(attempt)
+            state = load_stock_state(product_id, warehouse_id)
+            continue
+    
+        new_state = _advance_state(state, event, deltas)
+        _stock_state[key] = new_state
+        return event, new_state
+    
+    raise ValueError('Concurrency conflict')
+
+def _advance_state(state, event, deltas):
+    return {
+        'version': event['version'],
+        'available': state['available'] + deltas.get('available', 0),
+        'reserved': state['reserved'] + deltas.get('reserved', 0)
+    }
+
+def _new_event(product_id, warehouse_id, event_type, quantity, version, order_id=None):
     event = {
         'eventId': str(uuid.uuid4()),
         'aggregateId': f'{product_id}#{warehouse_id}',
-        'version': get_version(product_id, warehouse_id) + 1,
-        'eventType': 'SaleRecorded',
+        'version': version,
+        'eventType': event_type,
         'productId': product_id,
         'warehouseId': warehouse_id,
         'quantity': quantity,
         'timestamp': datetime.now().isoformat()
     }
+    if order_id is not None:
+        event['orderId'] = order_id
+    return event
+
+def _stock_transact_items(event, expected_version, deltas, required_available=0, attributes=None,
+                          unsharded=False):
+    """Build the conditional stock update and event put for one change."""
+    values = {':version': event['version'], ':expected': expected_version}
+    if expected_version:
+        conditions = ['version = :expected']
+    else:
+        conditions = ['(attribute_not_exists(version) OR version = :expected)']
+    if required_available:
+        conditions.append('available >= :required')
+        values[':required'] = required_available
+    if unsharded:
+        conditions.append('attribute_not_exists(shards)')
+    for name, delta in deltas.items():
+        values[f':{name}'] = delta
     
-    event_store.put_item(Item=event)
+    update_expression = 'SET ' + ', '.join(['version = :version'] + [f'{name} = :{name}' for name in attributes or {}])
+    values.update({f':{name}': value for name, value in (attributes or {}).items()})
+    if deltas:
+        update_expression += ' ADD ' + ', '.join(f'{name} :{name}' for name in deltas)
     
-    stock_view.update_item(
+    return [
+        {'Update': {
+            'TableName': stock_view.name,
+            'Key': {
+                'productId': _serializer.serialize(event['productId']),
+                'warehouseId': _serializer.serialize(event['warehouseId'])
+            },
+            'UpdateExpression': update_expression,
+            'ConditionExpression': ' AND '.join(conditions),
+            'ExpressionAttributeValues': {k: _serializer.serialize(v) for k, v in values.items()}
+        }},
+        {'Put': {
+            'TableName': event_store.name,
+            'Item': {k: _serializer.serialize(v) for k, v in event.items()},
+            'ConditionExpression': 'attribute_not_exists(aggregateId) AND attribute_not_exists(version)'
+        }}
+    ]
+
+def _transact(transact_items):
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        reasons = [r.get('Code') for r in e.response.get('CancellationReasons', [])]
+        # Concurrent transactions on the same item cancel with TransactionConflict
+        if code != 'TransactionCanceledException' or not (
+                'ConditionalCheckFailed' in reasons or 'TransactionConflict' in reasons):
+            raise
+        with _stats_lock:
+            transaction_stats['conflicts'] += 1
+        raise StaleStockState([i for i, code in enumerate(reasons)
+                               if code in ('ConditionalCheckFailed', 'TransactionConflict')])
+    with _stats_lock:
+        transaction_stats['committed'] += 1
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff between version-conflict retries."""
+    time.sleep(random.uniform(0, min(VERSION_RETRY_BACKOFF_CAP, VERSION_RETRY_BACKOFF * 2 ** attempt)))
+
+def load_stock_state(product_id: str, warehouse_id: str):
+    """Read the stock item (consistently) and refresh the cached state."""
+    response = stock_view.get_item(
         Key={'productId': product_id, 'warehouseId': warehouse_id},
-        UpdateExpression='SET reserved = reserved - :qty',
-        ExpressionAttributeValues={':qty': quantity}
+        ConsistentRead=True
     )
+    return _cache_state(product_id, warehouse_id, response.get('Item', {}))
+
+def load_stock_states(keys):
+    """Refresh the cached state of many stock items with BatchGetItem."""
+    found = _batch_get_stock(keys, consistent=True)
+    for product_id, warehouse_id in keys:
+        _cache_state(product_id, warehouse_id, found.get((product_id, warehouse_id), {}))
+
+def _batch_get_stock(keys, consistent=False):
+    found = {}
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        request = {stock_view.name: {
+            'Keys': [{'productId': p, 'warehouseId': w} for p, w in keys[start:start + BATCH_GET_SIZE]],
+            'ConsistentRead': consistent
+        }}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(stock_view.name, []):
+                found[(item['productId'], item['warehouseId'])] = item
+            request = response.get('UnprocessedKeys')
+    return found
+
+def _cache_state(product_id, warehouse_id, item):
+    version = item.get('version')
+    if version is None and item:
+        # Item predates version tracking: seed it from the event log once
+        version = _seed_version(product_id, warehouse_id)
+    if item.get('shards'):
+        _shard_counts[(product_id, warehouse_id)] = int(item['shards'])
     
-    return event['eventId']
+    state = {
+        'version': int(version or 0),
+        'available': int(item.get('available', 0)),
+        'reserved': int(item.get('reserved', 0))
+    }
+    _stock_state[(product_id, warehouse_id)] = state
+    return state
+
+def _seed_version(product_id: str, warehouse_id: str) -> int:
+    version = get_version(product_id, warehouse_id)
+    try:
+        stock_view.update_item(
+            Key={'productId': product_id, 'warehouseId': warehouse_id},
+            UpdateExpression='SET version = :version',
+            ConditionExpression='attribute_not_exists(version)',
+            ExpressionAttributeValues={':version': version}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # Seeded concurrently; use whatever is stored now
+        response = stock_view.get_item(
+            Key={'productId': product_id, 'warehouseId': warehouse_id},
+            ConsistentRead=True
+        )
+        version = int(response['Item']['version'])
+    return version
 
 def get_stock_level(product_id: str, warehouse_id: str) -> int:
-    """Query current stock level."""
-    response = stock_view.get_item(
-        Key={'productId': product_id, 'warehouseId': warehouse_id}
-    )
-    
-    if 'Item' in response:
-        return int(response['Item']['available'])
-    return 0
+    """Query current stock level.
+
+    Sharded items are summed over their shards; those totals are cached for
+    STOCK_LEVEL_TTL seconds so hot items don't fan out on every read.
+    """
+    key = (product_id, warehouse_id)
+    cached = _level_cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    shards = _shard_counts.get(key)
+    if not shards:
+        response = stock_view.get_item(
+            Key={'productId': product_id, 'warehouseId': warehouse_id}
+        )
+
+        if 'Item' not in response:
+            return 0
+        if not response['Item'].get('shards'):
+            return int(response['Item']['available'])
+        shards = _shard_counts[key] = int(response['Item']['shards'])
+
+    items = _batch_get_stock([key] + _shard_keys(product_id, warehouse_id, shards))
+    level = sum(int(item.get('available', 0)) for item in items.values())
+    _level_cache[key] = (time.monotonic() + STOCK_LEVEL_TTL, level)
+    return level
 
 def get_version(product_id: str, warehouse_id: str) -> int:
     """Get current version."""
@@ -125,7 +621,55 @@ def get_version(product_id: str, warehouse_id: str) -> int:
 def send_low_stock_alert(product_id: str, warehouse_id: str, quantity: int):
     """Send SNS alert for low stock."""
     sns.publish(
-        TopicArn='arn:aws:sns:us-east-1:123456789012:low-stock-alerts',
+        TopicArn=LOW_STOCK_TOPIC_ARN,
         Subject='Low Stock Alert',
         Message=f'Product {product_id} in warehouse {warehouse_id} is low: {quantity} units'
     )
+
+def alert_low_stock(alerts):
+    """Publish (product_id, warehouse_id, quantity) alerts before returning.
+    
+    Publishing stays on the request path because Lambda freezes background
+    threads once the handler returns. An item that alerted within
+    ALERT_DEDUP_SECONDS is skipped; an item whose alert failed is logged and
+    alerts again on its next low-stock change.
+    """
+    now = time.monotonic()
+    fresh = []
+    for product_id, warehouse_id, quantity in alerts:
+        last = _last_alerted.get((product_id, warehouse_id))
+        if last is not None and now - last < ALERT_DEDUP_SECONDS:
+            continue
+        fresh.append((product_id, warehouse_id, quantity))
+    
+    if fresh:
+        try:
+            sent = publish_low_stock_alerts(fresh)
+        except (BotoCoreError, ClientError):
+            logger.exception("Low stock alerts failed")
+            return
+        for key in sent:
+            _last_alerted[key] = now
+
+def publish_low_stock_alerts(alerts):
+    """Send alerts with SNS PublishBatch, SNS_BATCH_SIZE per call.
+    
+    Returns the (product_id, warehouse_id) of every alert SNS accepted.
+    """
+    sent = []
+    for start in range(0, len(alerts), SNS_BATCH_SIZE):
+        batch = alerts[start:start + SNS_BATCH_SIZE]
+        entries = [
+            {
+                'Id': str(i),
+                'Subject': 'Low Stock Alert',
+                'Message': f'Product {product_id} in warehouse {warehouse_id} is low: {quantity} units'
+            }
+            for i, (product_id, warehouse_id, quantity) in enumerate(batch)
+        ]
+        response = sns.publish_batch(TopicArn=LOW_STOCK_TOPIC_ARN, PublishBatchRequestEntries=entries)
+        for success in response.get('Successful', []):
+            sent.append(batch[int(success['Id'])][:2])
+        for failure in response.get('Failed', []):
+            logger.warning("Low stock alert %s failed: %s", failure['Id'], failure.get('Message'))
+    return sent
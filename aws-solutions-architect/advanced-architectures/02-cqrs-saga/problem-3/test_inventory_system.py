@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Tests for inventory_system.py against in-memory DynamoDB tables."""
+
+import os
+import sys
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.dirname(__file__))
+
+import inventory_system as inventory  # noqa: E402
+
+_deserializer = TypeDeserializer()
+
+def _conditions_hold(item, condition, values):
+    checks = {
+        'version = :expected': lambda: item.get('version') == values[':expected'],
+        '(attribute_not_exists(version) OR version = :expected)':
+            lambda: 'version' not in item or item['version'] == values[':expected'],
+        'available >= :required': lambda: item.get('available', 0) >= values[':required'],
+        'attribute_not_exists(version)': lambda: 'version' not in item,
+        'attribute_not_exists(shards)': lambda: 'shards' not in item,
+        'attribute_not_exists(aggregateId) AND attribute_not_exists(version)': lambda: not item,
+    }
+    if condition in checks:
+        return checks[condition]()
+    return all(checks[clause]() for clause in condition.split(' AND '))
+
+def _apply_update(item, expression, values):
+    set_part, _, add_part = expression.partition(' ADD ')
+    for clause in set_part[len('SET '):].split(', '):
+        name, placeholder = clause.split(' = ')
+        item[name] = values[placeholder]
+    if add_part:
+        for clause in add_part.split(', '):
+            name, placeholder = clause.split(' ')
+            item[name] = item.get(name, 0) + values[placeholder]
+
+class FakeStockTables:
+    """stock-levels, inventory-events and the client calls inventory_system makes."""
+
+    def __init__(self):
+        self.stock = {}
+        self.events = {}
+        self.transactions = 0
+        self.meta = self
+        self.client = self
+        self.before_transaction = None
+        self.stock_view = FakeTable(self, 'stock-levels')
+        self.event_store = FakeTable(self, 'inventory-events')
+
+    def put_stock(self, product_id, warehouse_id, **attributes):
+        self.stock[(product_id, warehouse_id)] = {'productId': product_id, 'warehouseId': warehouse_id,
+                                                  **attributes}
+
+    def batch_get_item(self, RequestItems):
+        [(name, request)] = RequestItems.items()
+        found = [dict(self.stock[(k['productId'], k['warehouseId'])]) for k in request['Keys']
+                 if (k['productId'], k['warehouseId']) in self.stock]
+        return {'Responses': {name: found}, 'UnprocessedKeys': {}}
+
+    def transact_write_items(self, TransactItems):
+        if self.before_transaction:
+            hook, self.before_transaction = self.before_transaction, None
+            hook()
+        writes = []
+        reasons = []
+        for entry in TransactItems:
+            [(kind, request)] = entry.items()
+            values = {k: _deserializer.deserialize(v)
+                      for k, v in request.get('ExpressionAttributeValues', {}).items()}
+            if kind == 'Update':
+                key = tuple(_deserializer.deserialize(request['Key'][k]) for k in ('productId', 'warehouseId'))
+                current = self.stock.get(key, {})
+            else:
+                item = {k: _deserializer.deserialize(v) for k, v in request['Item'].items()}
+                key = (item['aggregateId'], item['version'])
+                current = self.events.get(key, {})
+            ok = _conditions_hold(current, request['ConditionExpression'], values)
+            reasons.append({'Code': 'None' if ok else 'ConditionalCheckFailed'})
+            writes.append((kind, key, request, values))
+        if any(r['Code'] != 'None' for r in reasons):
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+                               'CancellationReasons': reasons}, 'TransactWriteItems')
+        self.transactions += 1
+        for kind, key, request, values in writes:
+            if kind == 'Update':
+                item = self.stock.setdefault(key, {'productId': key[0], 'warehouseId': key[1]})
+                _apply_update(item, request['UpdateExpression'], values)
+            else:
+                self.events[key] = {k: _deserializer.deserialize(v) for k, v in request['Item'].items()}
+
+class FakeTable:
+    def __init__(self, tables, name):
+        self.tables = tables
+        self.name = name
+
+    def get_item(self, Key, **kwargs):
+        item = self.tables.stock.get((Key['productId'], Key['warehouseId']))
+        return {'Item': dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues):
+        item = self.tables.stock[(Key['productId'], Key['warehouseId'])]
+        if not _conditions_hold(item, ConditionExpression, ExpressionAttributeValues):
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'x'}}, 'UpdateItem')
+        _apply_update(item, UpdateExpression, ExpressionAttributeValues)
+
+    def query(self, ExpressionAttributeValues, **kwargs):
+        versions = sorted((e for (aggregate_id, _), e in self.tables.events.items()
+                           if aggregate_id == ExpressionAttributeValues[':id']),
+                          key=lambda e: e['version'], reverse=True)
+        return {'Items': versions[:kwargs.get('Limit')]}
+
+class FakeSNS:
+    def __init__(self):
+        self.published = []
+        self.fail = None
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        if self.fail:
+            raise self.fail
+        self.published.extend(entry['Message'] for entry in PublishBatchRequestEntries)
+        return {'Successful': [{'Id': e['Id']} for e in PublishBatchRequestEntries], 'Failed': []}
+
+@pytest.fixture
+def tables(monkeypatch):
+    fake = FakeStockTables()
+    monkeypatch.setattr(inventory, 'dynamodb', fake)
+    monkeypatch.setattr(inventory, 'stock_view', fake.stock_view)
+    monkeypatch.setattr(inventory, 'event_store', fake.event_store)
+    monkeypatch.setattr(inventory, 'sns', FakeSNS())
+    for name in ('_stock_state', '_shard_counts', '_last_rebalanced', '_level_cache', '_last_alerted'):
+        monkeypatch.setattr(inventory, name, {})
+    monkeypatch.setattr(inventory, 'transaction_stats', {'committed': 0, 'conflicts': 0})
+    monkeypatch.setattr(inventory.time, 'sleep', lambda seconds: None)
+    return fake
+
+def test_reserve_updates_stock_version_and_event_together(tables):
+    tables.put_stock('p-1', 'w-1', available=50, reserved=0, version=3)
+    inventory.reserve_stock('p-1', 'w-1', 5)
+    assert tables.stock[('p-1', 'w-1')] == {'productId': 'p-1', 'warehouseId': 'w-1',
+                                             'available': 45, 'reserved': 5, 'version': 4}
+    assert [key for key in tables.events] == [('p-1#w-1', 4)]
+    assert tables.transactions == 1
+
+def test_stale_cached_version_is_reread_and_retried(tables):
+    tables.put_stock('p-1', 'w-1', available=50, reserved=0, version=1)
+    inventory.reserve_stock('p-1', 'w-1', 5)
+    # Another process reserves behind our cached state
+    tables.stock[('p-1', 'w-1')].update(available=40, reserved=10, version=3)
+    inventory.reserve_stock('p-1', 'w-1', 5)
+    assert tables.stock[('p-1', 'w-1')]['available'] == 35
+    assert tables.stock[('p-1', 'w-1')]['version'] == 4
+    assert inventory.transaction_stats == {'committed': 2, 'conflicts': 1}
+
+def test_insufficient_stock_writes_nothing(tables):
+    tables.put_stock('p-1', 'w-1', available=50, reserved=0, version=1)
+    with pytest.raises(inventory.InsufficientStock):
+        inventory.reserve_stock('p-1', 'w-1', 51)
+    assert tables.transactions == 0
+
+def test_unversioned_item_is_seeded_from_event_log(tables):
+    tables.put_stock('p-1', 'w-1', available=50, reserved=0)
+    tables.events[('p-1#w-1', 7)] = {'aggregateId': 'p-1#w-1', 'version': 7}
+    inventory.reserve_stock('p-1', 'w-1', 5)
+    assert tables.stock[('p-1', 'w-1')]['version'] == 8
+    assert ('p-1#w-1', 8) in tables.events
+
+def stock_levels(tables):
+    return {key: (item['available'], item['reserved']) for key, item in tables.stock.items()}
+
+def fail_transactions(tables, predicate, error):
+    """Make transactions whose event puts match predicate(event_type, product_id) raise error."""
+    real = tables.transact_write_items
+
+    def transact(TransactItems):
+        for entry in TransactItems:
+            item = entry.get('Put', {}).get('Item')
+            if item and predicate(item['eventType']['S'], item['productId']['S']):
+                raise error
+        return real(TransactItems)
+
+    tables.transact_write_items = transact
+
+@pytest.fixture
+def three_products(tables, monkeypatch):
+    monkeypatch.setattr(inventory, 'TRANSACTION_LINES', 1)
+    for product_id in ('p-1', 'p-2', 'p-3'):
+        tables.put_stock(product_id, 'w-1', available=50, reserved=0, version=1)
+    return tables
+
+def test_reserve_many_releases_earlier_chunks_on_insufficient_stock(three_products):
+    three_products.stock[('p-3', 'w-1')]['available'] = 2
+    with pytest.raises(inventory.InsufficientStock):
+        inventory.reserve_many('o-1', [('p-1', 'w-1', 5), ('p-2', 'w-1', 5), ('p-3', 'w-1', 5)])
+    assert stock_levels(three_products) == {('p-1', 'w-1'): (50, 0), ('p-2', 'w-1'): (50, 0),
+                                            ('p-3', 'w-1'): (2, 0)}
+
+def test_reserve_many_compensates_on_any_error(three_products):
+    fail_transactions(three_products, lambda event_type, product_id: product_id == 'p-3',
+                      RuntimeError('network went away'))
+    with pytest.raises(RuntimeError, match='network went away'):
+        inventory.reserve_many('o-1', [('p-1', 'w-1', 5), ('p-2', 'w-1', 5), ('p-3', 'w-1', 5)])
+    assert all(level == (50, 0) for level in stock_levels(three_products).values())
+
+def test_failed_release_is_logged_and_others_still_released(three_products, caplog):
+    original = ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'p-3 failed'}},
+                           'TransactWriteItems')
+    fail_transactions(three_products, lambda event_type, product_id: (
+        product_id == 'p-3' or (event_type == 'StockReleased' and product_id == 'p-2')), original)
+    with pytest.raises(ClientError) as raised:
+        inventory.reserve_many('o-1', [('p-1', 'w-1', 5), ('p-2', 'w-1', 5), ('p-3', 'w-1', 5)])
+    assert raised.value is original
+    assert stock_levels(three_products)[('p-1', 'w-1')] == (50, 0)
+    assert stock_levels(three_products)[('p-2', 'w-1')] == (45, 5)
+    assert "Order o-1: failed to release 1 reserved stock items: [('p-2', 'w-1')]" in caplog.text
+
+def test_low_stock_alert_is_published_before_returning_and_deduplicated(tables):
+    tables.put_stock('p-1', 'w-1', available=12, reserved=0, version=1)
+    inventory.reserve_stock('p-1', 'w-1', 3)
+    assert inventory.sns.published == ['Product p-1 in warehouse w-1 is low: 9 units']
+    inventory.reserve_stock('p-1', 'w-1', 1)
+    assert len(inventory.sns.published) == 1
+
+def test_failed_alert_is_retried_on_next_change(tables, caplog):
+    tables.put_stock('p-1', 'w-1', available=12, reserved=0, version=1)
+    inventory.sns.fail = ClientError({'Error': {'Code': 'Throttling', 'Message': 'slow down'}}, 'PublishBatch')
+    inventory.reserve_stock('p-1', 'w-1', 3)
+    assert 'Low stock alerts failed' in caplog.text
+    assert inventory.sns.published == []
+
+    inventory.sns.fail = None
+    inventory.reserve_stock('p-1', 'w-1', 1)
+    assert inventory.sns.published == ['Product p-1 in warehouse w-1 is low: 8 units']
+
+def shard_levels(tables, product_id, warehouse_id, shards):
+    return [tables.stock[(product_id, f'{warehouse_id}#{n}')]['available'] for n in range(shards)]
+
+def test_reserve_many_splits_sharded_items_fullest_first(tables):
+    tables.put_stock('p-1', 'w-1', available=20, reserved=0, version=1)
+    inventory.enable_sharding('p-1', 'w-1', 3)
+    for n, available in enumerate([4, 10, 6]):
+        tables.stock[('p-1', f'w-1#{n}')]['available'] = available
+    inventory._stock_state.clear()
+
+    inventory.reserve_many('o-1', [('p-1', 'w-1', 10), ('p-1', 'w-1', 5)])
+    assert shard_levels(tables, 'p-1', 'w-1', 3) == [4, 0, 1]
+    assert sum(tables.stock[('p-1', f'w-1#{n}')]['reserved'] for n in range(3)) == 15
+
+def test_reserve_many_rejects_sharded_item_short_overall(tables):
+    tables.put_stock('p-1', 'w-1', available=20, reserved=0, version=1)
+    inventory.enable_sharding('p-1', 'w-1', 2)
+    transactions = tables.transactions
+    with pytest.raises(inventory.InsufficientStock):
+        inventory.reserve_many('o-1', [('p-1', 'w-1', 21)])
+    assert tables.transactions == transactions
+
+def test_reserve_many_redirects_item_sharded_elsewhere(tables):
+    tables.put_stock('p-1', 'w-1', available=30, reserved=0, version=1)
+    tables.put_stock('p-2', 'w-1', available=30, reserved=0, version=1)
+    inventory.load_stock_states([('p-1', 'w-1'), ('p-2', 'w-1')])
+    stale = dict(inventory._stock_state[('p-1', 'w-1')])
+    # Another process shards p-1; this one still has the unsharded state cached
+    inventory.enable_sharding('p-1', 'w-1', 3)
+    inventory._shard_counts.clear()
+    inventory._stock_state[('p-1', 'w-1')] = stale
+
+    inventory.reserve_many('o-1', [('p-1', 'w-1', 5), ('p-2', 'w-1', 5)])
+    assert tables.stock[('p-1', 'w-1')]['available'] == 0
+    assert sum(shard_levels(tables, 'p-1', 'w-1', 3)) == 25
+    assert tables.stock[('p-2', 'w-1')]['available'] == 25
+
+def test_reserve_many_unsharded_lines_are_conditioned_on_no_shards(tables):
+    tables.put_stock('p-1', 'w-1', available=20, reserved=0, version=1)
+    inventory.load_stock_state('p-1', 'w-1')
+    # Sharded without a version bump: only the shards condition can catch it
+    tables.stock[('p-1', 'w-1')]['shards'] = 2
+    for n in range(2):
+        tables.put_stock('p-1', f'w-1#{n}', available=10, reserved=0, version=1)
+    inventory.reserve_many('o-1', [('p-1', 'w-1', 5)])
+    assert tables.stock[('p-1', 'w-1')]['available'] == 20
+    assert sum(shard_levels(tables, 'p-1', 'w-1', 2)) == 15
+
+def test_reserve_many_alerts_on_sharded_item_total(tables):
+    tables.put_stock('p-1', 'w-1', available=12, reserved=0, version=1)
+    inventory.enable_sharding('p-1', 'w-1', 2)
+    inventory.reserve_many('o-1', [('p-1', 'w-1', 4)])
+    assert inventory.sns.published == ['Product p-1 in warehouse w-1 is low: 8 units']
+
+def test_release_on_item_sharded_elsewhere_goes_to_a_shard(tables):
+    tables.put_stock('p-1', 'w-1', available=20, reserved=0, version=1)
+    inventory.reserve_stock('p-1', 'w-1', 5)
+    stale = dict(inventory._stock_state[('p-1', 'w-1')])
+    # Another process shards the item; this one still has the unsharded state cached
+    inventory.enable_sharding('p-1', 'w-1', 2)
+    inventory._shard_counts.clear()
+    inventory._stock_state[('p-1', 'w-1')] = stale
+
+    inventory.release_stock('p-1', 'w-1', 5)
+    assert tables.stock[('p-1', 'w-1')]['available'] == 0
+    assert sum(shard_levels(tables, 'p-1', 'w-1', 2)) == 20
+    assert inventory._shard_counts[('p-1', 'w-1')] == 2
+
+def test_unsharded_writes_are_conditioned_on_no_shards(tables):
+    tables.put_stock('p-1', 'w-1', available=20, reserved=5, version=1)
+    inventory.load_stock_state('p-1', 'w-1')
+    # Sharded without a version bump: only the shards condition can catch it
+    tables.stock[('p-1', 'w-1')]['shards'] = 2
+    for n in range(2):
+        tables.put_stock('p-1', f'w-1#{n}', available=0, reserved=0, version=1)
+    inventory.record_sale('p-1', 'w-1', 5)
+    assert tables.stock[('p-1', 'w-1')]['reserved'] == 5
+    assert sum(tables.stock[('p-1', f'w-1#{n}')]['reserved'] for n in range(2)) == -5
+
+def test_transaction_conflict_backs_off_and_retries(tables, monkeypatch):
+    tables.put_stock('p-1', 'w-1', available=20, reserved=0, version=1)
+    sleeps = []
+    monkeypatch.setattr(inventory.time, 'sleep', sleeps.append)
+    real = tables.transact_write_items
+    conflicts = iter([True, True, False])
+
+    def transact(TransactItems):
+        if next(conflicts):
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'busy'},
+                               'CancellationReasons': [{'Code': 'TransactionConflict'}, {'Code': 'None'}]},
+                              'TransactWriteItems')
+        return real(TransactItems)
+
+    tables.transact_write_items = transact
+    inventory.reserve_stock('p-1', 'w-1', 5)
+    assert tables.stock[('p-1', 'w-1')]['available'] == 15
+    assert len(sleeps) == 2
+    assert sleeps[0] <= inventory.VERSION_RETRY_BACKOFF and sleeps[1] <= 2 * inventory.VERSION_RETRY_BACKOFF
+    assert inventory.transaction_stats == {'committed': 1, 'conflicts': 2}
+
+def test_persistent_conflicts_give_up(tables):
+    tables.put_stock('p-1', 'w-1', available=20, reserved=0, version=1)
+
+    def always_stale(TransactItems):
+        tables.stock[('p-1', 'w-1')]['version'] += 1
+        raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'stale'},
+                           'CancellationReasons': [{'Code': 'ConditionalCheckFailed'}, {'Code': 'None'}]},
+                          'TransactWriteItems')
+
+    tables.transact_write_items = always_stale
+    with pytest.raises(ValueError, match='Concurrency conflict'):
+        inventory.reserve_stock('p-1', 'w-1', 5)
+    assert inventory.transaction_stats['conflicts'] == inventory.VERSION_RETRY_LIMIT
+
+def test_non_conflict_errors_are_not_retried(tables):
+    tables.put_stock('p-1', 'w-1', available=20, reserved=0, version=1)
+    error = ClientError({'Error': {'Code': 'ValidationException', 'Message': 'bad'}}, 'TransactWriteItems')
+    fail_transactions(tables, lambda event_type, product_id: True, error)
+    with pytest.raises(ClientError):
+        inventory.reserve_stock('p-1', 'w-1', 5)
+    assert inventory.transaction_stats == {'committed': 0, 'conflicts': 0}
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Closed-state overhead of the shared circuit breaker under concurrency.
+
+Runs the same no-op call directly and through CircuitBreaker.call (threads)
+and CircuitBreaker.call_async (asyncio tasks), and reports the added cost
+per call next to a typical downstream latency:
+
+    python circuit_breaker_benchmark.py --threads 1 8 32 --tasks 100
+
+Stdlib only; the breaker module is loaded from python-basics by path.
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+MODULE_PATH = (Path(__file__).resolve().parents[1] / "modules" / "A_zero_to_hero"
+               / "python-basics" / "circuit_breaker.py")
+spec = importlib.util.spec_from_file_location("circuit_breaker", MODULE_PATH)
+circuit_breaker = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = circuit_breaker
+spec.loader.exec_module(circuit_breaker)
+
+def noop(value):
+    return value
+
+async def async_noop(value):
+    return value
+
+def run_threads(threads, calls, call):
+    """Seconds for `threads` threads to each make `calls` calls."""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for i in range(calls):
+            call(i)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.join()
+    return time.perf_counter() - start
+
+def run_tasks(tasks, calls, call):
+    """Seconds for `tasks` asyncio tasks to each await `calls` calls."""
+    async def worker():
+        for i in range(calls):
+            await call(i)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(tasks)))
+        return time.perf_counter() - start
+
+    return asyncio.run(main())
+
+def best_of(repeat, fn, *args):
+    return min(fn(*args) for _ in range(repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure closed-state circuit breaker overhead.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--tasks", type=int, default=100, help="Concurrent asyncio tasks.")
+    parser.add_argument("--calls", type=int, default=200_000, help="Total calls per measurement.")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs.")
+    parser.add_argument("--downstream-ms", type=float, default=1.0,
+                        help="Typical latency of the protected call, for the overhead ratio.")
+    parser.add_argument("--output", default="results/circuit_breaker_results.txt")
+    args = parser.parse_args()
+
+    registry = circuit_breaker.CircuitBreakerRegistry()
+    breaker = registry.get("benchmark")
+    downstream_ns = args.downstream_ms * 1e6
+    lines = [f"calls per run: {args.calls:,}, best of {args.repeat}, python {sys.version.split()[0]}"]
+
+    def report(label, direct, protected):
+        overhead_ns = (protected - direct) / args.calls * 1e9
+        lines.append(f"{label:<22} direct {direct / args.calls * 1e9:7.0f} ns/call, "
+                     f"breaker {protected / args.calls * 1e9:7.0f} ns/call, "
+                     f"overhead {overhead_ns:6.0f} ns ({overhead_ns / downstream_ns:.3%} "
+                     f"of a {args.downstream_ms:g} ms call)")
+
+    for threads in args.threads:
+        per_thread = args.calls // threads
+        direct = best_of(args.repeat, run_threads, threads, per_thread, noop)
+        protected = best_of(args.repeat, run_threads, threads, per_thread,
+                            lambda i: breaker.call(noop, i))
+        report(f"sync, {threads} threads", direct, protected)
+
+    per_task = args.calls // args.tasks
+    direct = best_of(args.repeat, run_tasks, args.tasks, per_task, async_noop)
+    protected = best_of(args.repeat, run_tasks, args.tasks, per_task,
+                        lambda i: breaker.call_async(async_noop, i))
+    report(f"async, {args.tasks} tasks", direct, protected)
+
+    assert breaker.state is circuit_breaker.CircuitState.CLOSED
+    lines.append(f"breaker state after run: {breaker.state.value}")
+    print("\n".join(lines))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+if __name__ == "__main__":
+    main()
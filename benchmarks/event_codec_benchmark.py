@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Encode/decode throughput of the CQRS event codecs vs dataclasses.asdict.
+
+Needs the aws extra (boto3, aws-xray-sdk) and structlog, because the command
+handler module builds its DynamoDB resources at import time.
+"""
+import importlib.util
+import os
+import sys
+import timeit
+from dataclasses import asdict
+from decimal import Decimal
+from pathlib import Path
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+MODULE_PATH = (Path(__file__).resolve().parents[1] / "aws-solutions-architect" / "advanced-architectures"
+               / "02-cqrs-saga" / "problem-1" / "command_handler_advanced.py")
+spec = importlib.util.spec_from_file_location("command_handler_advanced", MODULE_PATH)
+cqrs = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = cqrs
+spec.loader.exec_module(cqrs)
+
+# Generate test data
+def generate_events(count=10000):
+    events = [cqrs.OrderCreated(event_id="e0", aggregate_id="order-1", version=1, customer_id="c-1")]
+    for i in range(2, count):
+        events.append(cqrs.ItemAdded(event_id=f"e{i}", aggregate_id="order-1", version=i,
+                                     product_id=f"sku-{i % 500}", quantity=i % 7 + 1,
+                                     price=Decimal("19.99")))
+    events.append(cqrs.OrderConfirmed(event_id="e-last", aggregate_id="order-1", version=count))
+    return events
+
+# Baseline: asdict + if/elif dispatch (the previous implementation)
+def baseline_encode(event):
+    d = asdict(event)
+    d["event_type"] = event.event_type.value
+    if "price" in d:
+        d["price"] = float(event.price)
+    return d
+
+def baseline_decode(item):
+    item = dict(item)
+    event_type = cqrs.EventType(item["event_type"])
+    if event_type == cqrs.EventType.ORDER_CREATED:
+        return cqrs.OrderCreated(**item)
+    elif event_type == cqrs.EventType.ITEM_ADDED:
+        item["price"] = Decimal(str(item["price"]))
+        return cqrs.ItemAdded(**item)
+    elif event_type == cqrs.EventType.ORDER_CONFIRMED:
+        return cqrs.OrderConfirmed(**item)
+    raise ValueError(event_type)
+
+if __name__ == '__main__':
+    events = generate_events()
+    baseline_items = [baseline_encode(e) for e in events]
+    codec_items = [cqrs.encode_event(e) for e in events]
+    binary_items = [cqrs.encode_event(e, binary=True) for e in events]
+
+    runs = {
+        "baseline encode": lambda: [baseline_encode(e) for e in events],
+        "codec encode": lambda: [cqrs.encode_event(e) for e in events],
+        "binary encode": lambda: [cqrs.encode_event(e, binary=True) for e in events],
+        "baseline decode": lambda: [baseline_decode(i) for i in baseline_items],
+        "codec decode": lambda: [cqrs.decode_event(i) for i in codec_items],
+        "binary decode": lambda: [cqrs.decode_event(i) for i in binary_items],
+    }
+
+    number = 10
+    lines = []
+    for name, fn in runs.items():
+        seconds = timeit.timeit(fn, number=number)
+        rate = len(events) * number / seconds
+        lines.append(f"{name}: {rate:,.0f} events/s")
+        print(lines[-1])
+
+    payload_bytes = sum(len(i["payload"]) for i in binary_items) / len(binary_items)
+    lines.append(f"binary payload: {payload_bytes:.1f} bytes/event")
+    print(lines[-1])
+
+    output = Path(__file__).resolve().parent / "results" / "event_codec_results.txt"
+    output.parent.mkdir(exist_ok=True)
+    with open(output, 'w') as f:
+        f.write("\n".join(lines) + "\n")
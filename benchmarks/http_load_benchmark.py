@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Open-loop HTTP load generator with HDR-style latency histograms.
+
+Requests are fired on a fixed schedule (``--rate`` per second) regardless of
+how quickly earlier requests complete, and each latency is measured from the
+request's *intended* start time. A stalled server therefore shows up as queueing
+delay in the percentiles instead of silently lowering the offered load
+(coordinated omission).
+
+Stdlib only, so the same client can be pointed at every service in the repo:
+
+    python http_load_benchmark.py --target full_project --target exam_01 --rate 500
+    python http_load_benchmark.py --url http://localhost:8000/health --rate 200 --format json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# name -> (script relative to repo root, path to hit)
+TARGETS: Dict[str, Tuple[str, str]] = {
+    "app_faang": ("modules/C_full_project/app/app_faang.py", "/"),
+    "full_project": ("modules/C_full_project/app/app.py", "/health"),
+    "exam_01": ("modules/B_mock_exam/exam_01/starter/app.py", "/health"),
+    "exam_05_flask": ("modules/B_mock_exam/exam_05/starter/app/app.py", "/health"),
+    "exam_07_flask": ("modules/B_mock_exam/exam_07/starter/app/app.py", "/healthz"),
+    "observability_slo_flask": ("practice_examples/observability-slo/app.py", "/"),
+}
+
+# These call app.run(port=8000) directly, so they are started with `flask run`
+# to honour --port.
+FLASK_TARGETS = frozenset({"exam_05_flask", "exam_07_flask", "observability_slo_flask"})
+
+
+class LatencyHistogram:
+    """Log-linear histogram in the style of HdrHistogram.
+
+    Values are recorded in integer microseconds. Each power-of-two bucket is
+    split into ``2 * 10**significant_digits`` linear sub-buckets (rounded up to
+    a power of two), so any recorded value is reported within that relative
+    precision while memory stays bounded by the dynamic range, not the count.
+    """
+
+    def __init__(self, significant_digits: int = 3):
+        self._half_magnitude = max(0, (2 * 10**significant_digits - 1).bit_length() - 1)
+        self._sub_bucket_half = 1 << self._half_magnitude
+        self._sub_bucket_mask = (self._sub_bucket_half << 1) - 1
+        self._counts: Dict[Tuple[int, int], int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def _index(self, value: int) -> Tuple[int, int]:
+        bucket = max(0, (value | self._sub_bucket_mask).bit_length() - (self._half_magnitude + 1))
+        return bucket, value >> bucket
+
+    def record(self, value_us: int, count: int = 1) -> None:
+        value_us = max(0, int(value_us))
+        key = self._index(value_us)
+        self._counts[key] = self._counts.get(key, 0) + count
+        if self.count == 0 or value_us < self.min:
+            self.min = value_us
+        self.max = max(self.max, value_us)
+        self.count += count
+        self.total += value_us * count
+
+    def merge(self, other: LatencyHistogram) -> None:
+        for key, count in other._counts.items():
+            self._counts[key] = self._counts.get(key, 0) + count
+        if other.count:
+            self.min = other.min if self.count == 0 else min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, pct: float) -> int:
+        """Return the highest value equivalent to the given percentile."""
+        if self.count == 0:
+            return 0
+        threshold = max(1, int(round(self.count * pct / 100.0 + 0.5 - 1e-9)))
+        seen = 0
+        for bucket, sub in sorted(self._counts):
+            seen += self._counts[(bucket, sub)]
+            if seen >= threshold:
+                return min(self.max, (sub << bucket) + (1 << bucket) - 1)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+@dataclass
+class LoadResult:
+    target: str
+    url: str
+    rate: float
+    duration: float
+    sent: int = 0
+    completed: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    status_codes: Dict[int, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def summary(self) -> Dict[str, object]:
+        hist = self.histogram
+        return {
+            "target": self.target,
+            "url": self.url,
+            "offered_rps": self.rate,
+            "achieved_rps": round(self.completed / self.elapsed, 1) if self.elapsed else 0.0,
+            "sent": self.sent,
+            "completed": self.completed,
+            "errors": self.errors,
+            "status_codes": {str(k): v for k, v in sorted(self.status_codes.items())},
+            "latency_ms": {
+                "mean": round(hist.mean / 1000, 3),
+                "p50": hist.percentile(50) / 1000,
+                "p90": hist.percentile(90) / 1000,
+                "p99": hist.percentile(99) / 1000,
+                "p99.9": hist.percentile(99.9) / 1000,
+                "max": hist.max / 1000,
+            },
+        }
+
+
+class ConnectionPool:
+    """Fixed-size pool of keep-alive HTTP/1.1 connections."""
+
+    def __init__(self, host: str, port: int, size: int):
+        self.host = host
+        self.port = port
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(None)
+
+    async def acquire(self):
+        conn = await self._idle.get()
+        if conn is None:
+            try:
+                conn = await asyncio.open_connection(self.host, self.port)
+            except BaseException:
+                # Failed or timed-out connect: the slot goes back unused
+                self._idle.put_nowait(None)
+                raise
+        return conn
+
+    def release(self, conn, reusable: bool) -> None:
+        if not reusable and conn is not None:
+            conn[1].close()
+            conn = None
+        self._idle.put_nowait(conn)
+
+    async def close(self) -> None:
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            if conn is not None:
+                conn[1].close()
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bool]:
+    """Read one response; return (status, connection reusable)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("server closed connection")
+    version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+        keep_alive = False
+    return int(status), keep_alive
+
+
+def _record_error(result: LoadResult, record: bool, exc: Exception) -> None:
+    if record:
+        name = type(exc).__name__
+        result.errors[name] = result.errors.get(name, 0) + 1
+
+
+async def _fire(pool: ConnectionPool, request: bytes, intended: float, timeout: float,
+                result: LoadResult, record: bool) -> None:
+    loop = asyncio.get_running_loop()
+    reusable = False
+    try:
+        # Only a slot we actually got is released; acquire returns its own on failure
+        conn = await asyncio.wait_for(pool.acquire(), timeout)
+    except Exception as exc:  # noqa: BLE001 - every failure is a data point
+        _record_error(result, record, exc)
+        return
+    try:
+        reader, writer = conn
+        writer.write(request)
+        status, reusable = await asyncio.wait_for(_read_response(reader), timeout)
+    except Exception as exc:  # noqa: BLE001
+        _record_error(result, record, exc)
+        return
+    finally:
+        pool.release(conn, reusable)
+
+    if record:
+        # Measured from the scheduled send time, not from when a connection freed up
+        result.histogram.record(int((loop.time() - intended) * 1_000_000))
+        result.completed += 1
+        result.status_codes[status] = result.status_codes.get(status, 0) + 1
+
+
+async def run_load(url: str, rate: float, duration: float, warmup: float = 1.0,
+                   connections: int = 64, timeout: float = 5.0, target: str = "url") -> LoadResult:
+    """Drive url at a fixed request rate and collect latency statistics."""
+    parts = urlsplit(url)
+    host = parts.hostname or "localhost"
+    port = parts.port or 80
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+        "User-Agent: http-load-benchmark\r\nAccept: */*\r\n\r\n"
+    ).encode("ascii")
+
+    result = LoadResult(target=target, url=url, rate=rate, duration=duration)
+    pool = ConnectionPool(host, port, connections)
+    loop = asyncio.get_running_loop()
+    interval = 1.0 / rate
+    total = int(rate * (warmup + duration))
+    warmup_requests = int(rate * warmup)
+    tasks = set()
+
+    start = loop.time()
+    for i in range(total):
+        intended = start + i * interval
+        delay = intended - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        record = i >= warmup_requests
+        if record:
+            result.sent += 1
+        task = asyncio.create_task(_fire(pool, request, intended, timeout, result, record))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    result.elapsed = loop.time() - (start + warmup_requests * interval)
+    await pool.close()
+    return result
+
+
+def _wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"service did not start listening on port {port} within {timeout}s")
+
+
+def benchmark_target(name: str, args: argparse.Namespace) -> Dict[str, object]:
+    """Launch one of the repo's services locally, load it, and stop it."""
+    script, path = TARGETS[name]
+    script_path = REPO_ROOT / script
+    env = dict(os.environ, PORT=str(args.port), LOG_LEVEL="WARNING")
+    if name in FLASK_TARGETS:
+        command = [sys.executable, "-m", "flask", "--app", script_path.stem, "run",
+                   "--host", "127.0.0.1", "--port", str(args.port)]
+    else:
+        command = [sys.executable, str(script_path)]
+    # Services log every request; a file never fills up and blocks them like a pipe would
+    stderr = tempfile.TemporaryFile("w+")
+    process = subprocess.Popen(
+        command,
+        cwd=script_path.parent,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=stderr,
+        text=True,
+    )
+    try:
+        try:
+            _wait_for_port(args.port, args.startup_timeout)
+        except RuntimeError:
+            process.kill()
+            process.wait()
+            stderr.seek(0)
+            raise RuntimeError(f"{name} failed to start:\n{stderr.read()}") from None
+        url = f"http://127.0.0.1:{args.port}{path}"
+        result = asyncio.run(run_load(url, args.rate, args.duration, args.warmup,
+                                      args.connections, args.timeout, target=name))
+        return result.summary()
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        stderr.close()
+
+
+def format_markdown(results: List[Dict[str, object]]) -> str:
+    """Render results as a markdown table."""
+    lines = [
+        "| Target | Offered rps | Achieved rps | Errors | p50 ms | p99 ms | p99.9 ms | Max ms |",
+        "|--------|-------------|--------------|--------|--------|--------|----------|--------|",
+    ]
+    for r in results:
+        lat = r["latency_ms"]
+        errors = sum(r["errors"].values())
+        lines.append(
+            f"| {r['target']} | {r['offered_rps']} | {r['achieved_rps']} | {errors} | "
+            f"{lat['p50']:.3f} | {lat['p99']:.3f} | {lat['p99.9']:.3f} | {lat['max']:.3f} |"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Open-loop HTTP latency benchmark.")
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS),
+                        help="Repo service to launch and benchmark (repeatable).")
+    parser.add_argument("--url", help="Benchmark an already-running service instead.")
+    parser.add_argument("--rate", type=float, default=200.0, help="Requests per second to offer.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds of load.")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unrecorded warm-up seconds.")
+    parser.add_argument("--connections", type=int, default=64, help="Keep-alive connection pool size.")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="Port launched targets listen on (Flask targets via flask run --port).")
+    parser.add_argument("--startup-timeout", type=float, default=15.0)
+    parser.add_argument("--format", choices=["markdown", "json"], default="markdown", help="Output format.")
+    parser.add_argument("--output", type=Path, help="Also write JSON results to this file.")
+    args = parser.parse_args()
+
+    if not args.target and not args.url:
+        parser.error("pass --url or at least one --target")
+
+    results = []
+    if args.url:
+        result = asyncio.run(run_load(args.url, args.rate, args.duration, args.warmup,
+                                      args.connections, args.timeout))
+        results.append(result.summary())
+    for name in args.target or []:
+        results.append(benchmark_target(name, args))
+
+    if args.format == "markdown":
+        print(format_markdown(results))
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
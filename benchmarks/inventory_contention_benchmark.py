@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""Concurrent stock reservations against the CQRS inventory system.
+
+Many threads reserve the same few SKUs through inventory_system.reserve_stock
+and the run reports throughput, latency and the version-conflict rate, then
+checks that no stock or event version was lost or duplicated. Each thread
+keeps its own stock-state cache, like a separate Lambda container would.
+
+By default DynamoDB is replaced with an in-memory stand-in that evaluates the
+same condition expressions (plus a fixed per-call latency). Like DynamoDB, it
+cancels a transaction with TransactionConflict when another transaction on one
+of its items is still in flight, so the backoff path gets exercised. Pass
+--endpoint-url to run against DynamoDB Local instead:
+
+    python inventory_contention_benchmark.py --threads 32 --skus 1
+    python inventory_contention_benchmark.py --threads 32 --skus 1 --shards 8
+    python inventory_contention_benchmark.py --endpoint-url http://localhost:8001
+
+Needs boto3 (the module builds its clients at import time).
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import threading
+import time
+from collections.abc import MutableMapping
+from pathlib import Path
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+MODULE_PATH = (Path(__file__).resolve().parents[1] / "aws-solutions-architect" / "advanced-architectures"
+               / "02-cqrs-saga" / "problem-3" / "inventory_system.py")
+spec = importlib.util.spec_from_file_location("inventory_system", MODULE_PATH)
+inventory = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = inventory
+spec.loader.exec_module(inventory)
+
+KEY_SCHEMAS = {
+    "stock-levels": ("productId", "warehouseId"),
+    "inventory-events": ("aggregateId", "version"),
+}
+
+# In-memory DynamoDB stand-in
+_deserializer = TypeDeserializer()
+_TERM = re.compile(r"^(?:attribute_not_exists\((\w+)\)|(\w+) (=|>=) (:\w+))$")
+
+def _condition_holds(item, expression, values):
+    """Evaluate the AND/OR condition subset inventory_system emits."""
+    for clause in expression.split(" AND "):
+        if clause.startswith("(") and clause.endswith(")"):
+            clause = clause[1:-1]
+        options = clause.split(" OR ")
+        if not any(_term_holds(item, option.strip(), values) for option in options):
+            return False
+    return True
+
+def _term_holds(item, term, values):
+    match = _TERM.match(term)
+    if match is None:
+        raise NotImplementedError(f"Unsupported condition: {term}")
+    missing, name, op, placeholder = match.groups()
+    if missing:
+        return missing not in item
+    if name not in item:
+        return False
+    return item[name] == values[placeholder] if op == "=" else item[name] >= values[placeholder]
+
+def _apply_update(item, expression, values):
+    set_part, _, add_part = expression.partition(" ADD ")
+    for assignment in set_part.removeprefix("SET ").split(", "):
+        name, placeholder = assignment.split(" = ")
+        item[name] = values[placeholder]
+    if add_part:
+        for action in add_part.split(", "):
+            name, placeholder = action.split()
+            item[name] = item.get(name, 0) + values[placeholder]
+
+class LocalTable:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.items = {}
+        self.hash_key, self.range_key = KEY_SCHEMAS[name]
+
+    def key_of(self, item):
+        return (item[self.hash_key], item[self.range_key])
+
+    def get_item(self, Key, ConsistentRead=False):
+        self.db.round_trip()
+        with self.db.lock:
+            item = self.items.get(self.key_of(Key))
+            return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None):
+        self.db.round_trip()
+        with self.db.lock:
+            item = self.items.get(self.key_of(Key), dict(Key))
+            if ConditionExpression and not _condition_holds(item, ConditionExpression, ExpressionAttributeValues):
+                raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+            _apply_update(item, UpdateExpression, ExpressionAttributeValues)
+            self.items[self.key_of(Key)] = item
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, ScanIndexForward=True, Limit=None):
+        self.db.round_trip()
+        with self.db.lock:
+            rows = sorted((item for (hash_value, _), item in self.items.items()
+                           if hash_value == ExpressionAttributeValues[":id"]),
+                          key=lambda item: item[self.range_key], reverse=not ScanIndexForward)
+        return {"Items": rows[:Limit]}
+
+class LocalDynamoDB:
+    """Tables, BatchGetItem and TransactWriteItems under one lock.
+
+    A transaction holds its items for its whole round trip; a second
+    transaction touching any of them meanwhile is cancelled with
+    TransactionConflict, as DynamoDB does.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self._in_flight = set()
+        self.tables = {name: LocalTable(self, name) for name in KEY_SCHEMAS}
+        self.meta = type("Meta", (), {"client": self})()
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        self.round_trip()
+        responses = {}
+        with self.lock:
+            for name, request in RequestItems.items():
+                table = self.tables[name]
+                responses[name] = [dict(table.items[table.key_of(key)])
+                                   for key in request["Keys"] if table.key_of(key) in table.items]
+        return {"Responses": responses}
+
+    def transact_write_items(self, TransactItems):
+        targets = []
+        for entry in TransactItems:
+            (action, request), = entry.items()
+            table = self.tables[request["TableName"]]
+            key = {k: _deserializer.deserialize(v) for k, v in request["Item" if action == "Put" else "Key"].items()}
+            targets.append((request["TableName"], table.key_of(key)))
+        with self.lock:
+            busy = [target in self._in_flight for target in targets]
+            if any(busy):
+                raise ClientError({"Error": {"Code": "TransactionCanceledException"},
+                                   "CancellationReasons": [{"Code": "TransactionConflict" if b else "None"}
+                                                           for b in busy]}, "TransactWriteItems")
+            self._in_flight.update(targets)
+        try:
+            self.round_trip()
+            self._commit(TransactItems)
+        finally:
+            with self.lock:
+                self._in_flight.difference_update(targets)
+
+    def _commit(self, TransactItems):
+        with self.lock:
+            staged = []
+            reasons = []
+            for entry in TransactItems:
+                (action, request), = entry.items()
+                table = self.tables[request["TableName"]]
+                values = {k: _deserializer.deserialize(v) for k, v in request.get("ExpressionAttributeValues", {}).items()}
+                if action == "Put":
+                    item = {k: _deserializer.deserialize(v) for k, v in request["Item"].items()}
+                    current = table.items.get(table.key_of(item), {})
+                else:
+                    key = {k: _deserializer.deserialize(v) for k, v in request["Key"].items()}
+                    current = table.items.get(table.key_of(key), dict(key))
+                    item = dict(current)
+                    _apply_update(item, request["UpdateExpression"], values)
+                condition = request.get("ConditionExpression")
+                ok = not condition or _condition_holds(current, condition, values)
+                reasons.append({"Code": "None" if ok else "ConditionalCheckFailed"})
+                staged.append((table, item))
+            if any(r["Code"] != "None" for r in reasons):
+                raise ClientError({"Error": {"Code": "TransactionCanceledException"},
+                                   "CancellationReasons": reasons}, "TransactWriteItems")
+            for table, item in staged:
+                table.items[table.key_of(item)] = item
+
+class NullSNS:
+    def publish(self, **kwargs):
+        pass
+
+    def publish_batch(self, **kwargs):
+        return {"Failed": []}
+
+class ThreadLocalState(MutableMapping):
+    """Per-thread stand-in for inventory_system._stock_state."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def _data(self):
+        if not hasattr(self._local, "data"):
+            self._local.data = {}
+        return self._local.data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+def use_dynamodb_local(endpoint_url):
+    resource = boto3.resource("dynamodb", endpoint_url=endpoint_url)
+    existing = set(resource.meta.client.list_tables()["TableNames"])
+    for name, (hash_key, range_key) in KEY_SCHEMAS.items():
+        if name in existing:
+            resource.Table(name).delete()
+            resource.Table(name).wait_until_not_exists()
+        resource.create_table(
+            TableName=name,
+            KeySchema=[{"AttributeName": hash_key, "KeyType": "HASH"},
+                       {"AttributeName": range_key, "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": hash_key, "AttributeType": "S"},
+                                  {"AttributeName": range_key, "AttributeType": "N" if range_key == "version" else "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        ).wait_until_exists()
+    return resource
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress concurrent inventory reservations.")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--reservations", type=int, default=100, help="Reservations per thread.")
+    parser.add_argument("--skus", type=int, default=1, help="Distinct SKUs; 1 models a flash-sale item.")
+    parser.add_argument("--shards", type=int, default=0, help="Shard each SKU over N sub-items.")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Per-call latency of the in-memory stand-in.")
+    parser.add_argument("--endpoint-url", help="Use DynamoDB Local at this URL instead of the stand-in.")
+    parser.add_argument("--output",
+                        default=str(Path(__file__).resolve().parent / "results" / "inventory_contention_results.txt"))
+    args = parser.parse_args()
+
+    if args.endpoint_url:
+        db = use_dynamodb_local(args.endpoint_url)
+        backend = f"DynamoDB Local ({args.endpoint_url})"
+    else:
+        db = LocalDynamoDB(args.latency_ms / 1000)
+        backend = f"in-memory stand-in, {args.latency_ms:g} ms/call"
+    inventory.dynamodb = db
+    inventory.stock_view = db.Table("stock-levels")
+    inventory.event_store = db.Table("inventory-events")
+    inventory.sns = NullSNS()
+    inventory._stock_state = ThreadLocalState()
+
+    total = args.threads * args.reservations
+    initial = total + 1000  # never drops to the low-stock threshold
+    skus = [f"sku-{i}" for i in range(args.skus)]
+    for sku in skus:
+        inventory.stock_view.update_item(
+            Key={"productId": sku, "warehouseId": "wh-1"},
+            UpdateExpression="SET available = :available, reserved = :zero, version = :zero",
+            ExpressionAttributeValues={":available": initial, ":zero": 0},
+        )
+        if args.shards:
+            inventory.enable_sharding(sku, "wh-1", args.shards)
+    inventory.transaction_stats.update(committed=0, conflicts=0)
+
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def worker(index):
+        local_latencies, local_failures = [], 0
+        for i in range(args.reservations):
+            sku = skus[(index + i) % len(skus)]
+            start = time.perf_counter()
+            try:
+                inventory.reserve_stock(sku, "wh-1", 1)
+            except ValueError:
+                local_failures += 1
+            local_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local_latencies)
+            failures.append(local_failures)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    failed = sum(failures)
+    stats = inventory.transaction_stats
+    attempts = stats["committed"] + stats["conflicts"]
+    latencies.sort()
+
+    # Invariants: stock is conserved and every aggregate's versions are 1..n
+    reserved = 0
+    for sku in skus:
+        keys = [(sku, "wh-1")] + (inventory._shard_keys(sku, "wh-1", args.shards) if args.shards else [])
+        for product_id, warehouse_id in keys:
+            item = inventory.stock_view.get_item(Key={"productId": product_id, "warehouseId": warehouse_id})["Item"]
+            reserved += int(item.get("reserved", 0))
+            versions = [int(e["version"]) for e in inventory.event_store.query(
+                KeyConditionExpression="aggregateId = :id",
+                ExpressionAttributeValues={":id": f"{product_id}#{warehouse_id}"})["Items"]]
+            assert versions == list(range(1, len(versions) + 1)), f"version gap or duplicate in {product_id}#{warehouse_id}"
+            assert int(item["version"]) == len(versions), f"stock version behind events for {product_id}#{warehouse_id}"
+    assert reserved == total - failed, f"reserved {reserved} != {total - failed}"
+
+    lines = [
+        f"backend: {backend}",
+        f"threads: {args.threads}, skus: {args.skus}, shards: {args.shards or 'off'}",
+        f"reservations: {total - failed}/{total} in {elapsed:.2f}s ({(total - failed) / elapsed:,.0f}/s)",
+        f"latency p50/p99: {percentile(latencies, 50) * 1000:.1f} / {percentile(latencies, 99) * 1000:.1f} ms",
+        f"transactions: {stats['committed']} committed, {stats['conflicts']} conflicts "
+        f"({stats['conflicts'] / attempts if attempts else 0:.1%} conflict rate)",
+        f"gave up after {inventory.VERSION_RETRY_LIMIT} attempts: {failed}",
+        "invariants: stock conserved, versions contiguous",
+    ]
+    print("\n".join(lines))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Tests for the connection pool in http_load_benchmark.py."""
+
+import asyncio
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import http_load_benchmark as bench  # noqa: E402
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: x\r\n\r\n"
+
+def new_result():
+    return bench.LoadResult(target="test", url="http://127.0.0.1/", rate=1, duration=1)
+
+def test_acquire_timeouts_do_not_grow_the_pool():
+    """--connections stays a cap when every slot is busy and acquires time out."""
+    async def scenario():
+        server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        pool = bench.ConnectionPool("127.0.0.1", port, size=1)
+        held = await pool.acquire()
+        result = new_result()
+        try:
+            await asyncio.gather(*(bench._fire(pool, REQUEST, 0.0, 0.01, result, True) for _ in range(5)))
+            assert result.errors == {"TimeoutError": 5}
+            assert pool._idle.qsize() == 0
+
+            pool.release(held, reusable=False)
+            assert pool._idle.qsize() == 1
+        finally:
+            await pool.close()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
+
+def test_failed_connect_returns_its_slot():
+    """A refused connection frees the slot instead of leaking or duplicating it."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]  # nothing listens here once closed
+
+    async def scenario():
+        pool = bench.ConnectionPool("127.0.0.1", port, size=1)
+        result = new_result()
+        for _ in range(3):
+            await bench._fire(pool, REQUEST, 0.0, 1.0, result, True)
+        assert result.errors == {"ConnectionRefusedError": 3}
+        assert pool._idle.qsize() == 1
+
+    asyncio.run(scenario())
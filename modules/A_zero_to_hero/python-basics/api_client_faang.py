@@ -4,62 +4,16 @@
 import asyncio
 import json
 import sys
-import time
 from dataclasses import dataclass, field
-from enum import Enum
 from typing import Optional, Protocol
 from urllib.parse import urlparse
 
 import aiohttp
 import structlog
 
-log = structlog.get_logger()
-
-# Circuit Breaker Pattern
-class CircuitState(Enum):
-    CLOSED = "closed"
-    OPEN = "open"
-    HALF_OPEN = "half_open"
+from circuit_breaker import CircuitBreakerOpenError, CircuitBreakerRegistry
 
-@dataclass
-class CircuitBreaker:
-    failure_threshold: int = 5
-    timeout: float = 60.0
-    success_threshold: int = 2
-    
-    state: CircuitState = field(default=CircuitState.CLOSED, init=False)
-    failures: int = field(default=0, init=False)
-    successes: int = field(default=0, init=False)
-    last_failure_time: float = field(default=0.0, init=False)
-    
-    def call(self, func):
-        if self.state == CircuitState.OPEN:
-            if time.time() - self.last_failure_time > self.timeout:
-                self.state = CircuitState.HALF_OPEN
-                self.successes = 0
-            else:
-                raise Exception("Circuit breaker is OPEN")
-        
-        try:
-            result = func()
-            self.on_success()
-            return result
-        except Exception as e:
-            self.on_failure()
-            raise e
-    
-    def on_success(self):
-        self.failures = 0
-        if self.state == CircuitState.HALF_OPEN:
-            self.successes += 1
-            if self.successes >= self.success_threshold:
-                self.state = CircuitState.CLOSED
-    
-    def on_failure(self):
-        self.failures += 1
-        self.last_failure_time = time.time()
-        if self.failures >= self.failure_threshold:
-            self.state = CircuitState.OPEN
+log = structlog.get_logger()
 
 # Result Monad
 @dataclass(frozen=True)
@@ -80,6 +34,8 @@ async def retry_with_backoff(func, max_retries: int = 3, base_delay: float = 1.0
     for attempt in range(max_retries):
         try:
             return await func()
+        except CircuitBreakerOpenError:
+            raise
         except Exception as e:
             if attempt == max_retries - 1:
                 raise
@@ -95,7 +51,7 @@ class HTTPClient(Protocol):
 class AsyncHTTPClient:
     timeout: float = 10.0
     max_retries: int = 3
-    circuit_breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    circuit_breakers: CircuitBreakerRegistry = field(default_factory=CircuitBreakerRegistry)
     
     async def request(self, method: str, url: str, **kwargs) -> Result:
         async def _make_request():
@@ -110,8 +66,10 @@ class AsyncHTTPClient:
                         "elapsed_ms": resp.request_info.headers.get('X-Response-Time', 0)
                     })
         
+        # One breaker per host, so a failing API does not trip calls to others
+        breaker = self.circuit_breakers.get(urlparse(url).netloc)
         try:
-            result = await retry_with_backoff(_make_request, self.max_retries)
+            result = await retry_with_backoff(lambda: breaker.call_async(_make_request), self.max_retries)
             log.info("http_request_success", method=method, url=url, status=result.value["status"])
             return result
         except Exception as e:
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Thread-safe circuit breaker shared by the HTTP clients and AWS services.
+
+The breaker tracks the last `window_size` calls in a ring buffer and opens
+when the failure rate or the slow-call rate over that window crosses its
+threshold (once at least `minimum_calls` have been seen). After
+`open_timeout` seconds it lets at most `half_open_max_calls` trial calls
+through; if they all succeed it closes, and any failure opens it again.
+
+    breakers = CircuitBreakerRegistry(failure_rate_threshold=0.5)
+    result = breakers.get("api.example.com").call(fetch, url)
+    result = await breakers.get("api.example.com").call_async(fetch_async, url)
+
+Stdlib only. In the closed state a call costs one lock acquisition and two
+monotonic clock reads.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Tuple
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+# Enum attribute lookups are slow; the hot path compares against these
+_CLOSED, _OPEN, _HALF_OPEN = CircuitState.CLOSED, CircuitState.OPEN, CircuitState.HALF_OPEN
+
+class CircuitBreakerOpenError(Exception):
+    """Raised instead of calling through an open (or saturated half-open) circuit."""
+    
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker '{name}' is OPEN")
+        self.name = name
+        self.retry_after = retry_after
+
+@dataclass
+class CircuitBreaker:
+    """Sliding-window circuit breaker with sync and asyncio APIs.
+    
+    Exceptions listed in `ignore_exceptions` (e.g. validation errors) are
+    re-raised but count as successes. A call slower than
+    `slow_call_duration` counts as slow; in the half-open state a slow call
+    is treated as a failure. `on_state_change(name, old, new)` is called
+    outside the lock after every transition.
+    """
+    name: str = "default"
+    failure_rate_threshold: float = 0.5
+    slow_call_rate_threshold: float = 1.0
+    slow_call_duration: float = 5.0
+    window_size: int = 20
+    minimum_calls: int = 10
+    open_timeout: float = 30.0
+    half_open_max_calls: int = 3
+    ignore_exceptions: Tuple[type, ...] = ()
+    on_state_change: Optional[Callable[[str, CircuitState, CircuitState], None]] = None
+    
+    _state: CircuitState = field(default=CircuitState.CLOSED, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _failed_ring: list = field(default_factory=list, init=False, repr=False)
+    _slow_ring: list = field(default_factory=list, init=False, repr=False)
+    _position: int = field(default=0, init=False)
+    _calls: int = field(default=0, init=False)
+    _failures: int = field(default=0, init=False)
+    _slow: int = field(default=0, init=False)
+    _opened_at: float = field(default=0.0, init=False)
+    _generation: int = field(default=0, init=False)
+    _half_open_in_flight: int = field(default=0, init=False)
+    _half_open_successes: int = field(default=0, init=False)
+    
+    def __post_init__(self):
+        self._failed_ring = [False] * self.window_size
+        self._slow_ring = [False] * self.window_size
+    
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+    
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call fn through the breaker; raise CircuitBreakerOpenError if it is open."""
+        generation = self._acquire()
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except self.ignore_exceptions:
+            self._record(generation, time.monotonic() - start, failed=False)
+            raise
+        except Exception:
+            self._record(generation, time.monotonic() - start, failed=True)
+            raise
+        except BaseException:
+            self._release(generation)
+            raise
+        self._record(generation, time.monotonic() - start, failed=False)
+        return result
+    
+    async def call_async(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Await fn(*args, **kwargs) through the breaker.
+        
+        Cancellation releases a half-open trial slot without counting as a
+        success or a failure.
+        """
+        generation = self._acquire()
+        start = time.monotonic()
+        try:
+            result = await fn(*args, **kwargs)
+        except self.ignore_exceptions:
+            self._record(generation, time.monotonic() - start, failed=False)
+            raise
+        except Exception:
+            self._record(generation, time.monotonic() - start, failed=True)
+            raise
+        except BaseException:
+            self._release(generation)
+            raise
+        self._record(generation, time.monotonic() - start, failed=False)
+        return result
+    
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state.value,
+                "calls": self._calls,
+                "failure_rate": self._failures / self._calls if self._calls else 0.0,
+                "slow_call_rate": self._slow / self._calls if self._calls else 0.0,
+            }
+    
+    def reset(self):
+        """Force the breaker closed with an empty window."""
+        with self._lock:
+            change = self._transition(_CLOSED)
+        self._notify(change)
+    
+    def _acquire(self) -> int:
+        # Closed is the hot path: a stale read only lets one more call
+        # through, and its result is dropped if the generation has moved on.
+        generation = self._generation
+        if self._state is _CLOSED:
+            return generation
+        change = None
+        try:
+            with self._lock:
+                if self._state is _OPEN:
+                    waited = time.monotonic() - self._opened_at
+                    if waited < self.open_timeout:
+                        raise CircuitBreakerOpenError(self.name, self.open_timeout - waited)
+                    change = self._transition(_HALF_OPEN)
+                if self._state is _HALF_OPEN:
+                    if self._half_open_in_flight + self._half_open_successes >= self.half_open_max_calls:
+                        raise CircuitBreakerOpenError(self.name, 0.0)
+                    self._half_open_in_flight += 1
+                return self._generation
+        finally:
+            self._notify(change)
+    
+    def _record(self, generation: int, duration: float, failed: bool):
+        slow = duration >= self.slow_call_duration
+        change = None
+        with self._lock:
+            if generation != self._generation:
+                return
+            if self._state is _HALF_OPEN:
+                self._half_open_in_flight -= 1
+                if failed or slow:
+                    change = self._transition(_OPEN)
+                else:
+                    self._half_open_successes += 1
+                    if self._half_open_successes >= self.half_open_max_calls:
+                        change = self._transition(_CLOSED)
+            elif self._state is _CLOSED:
+                position = self._position
+                self._failures += failed - self._failed_ring[position]
+                self._slow += slow - self._slow_ring[position]
+                self._failed_ring[position] = failed
+                self._slow_ring[position] = slow
+                self._position = (position + 1) % self.window_size
+                if self._calls < self.window_size:
+                    self._calls += 1
+                # Only a failed or slow call can push a rate over its threshold
+                if (failed or slow) and self._calls >= self.minimum_calls and (
+                        self._failures >= self.failure_rate_threshold * self._calls
+                        or self._slow >= self.slow_call_rate_threshold * self._calls):
+                    change = self._transition(_OPEN)
+        self._notify(change)
+    
+    def _release(self, generation: int):
+        with self._lock:
+            if generation == self._generation and self._state is _HALF_OPEN:
+                self._half_open_in_flight -= 1
+    
+    def _transition(self, new_state: CircuitState):
+        """Move to new_state with a fresh window; caller holds the lock."""
+        old_state = self._state
+        self._state = new_state
+        self._generation += 1
+        self._failed_ring = [False] * self.window_size
+        self._slow_ring = [False] * self.window_size
+        self._position = self._calls = self._failures = self._slow = 0
+        self._half_open_in_flight = self._half_open_successes = 0
+        if new_state is _OPEN:
+            self._opened_at = time.monotonic()
+        return (old_state, new_state) if old_state is not new_state else None
+    
+    def _notify(self, change):
+        if change and self.on_state_change:
+            self.on_state_change(self.name, *change)
+
+class CircuitBreakerRegistry:
+    """One breaker per endpoint, created on first use with shared settings."""
+    
+    def __init__(self, **settings):
+        self._settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(name)
+                if breaker is None:
+                    breaker = self._breakers[name] = CircuitBreaker(name=name, **self._settings)
+        return breaker
+    
+    def states(self) -> Dict[str, str]:
+        return {name: breaker.state.value for name, breaker in list(self._breakers.items())}
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Tests for circuit_breaker.py (also copied into the event-driven ride service)."""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import circuit_breaker as cb  # noqa: E402
+from circuit_breaker import CircuitBreaker, CircuitBreakerOpenError, CircuitState  # noqa: E402
+
+class Clock:
+    """Stands in for time.monotonic so tests control elapsed time."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(cb.time, 'monotonic', fake)
+    return fake
+
+def ok():
+    return 'ok'
+
+def boom():
+    raise RuntimeError('boom')
+
+def fail(breaker, times):
+    for _ in range(times):
+        with pytest.raises(RuntimeError):
+            breaker.call(boom)
+
+def make_breaker(**settings):
+    changes = []
+    settings.setdefault('window_size', 4)
+    settings.setdefault('minimum_calls', 4)
+    settings.setdefault('open_timeout', 10.0)
+    settings.setdefault('half_open_max_calls', 2)
+    breaker = CircuitBreaker(name='svc', on_state_change=lambda name, old, new: changes.append((old, new)),
+                             **settings)
+    return breaker, changes
+
+def test_stays_closed_below_minimum_calls(clock):
+    breaker, _ = make_breaker()
+    fail(breaker, 3)
+    assert breaker.state is CircuitState.CLOSED
+
+def test_opens_at_failure_rate_and_rejects_calls(clock):
+    breaker, changes = make_breaker()
+    breaker.call(ok)
+    breaker.call(ok)
+    fail(breaker, 2)
+    assert breaker.state is CircuitState.OPEN
+    assert changes == [(CircuitState.CLOSED, CircuitState.OPEN)]
+
+    clock.now += 4
+    with pytest.raises(CircuitBreakerOpenError) as excinfo:
+        breaker.call(ok)
+    assert excinfo.value.retry_after == pytest.approx(6.0)
+
+def test_window_slides_old_failures_out(clock):
+    breaker, _ = make_breaker(failure_rate_threshold=0.75)
+    fail(breaker, 2)
+    for _ in range(4):
+        breaker.call(ok)
+    # The window now holds only successes, so two more failures stay under 75%
+    fail(breaker, 2)
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.metrics()['failure_rate'] == 0.5
+
+def test_half_open_closes_after_trial_successes(clock):
+    breaker, changes = make_breaker()
+    fail(breaker, 4)
+    clock.now += 10
+    assert breaker.call(ok) == 'ok'
+    assert breaker.state is CircuitState.HALF_OPEN
+    breaker.call(ok)
+    assert breaker.state is CircuitState.CLOSED
+    assert changes[-2:] == [(CircuitState.OPEN, CircuitState.HALF_OPEN),
+                            (CircuitState.HALF_OPEN, CircuitState.CLOSED)]
+    assert breaker.metrics()['calls'] == 0
+
+def test_half_open_failure_reopens(clock):
+    breaker, _ = make_breaker()
+    fail(breaker, 4)
+    clock.now += 10
+    fail(breaker, 1)
+    assert breaker.state is CircuitState.OPEN
+    with pytest.raises(CircuitBreakerOpenError):
+        breaker.call(ok)
+
+def test_half_open_slow_call_reopens(clock):
+    breaker, _ = make_breaker(slow_call_duration=1.0)
+    fail(breaker, 4)
+    clock.now += 10
+
+    def slow():
+        clock.now += 2
+        return 'late'
+
+    assert breaker.call(slow) == 'late'
+    assert breaker.state is CircuitState.OPEN
+
+def test_half_open_limits_concurrent_trials(clock):
+    breaker, _ = make_breaker()
+    fail(breaker, 4)
+    clock.now += 10
+    release = threading.Event()
+    started = threading.Barrier(3)
+
+    def blocked():
+        started.wait()
+        release.wait(5)
+        return 'ok'
+
+    threads = [threading.Thread(target=breaker.call, args=(blocked,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    with pytest.raises(CircuitBreakerOpenError) as excinfo:
+        breaker.call(ok)
+    assert excinfo.value.retry_after == 0.0
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert breaker.state is CircuitState.CLOSED
+
+def test_slow_calls_open_the_breaker(clock):
+    breaker, _ = make_breaker(slow_call_duration=1.0, slow_call_rate_threshold=0.5)
+
+    def slow():
+        clock.now += 1.5
+        return 'late'
+
+    for _ in range(2):
+        breaker.call(ok)
+        breaker.call(slow)
+    assert breaker.state is CircuitState.OPEN
+
+def test_ignored_exceptions_count_as_successes(clock):
+    breaker, _ = make_breaker(ignore_exceptions=(ValueError,))
+
+    def invalid():
+        raise ValueError('bad input')
+
+    for _ in range(8):
+        with pytest.raises(ValueError):
+            breaker.call(invalid)
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.metrics()['failure_rate'] == 0.0
+
+def test_result_from_before_a_transition_is_dropped(clock):
+    breaker, _ = make_breaker()
+    fail(breaker, 3)
+
+    def reset_then_fail():
+        breaker.reset()
+        raise RuntimeError('late failure')
+
+    # The 4th failure belongs to the window that reset() discarded
+    with pytest.raises(RuntimeError):
+        breaker.call(reset_then_fail)
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.metrics()['calls'] == 0
+
+def test_async_calls_and_cancellation(clock):
+    breaker, _ = make_breaker(half_open_max_calls=1)
+
+    async def aboom():
+        raise RuntimeError('boom')
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        for _ in range(4):
+            with pytest.raises(RuntimeError):
+                await breaker.call_async(aboom)
+        assert breaker.state is CircuitState.OPEN
+        clock.now += 10
+        task = asyncio.ensure_future(breaker.call_async(hang))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Cancellation freed the only trial slot without reopening
+        assert breaker.state is CircuitState.HALF_OPEN
+
+        async def aok():
+            return 'ok'
+        assert await breaker.call_async(aok) == 'ok'
+
+    asyncio.run(scenario())
+    assert breaker.state is CircuitState.CLOSED
+
+def test_registry_shares_one_breaker_per_name():
+    registry = cb.CircuitBreakerRegistry(minimum_calls=2, window_size=2)
+    assert registry.get('a') is registry.get('a')
+    assert registry.get('a') is not registry.get('b')
+    fail(registry.get('a'), 2)
+    assert registry.states() == {'a': 'open', 'b': 'closed'}
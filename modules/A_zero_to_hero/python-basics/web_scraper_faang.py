@@ -4,7 +4,6 @@
 import asyncio
 import sys
 from dataclasses import dataclass
-from enum import Enum
 from typing import Optional
 from urllib.parse import urljoin, urlparse
 
@@ -12,26 +11,9 @@ import aiohttp
 from bs4 import BeautifulSoup
 import structlog
 
-log = structlog.get_logger()
-
-class CircuitState(Enum):
-    CLOSED = "closed"
-    OPEN = "open"
+from circuit_breaker import CircuitBreakerOpenError, CircuitBreakerRegistry
 
-@dataclass
-class CircuitBreaker:
-    failure_threshold: int = 3
-    failures: int = 0
-    state: CircuitState = CircuitState.CLOSED
-    
-    def record_success(self):
-        self.failures = 0
-        self.state = CircuitState.CLOSED
-    
-    def record_failure(self):
-        self.failures += 1
-        if self.failures >= self.failure_threshold:
-            self.state = CircuitState.OPEN
+log = structlog.get_logger()
 
 @dataclass(frozen=True)
 class ScrapedData:
@@ -52,19 +34,15 @@ class RateLimiter:
 class FAANGWebScraper:
     timeout: float = 10.0
     rate_limiter: RateLimiter = None
-    circuit_breaker: CircuitBreaker = None
+    circuit_breakers: CircuitBreakerRegistry = None
     
     def __post_init__(self):
         if self.rate_limiter is None:
             self.rate_limiter = RateLimiter(rate=2.0)
-        if self.circuit_breaker is None:
-            self.circuit_breaker = CircuitBreaker()
+        if self.circuit_breakers is None:
+            self.circuit_breakers = CircuitBreakerRegistry(window_size=10, minimum_calls=3)
     
     async def scrape(self, url: str) -> Optional[ScrapedData]:
-        if self.circuit_breaker.state == CircuitState.OPEN:
-            log.error("circuit_breaker_open", url=url)
-            return None
-        
         parsed = urlparse(url)
         if not parsed.scheme or not parsed.netloc:
             log.error("invalid_url", url=url)
@@ -73,44 +51,45 @@ class FAANGWebScraper:
         await self.rate_limiter.acquire()
         
         try:
-            async with aiohttp.ClientSession() as session:
-                timeout = aiohttp.ClientTimeout(total=self.timeout)
-                async with session.get(url, timeout=timeout) as resp:
-                    html = await resp.text()
-                    
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    title = soup.find('title')
-                    title_text = title.text.strip() if title else "No title"
-                    
-                    links = []
-                    for link in soup.find_all('a', href=True)[:50]:
-                        href = urljoin(url, link['href'])
-                        text = link.text.strip()[:100]
-                        links.append({'text': text, 'href': href})
-                    
-                    images = [urljoin(url, img['src']) for img in soup.find_all('img', src=True)[:50]]
-                    
-                    self.circuit_breaker.record_success()
-                    
-                    log.info("scrape_success", url=url, links=len(links), images=len(images))
-                    
-                    return ScrapedData(
-                        url=url,
-                        title=title_text,
-                        links=links,
-                        images=images,
-                        status_code=resp.status
-                    )
-        
+            return await self.circuit_breakers.get(parsed.netloc).call_async(self._fetch, url)
+        except CircuitBreakerOpenError:
+            log.error("circuit_breaker_open", url=url)
+            return None
         except asyncio.TimeoutError:
-            self.circuit_breaker.record_failure()
             log.error("scrape_timeout", url=url)
             return None
         except Exception as e:
-            self.circuit_breaker.record_failure()
             log.error("scrape_failed", url=url, error=str(e))
             return None
+    
+    async def _fetch(self, url: str) -> ScrapedData:
+        async with aiohttp.ClientSession() as session:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with session.get(url, timeout=timeout) as resp:
+                html = await resp.text()
+                
+                soup = BeautifulSoup(html, 'html.parser')
+                
+                title = soup.find('title')
+                title_text = title.text.strip() if title else "No title"
+                
+                links = []
+                for link in soup.find_all('a', href=True)[:50]:
+                    href = urljoin(url, link['href'])
+                    text = link.text.strip()[:100]
+                    links.append({'text': text, 'href': href})
+                
+                images = [urljoin(url, img['src']) for img in soup.find_all('img', src=True)[:50]]
+                
+                log.info("scrape_success", url=url, links=len(links), images=len(images))
+                
+                return ScrapedData(
+                    url=url,
+                    title=title_text,
+                    links=links,
+                    images=images,
+                    status_code=resp.status
+                )
 
 async def main(args: list[str]) -> int:
     if len(args) < 2:
@@ -4,13 +4,15 @@
 import json
 import logging
 import os
+import queue
+import selectors
 import signal
 import socket
 import sys
 import time
 from datetime import datetime
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from threading import Thread
+from threading import Lock, Thread
 
 # Structured logging configuration
 logging.basicConfig(
@@ -25,6 +27,10 @@ PORT = int(os.getenv("PORT", "8000"))
 SERVICE_NAME = os.getenv("SERVICE_NAME", "devops-demo")
 VERSION = os.getenv("VERSION", "1.0.0")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "dev")
+# WORKERS=0 falls back to the single-threaded HTTPServer
+WORKERS = int(os.getenv("WORKERS", "8"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "64"))
+KEEPALIVE_TIMEOUT = float(os.getenv("KEEPALIVE_TIMEOUT", "5"))
 
 # Metrics
 class Metrics:
@@ -33,43 +39,83 @@ class Metrics:
         self.request_count = 0
         self.error_count = 0
         self.health_checks = 0
+        self.queue_rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.dequeued = 0
+        self.workers_busy = 0
+        self._lock = Lock()
 
     def uptime(self):
         return time.time() - self.start_time
 
+    def inc(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def observe_queue_wait(self, seconds):
+        with self._lock:
+            self.dequeued += 1
+            self.queue_wait_total += seconds
+            self.queue_wait_max = max(self.queue_wait_max, seconds)
+
 metrics = Metrics()
 
+def _encode(payload):
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+# Probe responses are encoded once; /health only splices in its timestamp
+HEALTH_PREFIX = _encode({"status": "healthy", "service": SERVICE_NAME, "version": VERSION})[:-1] + b',"timestamp":"'
+READY_BODY = _encode({
+    "status": "ready",
+    "service": SERVICE_NAME,
+    "checks": {"database": "ok", "cache": "ok"}
+})
+OVERLOADED_BODY = _encode({"error": "overloaded"})
+OVERLOADED_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"Content-Length: " + str(len(OVERLOADED_BODY)).encode() + b"\r\n\r\n" + OVERLOADED_BODY
+)
+
+def health_body():
+    return HEALTH_PREFIX + (datetime.utcnow().isoformat() + 'Z"}').encode()
+
 class Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests; every response
+    # therefore carries Content-Length. The timeout bounds how long a
+    # worker waits for the rest of a request that has started arriving;
+    # PooledHTTPServer overrides it per connection with keepalive_timeout.
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+
     def log_message(self, format, *args):
         logger.info("%s - %s" % (self.address_string(), format % args))
 
-    def _send_json(self, payload, status=200):
+    def _send_body(self, body, status=200):
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
         self.send_header("X-Service-Name", SERVICE_NAME)
         self.send_header("X-Service-Version", VERSION)
         self.end_headers()
-        self.wfile.write(json.dumps(payload, indent=2).encode("utf-8"))
+        self.wfile.write(body)
+
+    def _send_json(self, payload, status=200):
+        self._send_body(_encode(payload), status)
 
     def do_GET(self):
-        metrics.request_count += 1
+        metrics.inc("request_count")
 
         if self.path == "/health":
-            metrics.health_checks += 1
-            self._send_json({
-                "status": "healthy",
-                "service": SERVICE_NAME,
-                "version": VERSION,
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            })
+            metrics.inc("health_checks")
+            self._send_body(health_body())
 
         elif self.path == "/ready":
             # Readiness check - can add dependency checks here
-            self._send_json({
-                "status": "ready",
-                "service": SERVICE_NAME,
-                "checks": {"database": "ok", "cache": "ok"}
-            })
+            self._send_body(READY_BODY)
 
         elif self.path == "/metrics":
             self._send_json({
@@ -81,6 +127,7 @@ class Handler(BaseHTTPRequestHandler):
                 "requests_total": metrics.request_count,
                 "errors_total": metrics.error_count,
                 "health_checks_total": metrics.health_checks,
+                "server": self.server.stats() if hasattr(self.server, "stats") else {"workers": 0},
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             })
 
@@ -92,12 +139,202 @@ class Handler(BaseHTTPRequestHandler):
             })
 
         else:
-            metrics.error_count += 1
+            metrics.inc("error_count")
             self._send_json({"error": "not found", "path": self.path}, status=404)
 
+class KeepAliveConnection:
+    """A client socket plus the handler that serves its requests one at a time."""
+
+    def __init__(self, sock, client_address, server):
+        self.sock = sock
+        self.client_address = client_address
+        self.server = server
+        # Built by hand: BaseRequestHandler.__init__ would serve the whole connection
+        handler = server.RequestHandlerClass.__new__(server.RequestHandlerClass)
+        handler.request, handler.client_address, handler.server = sock, client_address, server
+        # setup() applies the socket timeout; take it from this server, not the class default
+        handler.timeout = server.keepalive_timeout
+        handler.setup()
+        self.handler = handler
+        self.idle_since = time.monotonic()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def serve_one(self):
+        """Handle one request; return True if the connection stays open."""
+        self.handler.handle_one_request()
+        return not self.handler.close_connection
+
+    def has_buffered_request(self):
+        """True if a pipelined request is already in the read buffer (select can't see it)."""
+        self.sock.setblocking(False)
+        try:
+            return bool(self.handler.rfile.peek(1))
+        except (BlockingIOError, OSError):
+            return False
+        finally:
+            self.sock.settimeout(self.handler.timeout)
+
+    def close(self):
+        try:
+            self.handler.finish()
+        except OSError:
+            pass
+        self.server.shutdown_request(self.sock)
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands individual requests to a fixed pool of workers.
+
+    Idle keep-alive connections are parked in a selector on one poller
+    thread, so they cost no worker. When one becomes readable it is queued;
+    a worker serves that single request and parks the connection again.
+    When the queue is full the client gets a pre-encoded 503 immediately
+    instead of another thread being spawned. Connections idle for longer
+    than keepalive_timeout are closed.
+    """
+
+    def __init__(self, server_address, handler, workers=8, queue_size=64,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT):
+        super().__init__(server_address, handler)
+        self.workers = workers
+        self.keepalive_timeout = keepalive_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._to_park = []
+        self._park_lock = Lock()
+        self._closing = False
+        self._poller = Thread(target=self._poll, name="http-poller", daemon=True)
+        self._threads = [
+            Thread(target=self._worker, name=f"http-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._poller.start()
+        for thread in self._threads:
+            thread.start()
+
+    def process_request(self, request, client_address):
+        # A new connection waits for its first request like any idle one
+        self._park(KeepAliveConnection(request, client_address, self))
+
+    def _park(self, conn):
+        with self._park_lock:
+            self._to_park.append(conn)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # a wake-up is already pending
+
+    def _poll(self):
+        while not self._closing:
+            with self._park_lock:
+                parked, self._to_park = self._to_park, []
+            now = time.monotonic()
+            for conn in parked:
+                conn.idle_since = now
+                self._selector.register(conn, selectors.EVENT_READ, conn)
+
+            for key, _ in self._selector.select(timeout=0.5):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._selector.unregister(key.fileobj)
+                self._dispatch(key.data, time.monotonic())
+
+            now = time.monotonic()
+            for key in list(self._selector.get_map().values()):
+                conn = key.data
+                if conn is not None and now - conn.idle_since > self.keepalive_timeout:
+                    self._selector.unregister(conn)
+                    conn.close()
+
+    def _dispatch(self, conn, ready_at):
+        try:
+            self._queue.put_nowait((conn, ready_at))
+        except queue.Full:
+            metrics.inc("queue_rejected")
+            try:
+                conn.sock.sendall(OVERLOADED_RESPONSE)
+            except OSError:
+                pass
+            conn.close()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            conn, ready_at = item
+            # Time from the request arriving to a worker picking it up
+            metrics.observe_queue_wait(time.monotonic() - ready_at)
+            metrics.inc("workers_busy")
+            try:
+                keep_open = conn.serve_one()
+            except Exception:
+                self.handle_error(conn.sock, conn.client_address)
+                keep_open = False
+            finally:
+                metrics.inc("workers_busy", -1)
+
+            if not keep_open or self._closing:
+                conn.close()
+            elif conn.has_buffered_request():
+                self._dispatch(conn, time.monotonic())
+            else:
+                self._park(conn)
+
+    def stats(self):
+        avg_wait = metrics.queue_wait_total / metrics.dequeued if metrics.dequeued else 0.0
+        return {
+            "workers": self.workers,
+            "workers_busy": metrics.workers_busy,
+            "idle_connections": max(0, len(self._selector.get_map()) - 1) if not self._closing else 0,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "queue_rejected_total": metrics.queue_rejected,
+            "queue_wait_ms_avg": round(avg_wait * 1000, 3),
+            "queue_wait_ms_max": round(metrics.queue_wait_max * 1000, 3)
+        }
+
+    def server_close(self):
+        # Stop listening, let workers finish the requests already queued,
+        # then close every idle connection
+        super().server_close()
+        self._closing = True
+        self._wake()
+        self._poller.join(timeout=2)
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=self.keepalive_timeout + 1)
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                key.data.close()
+        with self._park_lock:
+            parked, self._to_park = self._to_park, []
+        for conn in parked:
+            conn.close()
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
 class GracefulServer:
-    def __init__(self, host, port, handler):
-        self.server = HTTPServer((host, port), handler)
+    def __init__(self, host, port, handler, workers=WORKERS, queue_size=WORKER_QUEUE_SIZE):
+        if workers > 0:
+            self.server = PooledHTTPServer((host, port), handler, workers, queue_size)
+        else:
+            self.server = HTTPServer((host, port), handler)
         self.running = True
         signal.signal(signal.SIGTERM, self.shutdown)
         signal.signal(signal.SIGINT, self.shutdown)
@@ -105,15 +342,18 @@ class GracefulServer:
     def shutdown(self, signum, frame):
         logger.info("Received shutdown signal %s, gracefully stopping...", signum)
         self.running = False
-        self.server.shutdown()
+        # serve_forever runs on this thread; shutdown() blocks until it exits
+        Thread(target=self.server.shutdown, daemon=True).start()
 
     def serve(self):
-        logger.info("Starting %s v%s on 0.0.0.0:%s (env=%s)", SERVICE_NAME, VERSION, PORT, ENVIRONMENT)
+        logger.info("Starting %s v%s on 0.0.0.0:%s (env=%s, workers=%s)",
+                    SERVICE_NAME, VERSION, PORT, ENVIRONMENT, WORKERS)
         try:
             self.server.serve_forever()
         except KeyboardInterrupt:
             pass
         finally:
+            self.server.server_close()
             logger.info("Server stopped")
 
 def run():
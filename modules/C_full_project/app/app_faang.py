@@ -7,7 +7,11 @@ from typing import Protocol, Optional, Dict, Any, Callable
 from enum import Enum
 from datetime import datetime
 from functools import wraps
+from collections import deque
 import asyncio
+import hashlib
+import json
+import math
 import signal
 import socket
 import structlog
@@ -30,6 +34,10 @@ REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method',
 REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint'])
 ACTIVE_REQUESTS = Gauge('http_requests_active', 'Active HTTP requests')
 ERROR_COUNT = Counter('http_errors_total', 'Total HTTP errors', ['endpoint', 'error_type'])
+RESPONSE_CACHE = Counter('http_response_cache_total', 'Response cache lookups', ['key', 'result'])
+ADMISSION_LIMIT = Gauge('http_admission_limit', 'Current adaptive concurrency limit')
+ADMISSION_QUEUED = Gauge('http_admission_queued', 'Requests waiting for admission')
+ADMISSION_REJECTED = Counter('http_admission_rejected_total', 'Requests shed by admission control', ['reason'])
 
 class HealthStatus(Enum):
     HEALTHY = "healthy"
@@ -44,6 +52,12 @@ class ServiceConfig:
     environment: str
     port: int
     shutdown_timeout: int = 30
+    drain_grace_period: float = 0.0
+    info_cache_ttl: float = 1.0
+    max_concurrency: int = 100
+    max_queue: int = 200
+    queue_timeout: float = 1.0
+    latency_target: float = 0.25
     
     @staticmethod
     def from_env() -> ServiceConfig:
@@ -53,7 +67,13 @@ class ServiceConfig:
             version=os.getenv("VERSION", "1.0.0"),
             environment=os.getenv("ENVIRONMENT", "dev"),
             port=int(os.getenv("PORT", "8000")),
-            shutdown_timeout=int(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+            shutdown_timeout=int(os.getenv("SHUTDOWN_TIMEOUT", "30")),
+            drain_grace_period=float(os.getenv("DRAIN_GRACE_PERIOD", "0")),
+            info_cache_ttl=float(os.getenv("INFO_CACHE_TTL", "1.0")),
+            max_concurrency=int(os.getenv("MAX_CONCURRENCY", "100")),
+            max_queue=int(os.getenv("MAX_QUEUE", "200")),
+            queue_timeout=float(os.getenv("QUEUE_TIMEOUT", "1.0")),
+            latency_target=float(os.getenv("LATENCY_TARGET", "0.25"))
         )
 
 @dataclass
@@ -129,7 +149,9 @@ class HealthChecker:
 def observe_request(fn: Callable) -> Callable:
     """Decorator for request observability."""
     @wraps(fn)
-    async def wrapper(request: web.Request) -> web.Response:
+    async def wrapper(*args) -> web.Response:
+        # Works on plain handlers and on methods (self, request)
+        request: web.Request = args[-1]
         method = request.method
         path = request.path
         segment = None
@@ -140,7 +162,7 @@ def observe_request(fn: Callable) -> Callable:
         start = asyncio.get_event_loop().time()
         
         try:
-            response = await fn(request)
+            response = await fn(*args)
             status = response.status
             REQUEST_COUNT.labels(method=method, endpoint=path, status=status).inc()
             return response
@@ -156,14 +178,203 @@ def observe_request(fn: Callable) -> Callable:
     
     return wrapper
 
+@dataclass(frozen=True)
+class CachedResponse:
+    """Pre-encoded response body with its validator."""
+    body: bytes
+    etag: str
+    expires_at: float
+
+class ResponseCache:
+    """Per-route TTL cache of encoded JSON bodies with ETag revalidation."""
+    
+    def __init__(self):
+        self._entries: Dict[str, CachedResponse] = {}
+    
+    @staticmethod
+    def make_etag(data: bytes, weak: bool = False) -> str:
+        tag = '"' + hashlib.blake2b(data, digest_size=8).hexdigest() + '"'
+        return "W/" + tag if weak else tag
+    
+    def get(self, key: str, ttl: float, build: Callable[[], bytes],
+            stable: Optional[bytes] = None) -> CachedResponse:
+        """Return the cached body for key, rebuilding it once ttl has elapsed.
+        
+        When `stable` is given (the body minus volatile fields such as
+        uptime), the ETag is a weak validator over it, so it survives rebuilds.
+        """
+        now = asyncio.get_running_loop().time()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            RESPONSE_CACHE.labels(key=key, result="hit").inc()
+            return entry
+        RESPONSE_CACHE.labels(key=key, result="miss").inc()
+        body = build()
+        etag = self.make_etag(stable, weak=True) if stable is not None else self.make_etag(body)
+        entry = CachedResponse(body=body, etag=etag, expires_at=now + ttl)
+        self._entries[key] = entry
+        return entry
+    
+    def respond(self, request: web.Request, key: str, ttl: float,
+                build: Callable[[], bytes], stable: Optional[bytes] = None) -> web.Response:
+        """Serve cached bytes, or 304 when the client's If-None-Match still matches."""
+        entry = self.get(key, ttl, build, stable)
+        headers = {"ETag": entry.etag, "Cache-Control": f"max-age={math.ceil(ttl)}"}
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and self._matches(if_none_match, entry.etag):
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=entry.body, content_type="application/json", headers=headers)
+    
+    @staticmethod
+    def _matches(if_none_match: str, etag: str) -> bool:
+        """Weak comparison, as RFC 9110 requires for If-None-Match."""
+        if if_none_match.strip() == "*":
+            return True
+        opaque = etag.removeprefix("W/")
+        return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+class AdmissionController:
+    """Adaptive (AIMD) concurrency limiter with a bounded wait queue.
+    
+    The limit grows by roughly one slot per limit-worth of fast requests and
+    shrinks multiplicatively when a request exceeds the latency target - at
+    most once per round trip: only a slow request that started after the
+    last decrease can cut the limit again, so one burst costs one backoff.
+    Probe paths bypass the limiter so overload never fails liveness/readiness.
+    """
+    
+    PRIORITY_PATHS = frozenset({"/health", "/ready"})
+    
+    def __init__(self, max_limit: int = 100, max_queue: int = 200, queue_timeout: float = 1.0,
+                 latency_target: float = 0.25, min_limit: int = 1, backoff: float = 0.9,
+                 retry_after: int = 1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.retry_after = retry_after
+        self._limit = float(max_limit)
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._waiters: deque[asyncio.Future] = deque()
+        ADMISSION_LIMIT.set(max_limit)
+    
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+    
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+    
+    async def acquire(self) -> bool:
+        """Take a slot, queueing up to queue_timeout. Returns False if shed."""
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            ADMISSION_REJECTED.labels(reason="queue_full").inc()
+            return False
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            # A slot may have been handed over just as the timeout fired
+            self._give_back(waiter)
+            ADMISSION_REJECTED.labels(reason="queue_timeout").inc()
+            return False
+        except asyncio.CancelledError:
+            # Client went away after a slot was handed over
+            self._give_back(waiter)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            ADMISSION_QUEUED.set(len(self._waiters))
+    
+    def release(self, latency: float, now: Optional[float] = None):
+        """Return a slot and adapt the limit from the observed latency."""
+        self._in_flight -= 1
+        if now is None:
+            now = asyncio.get_running_loop().time()
+        if latency > self.latency_target:
+            if now - latency >= self._last_decrease:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+        ADMISSION_LIMIT.set(self.limit)
+        self._hand_off()
+    
+    def _give_back(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            self._in_flight -= 1
+            self._hand_off()
+    
+    def _hand_off(self):
+        """Hand freed slots directly to queued requests in FIFO order."""
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+        ADMISSION_QUEUED.set(len(self._waiters))
+    
+    @web.middleware
+    async def middleware(self, request: web.Request, handler: Callable) -> web.StreamResponse:
+        """Shed load with a fast 503 once the limit and queue are exhausted."""
+        if request.path in self.PRIORITY_PATHS:
+            return await handler(request)
+        
+        if not await self.acquire():
+            return web.json_response(
+                {"error": "overloaded", "path": request.path},
+                status=503,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            return await handler(request)
+        finally:
+            now = loop.time()
+            self.release(now - start, now)
+
 class ServiceHandler:
     """FAANG-grade HTTP handler with async support."""
     
-    def __init__(self, config: ServiceConfig, health_checker: HealthChecker, metrics: ServiceMetrics):
+    def __init__(self, config: ServiceConfig, health_checker: HealthChecker, metrics: ServiceMetrics,
+                 drain: DrainController, cache: ResponseCache):
         self.config = config
         self.health_checker = health_checker
         self.metrics = metrics
+        self.drain = drain
+        self.cache = cache
         self.logger = logger.bind(service=config.name, version=config.version)
+        
+        # Everything in the info payload except uptime is fixed for the process
+        # lifetime, so encode it once and splice uptime in on cache refresh.
+        static_info = {
+            "service": config.name,
+            "version": config.version,
+            "environment": config.environment,
+            "hostname": socket.gethostname(),
+            "endpoints": {
+                "health": "/health",
+                "ready": "/ready",
+                "metrics": "/metrics",
+                "info": "/"
+            }
+        }
+        self._info_prefix = json.dumps(static_info)[:-1].encode() + b', "uptime_seconds": '
     
     @observe_request
     async def health(self, request: web.Request) -> web.Response:
@@ -184,6 +395,12 @@ class ServiceHandler:
     @observe_request
     async def ready(self, request: web.Request) -> web.Response:
         """Readiness check for Kubernetes."""
+        if self.drain.draining:
+            return web.json_response(
+                {"status": "draining", "service": self.config.name},
+                status=503
+            )
+        
         status, checks = await self.health_checker.check_all()
         
         payload = {
@@ -206,20 +423,12 @@ class ServiceHandler:
     @observe_request
     async def info(self, request: web.Request) -> web.Response:
         """Service information endpoint."""
-        payload = {
-            "service": self.config.name,
-            "version": self.config.version,
-            "environment": self.config.environment,
-            "hostname": socket.gethostname(),
-            "uptime_seconds": round(self.metrics.uptime_seconds, 2),
-            "endpoints": {
-                "health": "/health",
-                "ready": "/ready",
-                "metrics": "/metrics",
-                "info": "/"
-            }
-        }
-        return web.json_response(payload)
+        return self.cache.respond(request, "info", self.config.info_cache_ttl, self._render_info,
+                                  stable=self._info_prefix)
+    
+    def _render_info(self) -> bytes:
+        uptime = round(self.metrics.uptime_seconds, 2)
+        return self._info_prefix + repr(uptime).encode() + b"}"
     
     async def not_found(self, request: web.Request) -> web.Response:
         """404 handler."""
@@ -229,41 +438,110 @@ class ServiceHandler:
             status=404
         )
 
+class DrainController:
+    """Tracks in-flight requests and gates readiness during shutdown."""
+    
+    def __init__(self):
+        self._in_flight = 0
+        self._draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+    
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+    
+    @property
+    def draining(self) -> bool:
+        return self._draining
+    
+    def start_draining(self):
+        """Flip readiness to failing; new responses close their connection."""
+        self._draining = True
+    
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no requests are in flight. Returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=max(timeout, 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    @web.middleware
+    async def middleware(self, request: web.Request, handler: Callable) -> web.StreamResponse:
+        """Count in-flight requests and disable keep-alive while draining."""
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            response = await handler(request)
+            if self._draining:
+                response.force_close()
+            return response
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+
+DRAIN_KEY = web.AppKey("drain", DrainController)
+
 class GracefulShutdown:
-    """Graceful shutdown handler."""
+    """Graceful shutdown handler: fail readiness, stop listening, drain, clean up."""
     
-    def __init__(self, app: web.Application, timeout: int = 30):
-        self.app = app
+    def __init__(self, runner: web.AppRunner, drain: DrainController, timeout: int = 30,
+                 grace_period: float = 0.0):
+        self.runner = runner
+        self.drain = drain
         self.timeout = timeout
+        self.grace_period = grace_period
         self.logger = logger.bind(component="GracefulShutdown")
-        self._shutdown_event = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._started = False
     
     def setup_signals(self):
         """Setup signal handlers."""
+        loop = asyncio.get_running_loop()
         for sig in (signal.SIGTERM, signal.SIGINT):
-            asyncio.get_event_loop().add_signal_handler(
+            loop.add_signal_handler(
                 sig,
                 lambda s=sig: asyncio.create_task(self.shutdown(s))
             )
     
+    async def wait_stopped(self):
+        """Block until the shutdown sequence has finished."""
+        await self._stopped.wait()
+    
     async def shutdown(self, sig: signal.Signals):
         """Graceful shutdown sequence."""
-        self.logger.info("shutdown_initiated", signal=sig.name)
+        if self._started:
+            return
+        self._started = True
+        self.logger.info("shutdown_initiated", signal=sig.name, in_flight=self.drain.in_flight)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        
+        # Fail readiness first so load balancers stop routing to us
+        self.drain.start_draining()
+        if self.grace_period > 0:
+            await asyncio.sleep(min(self.grace_period, self.timeout))
+        
+        # Stop accepting new connections
+        for site in list(self.runner.sites):
+            await site.stop()
         
-        # Stop accepting new requests
-        self._shutdown_event.set()
+        # Close idle keep-alive connections; busy ones close after their response
+        server = self.runner.server
+        if server is not None:
+            for conn in server.connections:
+                conn.close()
         
-        # Wait for active requests to complete
-        deadline = asyncio.get_event_loop().time() + self.timeout
-        while ACTIVE_REQUESTS._value.get() > 0:
-            if asyncio.get_event_loop().time() > deadline:
-                self.logger.warning("shutdown_timeout", active_requests=ACTIVE_REQUESTS._value.get())
-                break
-            await asyncio.sleep(0.1)
+        # Wait for in-flight requests to complete
+        if not await self.drain.wait_idle(deadline - loop.time()):
+            self.logger.warning("shutdown_timeout", in_flight=self.drain.in_flight)
         
         # Cleanup
-        await self.app.cleanup()
+        await self.runner.cleanup()
         self.logger.info("shutdown_complete")
+        self._stopped.set()
 
 async def create_app(config: ServiceConfig) -> web.Application:
     """Application factory with dependency injection."""
@@ -276,11 +554,20 @@ async def create_app(config: ServiceConfig) -> web.Application:
     health_checker = HealthChecker(health_checks)
     metrics = ServiceMetrics()
     
+    drain = DrainController()
+    
     # Create handler
-    handler = ServiceHandler(config, health_checker, metrics)
+    handler = ServiceHandler(config, health_checker, metrics, drain, ResponseCache())
     
     # Create application
-    app = web.Application()
+    admission = AdmissionController(
+        max_limit=config.max_concurrency,
+        max_queue=config.max_queue,
+        queue_timeout=config.queue_timeout,
+        latency_target=config.latency_target
+    )
+    app = web.Application(middlewares=[drain.middleware, admission.middleware])
+    app[DRAIN_KEY] = drain
     
     # Setup routes
     app.router.add_get('/health', handler.health)
@@ -291,10 +578,6 @@ async def create_app(config: ServiceConfig) -> web.Application:
     # 404 handler
     app.router.add_route('*', '/{tail:.*}', handler.not_found)
     
-    # Setup graceful shutdown
-    shutdown_handler = GracefulShutdown(app, config.shutdown_timeout)
-    shutdown_handler.setup_signals()
-    
     return app
 
 async def main():
@@ -315,10 +598,15 @@ async def main():
     site = web.TCPSite(runner, '0.0.0.0', config.port)
     await site.start()
     
+    # Setup graceful shutdown
+    shutdown_handler = GracefulShutdown(runner, app[DRAIN_KEY], config.shutdown_timeout,
+                                        config.drain_grace_period)
+    shutdown_handler.setup_signals()
+    
     logger.info("service_ready", port=config.port)
     
-    # Keep running until shutdown
-    await asyncio.Event().wait()
+    # Keep running until shutdown has drained and cleaned up
+    await shutdown_handler.wait_stopped()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -43,6 +43,28 @@ def test_metrics_endpoint():
     assert 'requests_total' in data
     conn.close()
 
+def test_keep_alive_reuses_connection():
+    """Test HTTP/1.1 keep-alive serves several requests on one connection."""
+    conn = HTTPConnection('localhost', 8000)
+    for path in ('/health', '/ready', '/health'):
+        conn.request('GET', path)
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.version == 11
+        json.loads(response.read().decode())
+    conn.close()
+
+def test_metrics_reports_worker_pool():
+    """Test metrics expose request-queue statistics."""
+    conn = HTTPConnection('localhost', 8000)
+    conn.request('GET', '/metrics')
+    response = conn.getresponse()
+    
+    data = json.loads(response.read().decode())
+    assert 'queue_depth' in data['server']
+    assert 'queue_rejected_total' in data['server']
+    conn.close()
+
 def test_not_found():
     """Test 404 for unknown endpoints."""
     conn = HTTPConnection('localhost', 8000)
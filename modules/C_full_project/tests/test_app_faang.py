@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Tests for the aiohttp service (app_faang.py), run in-process."""
+
+import asyncio
+import os
+import signal
+import sys
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import app_faang  # noqa: E402
+
+def make_config(**overrides):
+    settings = dict(name="test", version="1.0.0", environment="test", port=0)
+    settings.update(overrides)
+    return app_faang.ServiceConfig(**settings)
+
+async def start_client(app):
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    return client
+
+def test_ready_fails_while_draining():
+    """Readiness flips to 503 as soon as draining starts."""
+    async def scenario():
+        app = await app_faang.create_app(make_config())
+        client = await start_client(app)
+        try:
+            assert (await client.get('/ready')).status == 200
+            app[app_faang.DRAIN_KEY].start_draining()
+            response = await client.get('/ready')
+            assert response.status == 503
+            assert (await response.json())['status'] == 'draining'
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+
+def test_shutdown_waits_for_in_flight_requests():
+    """Shutdown stops accepting connections but lets in-flight requests finish."""
+    async def scenario():
+        drain = app_faang.DrainController()
+        started, finish = asyncio.Event(), asyncio.Event()
+
+        async def slow(request):
+            started.set()
+            await finish.wait()
+            return web.json_response({"done": True})
+
+        app = web.Application(middlewares=[drain.middleware])
+        app.router.add_get('/slow', slow)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+
+        async with aiohttp.ClientSession() as session:
+            request = asyncio.create_task(session.get(f'http://127.0.0.1:{port}/slow'))
+            await started.wait()
+
+            shutdown = app_faang.GracefulShutdown(runner, drain, timeout=5)
+            stopping = asyncio.create_task(shutdown.shutdown(signal.SIGTERM))
+            await asyncio.sleep(0.05)
+            assert drain.draining
+            assert not stopping.done()
+
+            async with aiohttp.ClientSession() as fresh:
+                with pytest.raises(aiohttp.ClientConnectionError):
+                    await fresh.get(f'http://127.0.0.1:{port}/slow')
+
+            finish.set()
+            response = await request
+            assert response.status == 200
+            assert await response.json() == {"done": True}
+            await asyncio.wait_for(stopping, timeout=5)
+            assert drain.in_flight == 0
+
+    asyncio.run(scenario())
+
+def test_info_etag_survives_cache_refresh():
+    """The info ETag ignores uptime, so revalidation still gets a 304 after a rebuild."""
+    async def scenario():
+        app = await app_faang.create_app(make_config(info_cache_ttl=0.01))
+        client = await start_client(app)
+        try:
+            first = await client.get('/')
+            assert first.status == 200
+            assert first.headers['Cache-Control'] == 'max-age=1'
+            etag = first.headers['ETag']
+            assert etag.startswith('W/')
+
+            await asyncio.sleep(0.05)
+            again = await client.get('/', headers={'If-None-Match': etag})
+            assert again.status == 304
+            assert again.headers['ETag'] == etag
+
+            other = await client.get('/', headers={'If-None-Match': '"something-else"'})
+            assert other.status == 200
+            assert 'uptime_seconds' in await other.json()
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+
+def test_response_cache_counts_hits_and_misses():
+    """Cache lookups are exported as Prometheus counters."""
+    async def scenario():
+        def count(result):
+            return REGISTRY.get_sample_value('http_response_cache_total',
+                                             {'key': 'probe', 'result': result}) or 0
+
+        cache = app_faang.ResponseCache()
+        hits, misses = count('hit'), count('miss')
+        for _ in range(3):
+            cache.get('probe', 60, lambda: b'{}')
+        assert count('miss') == misses + 1
+        assert count('hit') == hits + 2
+
+    asyncio.run(scenario())
+
+def test_admission_backs_off_once_per_burst():
+    """A burst of slow requests cuts the limit once, not once per request."""
+    admission = app_faang.AdmissionController(max_limit=100, latency_target=0.1, backoff=0.9)
+    admission._in_flight = 20
+    # 20 slow requests that all started at t=9.5 and finish around t=10
+    for i in range(20):
+        admission.release(latency=0.5, now=10.0 + i * 0.001)
+    assert admission.limit == 90
+
+    # A slow request that started after that decrease counts again
+    admission._in_flight = 1
+    admission.release(latency=0.5, now=11.0)
+    assert admission.limit == 81
+
+def test_admission_timeout_race_returns_handed_over_slot(monkeypatch):
+    """A slot handed over as the queue timeout fires is given back, not leaked."""
+    async def scenario():
+        admission = app_faang.AdmissionController(max_limit=1, queue_timeout=0.01)
+        assert await admission.acquire()
+
+        async def handed_over_then_timed_out(waiter, timeout):
+            admission.release(latency=0.0)  # hands the slot to `waiter`
+            assert waiter.done()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(app_faang.asyncio, 'wait_for', handed_over_then_timed_out)
+        assert not await admission.acquire()
+        assert admission.in_flight == 0
+
+    asyncio.run(scenario())
+
+def admission_app(admission, started, finish):
+    """An app whose /slow handler holds its admission slot until `finish` is set."""
+    async def slow(request):
+        started.set()
+        await finish.wait()
+        return web.json_response({"done": True})
+
+    async def probe(request):
+        return web.json_response({"status": "ok"})
+
+    app = web.Application(middlewares=[admission.middleware])
+    app.router.add_get('/slow', slow)
+    app.router.add_get('/health', probe)
+    app.router.add_get('/ready', probe)
+    return app
+
+@pytest.mark.parametrize('max_queue', [0, 1], ids=['queue_full', 'queue_timeout'])
+def test_admission_sheds_with_retry_after(max_queue):
+    """Requests that cannot get a slot are answered 503 with Retry-After."""
+    async def scenario():
+        admission = app_faang.AdmissionController(max_limit=1, max_queue=max_queue,
+                                                  queue_timeout=0.05, retry_after=3)
+        started, finish = asyncio.Event(), asyncio.Event()
+        client = await start_client(admission_app(admission, started, finish))
+        try:
+            holder = asyncio.create_task(client.get('/slow'))
+            await started.wait()
+
+            shed = await client.get('/slow')
+            assert shed.status == 503
+            assert shed.headers['Retry-After'] == '3'
+            assert (await shed.json())['error'] == 'overloaded'
+
+            finish.set()
+            assert (await holder).status == 200
+            assert admission.in_flight == 0
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+
+def test_probes_bypass_admission_when_overloaded():
+    """Health and readiness answer even while the limit and queue are exhausted."""
+    async def scenario():
+        admission = app_faang.AdmissionController(max_limit=1, max_queue=0)
+        started, finish = asyncio.Event(), asyncio.Event()
+        client = await start_client(admission_app(admission, started, finish))
+        try:
+            holder = asyncio.create_task(client.get('/slow'))
+            await started.wait()
+            assert (await client.get('/slow')).status == 503
+            assert (await client.get('/health')).status == 200
+            assert (await client.get('/ready')).status == 200
+            assert admission.in_flight == 1
+
+            finish.set()
+            await holder
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""In-process tests for the pooled HTTP/1.1 server in app.py."""
+
+import json
+import os
+import socket
+import sys
+import time
+from http.client import HTTPConnection
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import app  # noqa: E402
+
+def start_server(workers=2, keepalive_timeout=5.0):
+    server = app.PooledHTTPServer(("127.0.0.1", 0), app.Handler, workers=workers,
+                                  queue_size=8, keepalive_timeout=keepalive_timeout)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+def get(conn, path):
+    conn.request('GET', path)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read().decode())
+
+def read_response(sock):
+    """Read one whole response (headers, then Content-Length bytes of body)."""
+    data = b""
+    while b"\r\n\r\n" not in data:
+        data += sock.recv(65536)
+    head, _, body = data.partition(b"\r\n\r\n")
+    length = next(int(line.split(b":", 1)[1]) for line in head.split(b"\r\n")
+                  if line.lower().startswith(b"content-length:"))
+    while len(body) < length:
+        body += sock.recv(65536)
+    return head, body
+
+def test_idle_keepalive_connections_do_not_hold_workers():
+    """More idle keep-alive clients than workers must not delay a new request."""
+    server, port = start_server(workers=2)
+    idle = []
+    try:
+        for _ in range(8):
+            conn = HTTPConnection('127.0.0.1', port, timeout=5)
+            assert get(conn, '/ready')[0] == 200
+            idle.append(conn)
+
+        start = time.monotonic()
+        fresh = HTTPConnection('127.0.0.1', port, timeout=5)
+        status, body = get(fresh, '/health')
+        elapsed = time.monotonic() - start
+        assert status == 200
+        assert elapsed < 0.5, f"/health took {elapsed:.2f}s behind idle connections"
+        assert body['timestamp'].endswith('Z')
+
+        # The idle connections are still usable afterwards
+        for conn in idle:
+            assert get(conn, '/health')[0] == 200
+        fresh.close()
+    finally:
+        for conn in idle:
+            conn.close()
+        stop_server(server)
+
+def test_pipelined_requests_are_all_answered():
+    """Requests already buffered on a connection are served without new socket reads."""
+    server, port = start_server(workers=1)
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+            sock.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n"
+                         b"GET /ready HTTP/1.1\r\nHost: x\r\n\r\n")
+            data = b""
+            deadline = time.monotonic() + 5
+            while data.count(b"HTTP/1.1 200") < 2 and time.monotonic() < deadline:
+                data += sock.recv(65536)
+        assert data.count(b"HTTP/1.1 200") == 2
+    finally:
+        stop_server(server)
+
+def test_idle_connections_expire():
+    """Connections idle past the keep-alive timeout are closed by the server."""
+    server, port = start_server(workers=1, keepalive_timeout=0.2)
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+            sock.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n")
+            head, body = read_response(sock)
+            assert head.startswith(b"HTTP/1.1 200") and json.loads(body)['status'] == 'healthy'
+            time.sleep(1.0)
+            assert sock.recv(65536) == b""
+    finally:
+        stop_server(server)
+
+def test_partial_request_uses_server_keepalive_timeout():
+    """A stalled request is dropped after the server's timeout, not the class default."""
+    server, port = start_server(workers=1, keepalive_timeout=0.3)
+    try:
+        assert app.Handler.timeout > 2
+        with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+            sock.sendall(b"GET /health HTTP/1.1\r\n")  # headers never finish
+            start = time.monotonic()
+            assert sock.recv(65536) == b""
+            assert time.monotonic() - start < 2
+    finally:
+        stop_server(server)
+
+def test_queue_wait_measures_request_wait():
+    """Queue wait covers request arrival to pickup, not connection lifetime."""
+    server, port = start_server(workers=1)
+    try:
+        conn = HTTPConnection('127.0.0.1', port, timeout=5)
+        get(conn, '/health')
+        time.sleep(0.5)  # idle time on the connection is not queueing
+        _, body = get(conn, '/metrics')
+        assert body['server']['queue_wait_ms_max'] < 250
+        assert body['server']['idle_connections'] == 0
+        conn.close()
+    finally:
+        stop_server(server)